@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, Optional
+
+from .config import load_settings
+from .models import Question
+
+
+@dataclass(frozen=True)
+class AnswerKey:
+    correct_choice_id: Optional[int]
+    choice_ids: FrozenSet[int]
+
+
+class AnswerKeyCache:
+    """In-process LRU of question id -> answer key.
+
+    Questions and choices never change after generation, so entries need no invalidation.
+    Keys are warmed in bulk whenever questions are served, which lets POST /answers reject
+    a foreign choice id and return the correct choice without reading `choices`.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[int, AnswerKey]" = OrderedDict()
+        self._counters: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    def get(self, question_id: int) -> Optional[AnswerKey]:
+        key = self._entries.get(question_id)
+        if key is None:
+            self._counters["misses"] += 1
+            return None
+        self._entries.move_to_end(question_id)
+        self._counters["hits"] += 1
+        return key
+
+    def put(self, question_id: int, key: AnswerKey) -> None:
+        if not self._max_entries:
+            return
+        self._entries[question_id] = key
+        self._entries.move_to_end(question_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, question_id: int) -> None:
+        self._entries.pop(question_id, None)
+
+    def warm(self, questions: Iterable[Question]) -> None:
+        if not self._max_entries:
+            return
+        for q in questions:
+            # Keys never change; a cached one only needs its recency refreshed
+            if q.id in self._entries:
+                self._entries.move_to_end(q.id)
+                continue
+            correct = next((c.id for c in q.choices if c.is_correct), None)
+            self.put(q.id, AnswerKey(correct_choice_id=correct, choice_ids=frozenset(c.id for c in q.choices)))
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            **self._counters,
+            "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self._max_entries,
+        }
+
+
+_settings = load_settings()
+answer_keys = AnswerKeyCache(max_entries=_settings["ANSWER_KEY_CACHE_SIZE"])
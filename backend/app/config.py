@@ -41,6 +41,93 @@ def load_settings() -> dict:
         "GEN_AI_MODEL_1": model_1,
         "GEN_AI_MODEL_2": model_2,
         "DEFAULT_USER_ID": int(os.getenv("DEFAULT_USER_ID", "1")),
+        # Read replicas (comma-separated DSNs) for read-only queries; empty = primary only
+        "DATABASE_REPLICA_URLS": [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()],
+        # A user's reads stay on the primary this long after their own write (replica lag guard)
+        "REPLICA_READ_AFTER_WRITE_SECONDS": float(os.getenv("REPLICA_READ_AFTER_WRITE_SECONDS", "5")),
+        # Prometheus metrics at GET /metrics (per process)
+        "METRICS_ENABLED": os.getenv("METRICS_ENABLED", "true").strip().lower() not in ("0", "false", "no"),
+        # Connection pool: serverless instances keep the old 1-3 connections by default
+        "DB_POOL_MIN_SIZE": max(0, int(os.getenv("DB_POOL_MIN_SIZE", "1"))),
+        "DB_POOL_MAX_SIZE": max(1, int(os.getenv("DB_POOL_MAX_SIZE", "3" if os.getenv("VERCEL", "") else "10"))),
+        # Waiting longer than this for a free connection fails the request with 503 database_busy
+        "DB_ACQUIRE_TIMEOUT_SECONDS": float(os.getenv("DB_ACQUIRE_TIMEOUT_SECONDS", "10")),
+        # Server-side statement_timeout per connection in ms (0 = server default)
+        "DB_STATEMENT_TIMEOUT_MS": max(0, int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))),
+        # Idle connections are closed after this long (0 = never)
+        "DB_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS": float(os.getenv("DB_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS", "300")),
+        # Key pool: a throttled (429) key sits out this long; errors count toward health for the window
+        "GENAI_KEY_COOLDOWN_SECONDS": float(os.getenv("GENAI_KEY_COOLDOWN_SECONDS", "60")),
+        "GENAI_KEY_ERROR_WINDOW_SECONDS": float(os.getenv("GENAI_KEY_ERROR_WINDOW_SECONDS", "300")),
+        # Hedging: when the primary model has not answered within this percentile of its recent
+        # latencies (GENAI_HEDGE_INITIAL_SECONDS until MIN_SAMPLES calls were seen, never under
+        # MIN_SECONDS), the secondary model is called in parallel and the first valid response wins
+        "GENAI_HEDGE_ENABLED": os.getenv("GENAI_HEDGE_ENABLED", "true").strip().lower() not in ("0", "false", "no"),
+        "GENAI_HEDGE_PERCENTILE": float(os.getenv("GENAI_HEDGE_PERCENTILE", "95")),
+        "GENAI_HEDGE_MIN_SAMPLES": int(os.getenv("GENAI_HEDGE_MIN_SAMPLES", "20")),
+        "GENAI_HEDGE_INITIAL_SECONDS": float(os.getenv("GENAI_HEDGE_INITIAL_SECONDS", "60")),
+        "GENAI_HEDGE_MIN_SECONDS": float(os.getenv("GENAI_HEDGE_MIN_SECONDS", "5")),
+        # Model calls for one generation request give up after this long (504)
+        "GENAI_DEADLINE_SECONDS": float(os.getenv("GENAI_DEADLINE_SECONDS", "240")),
+        # Overloaded (503) calls are retried up to this many times with jittered exponential
+        # backoff; retries and hedges together stay under this share of first attempts
+        "GENAI_RETRY_ATTEMPTS": max(0, int(os.getenv("GENAI_RETRY_ATTEMPTS", "2"))),
+        "GENAI_RETRY_BACKOFF_SECONDS": float(os.getenv("GENAI_RETRY_BACKOFF_SECONDS", "1")),
+        "GENAI_RETRY_BACKOFF_MAX_SECONDS": float(os.getenv("GENAI_RETRY_BACKOFF_MAX_SECONDS", "10")),
+        "GENAI_RETRY_BUDGET_RATIO": float(os.getenv("GENAI_RETRY_BUDGET_RATIO", "0.2")),
+        # Model backend: gemini, or replay (local synthetic MCQs for offline load tests)
+        "GENAI_PROVIDER": os.getenv("GENAI_PROVIDER", "gemini").strip().lower(),
+        # Replay provider: median time to first token (log-normal spread), delay per streamed
+        # chunk, and the share of calls failing with a 503 or returning a corrupt item
+        "GENAI_REPLAY_SEED": int(os.getenv("GENAI_REPLAY_SEED", "0")),
+        "GENAI_REPLAY_LATENCY_MS": float(os.getenv("GENAI_REPLAY_LATENCY_MS", "1500")),
+        "GENAI_REPLAY_LATENCY_SIGMA": float(os.getenv("GENAI_REPLAY_LATENCY_SIGMA", "0.5")),
+        "GENAI_REPLAY_TOKEN_MS": float(os.getenv("GENAI_REPLAY_TOKEN_MS", "5")),
+        "GENAI_REPLAY_CHUNK_CHARS": int(os.getenv("GENAI_REPLAY_CHUNK_CHARS", "64")),
+        "GENAI_REPLAY_UNAVAILABLE_RATE": float(os.getenv("GENAI_REPLAY_UNAVAILABLE_RATE", "0")),
+        "GENAI_REPLAY_MALFORMED_RATE": float(os.getenv("GENAI_REPLAY_MALFORMED_RATE", "0")),
+        # Optional JSON array of recorded MCQs served instead of synthetic ones
+        "GENAI_REPLAY_FILE": os.getenv("GENAI_REPLAY_FILE", "").strip(),
+        # Upper bound on GenAI calls in flight per process; extra requests wait for a slot
+        "GENAI_MAX_CONCURRENCY": max(1, int(os.getenv("GENAI_MAX_CONCURRENCY", "4"))),
+        # /generate/from-links: parallel source fetches per request and their shared deadline
+        "LINK_FETCH_CONCURRENCY": max(1, int(os.getenv("LINK_FETCH_CONCURRENCY", "3"))),
+        "LINK_FETCH_DEADLINE_SECONDS": float(os.getenv("LINK_FETCH_DEADLINE_SECONDS", "45")),
+        # Shared deadline for uploading the fetched sources, restarted on each key attempt
+        "LINK_UPLOAD_DEADLINE_SECONDS": float(os.getenv("LINK_UPLOAD_DEADLINE_SECONDS", "45")),
+        # Source downloads: shared pooled client, streamed with a hard size cap
+        "SOURCE_FETCH_MAX_BYTES": int(os.getenv("SOURCE_FETCH_MAX_BYTES", str(25 * 1024 * 1024))),
+        "SOURCE_FETCH_TIMEOUT_SECONDS": float(os.getenv("SOURCE_FETCH_TIMEOUT_SECONDS", "30")),
+        "SOURCE_HTTP_MAX_CONNECTIONS": int(os.getenv("SOURCE_HTTP_MAX_CONNECTIONS", "20")),
+        "SOURCE_HTTP_MAX_KEEPALIVE": int(os.getenv("SOURCE_HTTP_MAX_KEEPALIVE", "10")),
+        "SOURCE_HTTP_KEEPALIVE_EXPIRY_SECONDS": float(os.getenv("SOURCE_HTTP_KEEPALIVE_EXPIRY_SECONDS", "30")),
+        # Long PDFs: split locally into token-bounded sections generated in parallel
+        "PDF_CHUNK_MIN_PAGES": int(os.getenv("PDF_CHUNK_MIN_PAGES", "20")),
+        "PDF_CHUNK_MAX_TOKENS": int(os.getenv("PDF_CHUNK_MAX_TOKENS", "12000")),
+        "PDF_CHUNK_CONCURRENCY": max(1, int(os.getenv("PDF_CHUNK_CONCURRENCY", "4"))),
+        # Question-text shingle similarity at or above which two MCQs count as duplicates
+        "NEAR_DUPLICATE_THRESHOLD": float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.6")),
+        # Reject generated MCQs that repeat a stored question in the same sub-topic
+        "QUESTION_DEDUPE_ENABLED": os.getenv("QUESTION_DEDUPE_ENABLED", "true").strip().lower() not in ("0", "false", "no"),
+        # Answer keys (correct + valid choice ids) kept in memory per process, LRU
+        "ANSWER_KEY_CACHE_SIZE": max(0, int(os.getenv("ANSWER_KEY_CACHE_SIZE", "20000"))),
+        # Built Question bundles kept in memory per process (LRU, estimated bytes)
+        "QUESTION_CACHE_MAX_BYTES": int(os.getenv("QUESTION_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+        "QUESTION_CACHE_TTL_SECONDS": float(os.getenv("QUESTION_CACHE_TTL_SECONDS", "3600")),
+        # Hot read endpoints (sampling, review, topics) encode JSON directly instead of
+        # validating and re-serializing through response_model (opt-in)
+        "FAST_JSON_RESPONSES": os.getenv("FAST_JSON_RESPONSES", "false").strip().lower() in ("1", "true", "yes"),
+        # Topic tree snapshot: rebuilt after generation, or after this long (changes made by other workers)
+        "TOPIC_TREE_TTL_SECONDS": float(os.getenv("TOPIC_TREE_TTL_SECONDS", "300")),
+        # Generation cache: repeat submissions of identical sources skip upload and LLM
+        "GENERATION_CACHE_ENABLED": os.getenv("GENERATION_CACHE_ENABLED", "true").strip().lower() not in ("0", "false", "no"),
+        "GENERATION_CACHE_TTL_HOURS": float(os.getenv("GENERATION_CACHE_TTL_HOURS", "168")),
+        "GENERATION_CACHE_MAX_BYTES": int(os.getenv("GENERATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+        # Background generation jobs (POST /generate/* with background=true); 0 disables the workers
+        "GENERATION_WORKERS": int(os.getenv("GENERATION_WORKERS", "2")),
+        "GENERATION_JOB_MAX_ATTEMPTS": int(os.getenv("GENERATION_JOB_MAX_ATTEMPTS", "3")),
+        "GENERATION_JOB_STALE_SECONDS": float(os.getenv("GENERATION_JOB_STALE_SECONDS", "120")),
+        "GENERATION_JOB_POLL_SECONDS": float(os.getenv("GENERATION_JOB_POLL_SECONDS", "2")),
     }
     return settings
 
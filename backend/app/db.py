@@ -1,60 +1,275 @@
 import asyncio
+import logging
+import re
+import time
+from collections import deque
+from functools import lru_cache
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence
 
 import asyncpg
 from .config import load_settings
+from .metrics import DB_POOL_WAIT_SECONDS, DB_QUERY_SECONDS, metrics
+from .request_timing import current_timing, record_query
+
+
+logger = logging.getLogger("app.db")
+
+# Recent acquire waits kept for percentiles
+WAIT_SAMPLE_SIZE = 2048
+
+
+class PoolAcquireTimeout(Exception):
+    """No pooled connection became free within the acquire timeout."""
+
+
+_QUERY_TARGET = re.compile(r"\b(?:from|into|update)\s+([a-z_][a-z0-9_]*)", re.I)
+
+
+@lru_cache(maxsize=512)
+def query_name(query: str) -> str:
+    # Metric label for statements run without an explicit name: verb and first table (or
+    # the first CTE for WITH statements), e.g. "select:questions", "with:choice"
+    words = query.split(None, 2)
+    if not words:
+        return "other"
+    verb = words[0].lower()
+    if verb == "with" and len(words) > 1:
+        return f"with:{words[1].lower()}"
+    match = _QUERY_TARGET.search(query)
+    return f"{verb}:{match.group(1).lower()}" if match else verb
 
 
 class Database:
-    def __init__(self, dsn: str) -> None:
+    """asyncpg pool for the primary, plus one pool per read replica.
+
+    Writes and anything that must see them go through the primary (`db.fetch`, ...).
+    Read-only queries that tolerate replica lag go through `db.reader(user_id)`, which
+    rotates over the replicas unless that user wrote through this process within
+    `read_after_write_seconds`, in which case it returns the primary.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = 1,
+        max_size: int = 3,
+        acquire_timeout: Optional[float] = None,
+        statement_timeout_ms: int = 0,
+        max_inactive_connection_lifetime: float = 300.0,
+        replica_dsns: Sequence[str] = (),
+        read_after_write_seconds: float = 5.0,
+        pool_label: str = "primary",
+        default_user_id: int = 1,
+    ) -> None:
         self._dsn = dsn
+        self._default_user_id = default_user_id
+        self._pool_label = pool_label
+        self._min_size = min(min_size, max_size)
+        self._max_size = max_size
+        self._acquire_timeout = acquire_timeout
+        self._statement_timeout_ms = statement_timeout_ms
+        self._max_inactive_connection_lifetime = max_inactive_connection_lifetime
         self._pool: Optional[asyncpg.Pool] = None
+        self._connect_lock = asyncio.Lock()
+        self._waiting = 0
+        self._in_use = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self._counters: Dict[str, float] = {"acquires": 0, "saturated": 0, "timeouts": 0, "wait_seconds_total": 0.0}
+        self._replicas = [
+            Database(
+                replica_dsn,
+                min_size=min_size,
+                max_size=max_size,
+                acquire_timeout=acquire_timeout,
+                statement_timeout_ms=statement_timeout_ms,
+                max_inactive_connection_lifetime=max_inactive_connection_lifetime,
+                pool_label=f"replica{index}",
+            )
+            for index, replica_dsn in enumerate(replica_dsns)
+        ]
+        self._read_after_write_seconds = read_after_write_seconds
+        self._last_write: Dict[int, float] = {}
+        self._next_replica = 0
+        self._reads: Dict[str, int] = {"replica": 0, "primary_after_write": 0}
 
     async def connect(self) -> None:
-        if self._pool is None:
-            # Use smaller pool for serverless environments
-            self._pool = await asyncpg.create_pool(self._dsn, min_size=1, max_size=3)
+        async with self._connect_lock:
+            if self._pool is None:
+                server_settings = {}
+                if self._statement_timeout_ms:
+                    server_settings["statement_timeout"] = str(self._statement_timeout_ms)
+                self._pool = await asyncpg.create_pool(
+                    self._dsn,
+                    min_size=self._min_size,
+                    max_size=self._max_size,
+                    max_inactive_connection_lifetime=self._max_inactive_connection_lifetime,
+                    server_settings=server_settings or None,
+                    init=self._init_connection,
+                )
+                live = []
+                for index, replica in enumerate(self._replicas):
+                    try:
+                        await replica.connect()
+                        live.append(replica)
+                    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as exc:
+                        # Reads fall back to the remaining replicas or the primary
+                        logger.warning(f"replica_unavailable index={index} error={exc!r}")
+                self._replicas = live
 
     async def disconnect(self) -> None:
+        for replica in self._replicas:
+            await replica.disconnect()
         if self._pool is not None:
             await self._pool.close()
             self._pool = None
 
+    def reader(self, user_id: Optional[int] = None) -> "Database":
+        # Where to run a read-only query: the next replica, or the primary when there are
+        # none (yet: replicas join when the primary pool is created) or `user_id` wrote
+        # recently enough that a replica may not have the write yet
+        if not self._replicas or self._pool is None:
+            return self
+        if user_id is not None:
+            written_at = self._last_write.get(user_id)
+            if written_at is not None and time.monotonic() - written_at < self._read_after_write_seconds:
+                self._reads["primary_after_write"] += 1
+                return self
+        replica = self._replicas[self._next_replica % len(self._replicas)]
+        self._next_replica += 1
+        self._reads["replica"] += 1
+        return replica
+
+    def mark_written(self, user_id: int) -> None:
+        # Pins the user's reads to the primary for read_after_write_seconds
+        if not self._replicas:
+            return
+        now = time.monotonic()
+        self._last_write[user_id] = now
+        if len(self._last_write) > 10000:
+            cutoff = now - self._read_after_write_seconds
+            self._last_write = {uid: t for uid, t in self._last_write.items() if t >= cutoff}
+
+    @staticmethod
+    async def _init_connection(con: asyncpg.Connection) -> None:
+        # Every statement sent on the connection, including those run inside connection()
+        # blocks, counts toward the current request's Server-Timing
+        con.add_query_logger(record_query)
+
     async def _ensure_connected(self) -> None:
         if self._pool is None:
             await self.connect()
 
-    async def execute(self, query: str, *args: Any) -> str:
+    @asynccontextmanager
+    async def connection(self, name: Optional[str] = None) -> AsyncIterator[asyncpg.Connection]:
+        # One pooled connection for the duration of the block, so a flow can run several
+        # statements without re-acquiring; time spent waiting for it is recorded. A named
+        # block is also timed as one query under that name.
         await self._ensure_connected()
-        async with self._pool.acquire() as con:
+        if self._in_use >= self._max_size:
+            self._counters["saturated"] += 1
+        self._waiting += 1
+        t0 = time.perf_counter()
+        try:
+            con = await self._pool.acquire(timeout=self._acquire_timeout)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise PoolAcquireTimeout(f"no connection free after {self._acquire_timeout}s") from None
+        finally:
+            self._waiting -= 1
+        wait = time.perf_counter() - t0
+        self._counters["acquires"] += 1
+        self._counters["wait_seconds_total"] += wait
+        self._waits.append(wait)
+        if metrics.enabled:
+            DB_POOL_WAIT_SECONDS.observe(wait, self._pool_label)
+        timing = current_timing()
+        if timing is not None:
+            timing.db_wait_seconds += wait
+        self._in_use += 1
+        t0 = time.perf_counter()
+        try:
+            yield con
+        finally:
+            self._in_use -= 1
+            if name is not None and metrics.enabled:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - t0, name)
+            await self._pool.release(con)
+            if timing is not None:
+                # Connection hold time, including the reset round trip on release
+                timing.db_seconds += time.perf_counter() - t0
+
+    @asynccontextmanager
+    async def transaction(self, name: Optional[str] = None) -> AsyncIterator[asyncpg.Connection]:
+        # One pooled connection for a multi-statement flow, committed or rolled back as a unit
+        async with self.connection(name) as con:
+            async with con.transaction():
+                yield con
+
+    # The one-statement helpers time the statement under `name`, or a name derived from
+    # the SQL (see query_name)
+    async def execute(self, query: str, *args: Any, name: Optional[str] = None) -> str:
+        async with self.connection(name or query_name(query)) as con:
             return await con.execute(query, *args)
 
-    async def fetch(self, query: str, *args: Any) -> List[asyncpg.Record]:
-        await self._ensure_connected()
-        async with self._pool.acquire() as con:
+    async def fetch(self, query: str, *args: Any, name: Optional[str] = None) -> List[asyncpg.Record]:
+        async with self.connection(name or query_name(query)) as con:
             return await con.fetch(query, *args)
 
-    async def fetchrow(self, query: str, *args: Any) -> Optional[asyncpg.Record]:
-        await self._ensure_connected()
-        async with self._pool.acquire() as con:
+    async def fetchrow(self, query: str, *args: Any, name: Optional[str] = None) -> Optional[asyncpg.Record]:
+        async with self.connection(name or query_name(query)) as con:
             return await con.fetchrow(query, *args)
 
-    async def fetchval(self, query: str, *args: Any) -> Any:
-        await self._ensure_connected()
-        async with self._pool.acquire() as con:
+    async def fetchval(self, query: str, *args: Any, name: Optional[str] = None) -> Any:
+        async with self.connection(name or query_name(query)) as con:
             return await con.fetchval(query, *args)
 
     async def init_schema(self, schema_path: Path) -> None:
-        await self._ensure_connected()
         sql = schema_path.read_text(encoding="utf-8")
-        async with self._pool.acquire() as con:
-            async with con.transaction():
-                await con.execute(sql)
+        async with self.transaction() as con:
+            # One-time backfills in the schema may outlast the request statement timeout
+            await con.execute("SET LOCAL statement_timeout = 0")
+            # Seeds in the schema that are per user read it with current_setting()
+            await con.execute("SELECT set_config('app.default_user_id', $1, true)", str(self._default_user_id))
+            await con.execute(sql)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        pick = lambda p: round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 3) if waits else 0.0
+        stats: Dict[str, Any] = {
+            "size": self._pool.get_size() if self._pool is not None else 0,
+            "idle": self._pool.get_idle_size() if self._pool is not None else 0,
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "min_size": self._min_size,
+            "max_size": self._max_size,
+            "acquires": int(self._counters["acquires"]),
+            # Acquires that found every connection busy and had to queue
+            "saturated": int(self._counters["saturated"]),
+            "timeouts": int(self._counters["timeouts"]),
+            "wait_ms_total": round(self._counters["wait_seconds_total"] * 1000, 1),
+            "wait_ms_p50": pick(0.5),
+            "wait_ms_p95": pick(0.95),
+            "wait_ms_p99": pick(0.99),
+            "wait_ms_max": round(waits[-1] * 1000, 3) if waits else 0.0,
+        }
+        if self._replicas:
+            stats["reads_routed"] = dict(self._reads)
+            stats["replicas"] = [replica.pool_stats() for replica in self._replicas]
+        return stats
 
 
 # Export a singleton Database instance for routers to import
 _settings = load_settings()
-db = Database(_settings["DATABASE_URL"])
-
-
+db = Database(
+    _settings["DATABASE_URL"],
+    min_size=_settings["DB_POOL_MIN_SIZE"],
+    max_size=_settings["DB_POOL_MAX_SIZE"],
+    acquire_timeout=_settings["DB_ACQUIRE_TIMEOUT_SECONDS"] or None,
+    statement_timeout_ms=_settings["DB_STATEMENT_TIMEOUT_MS"],
+    max_inactive_connection_lifetime=_settings["DB_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS"],
+    replica_dsns=_settings["DATABASE_REPLICA_URLS"],
+    read_after_write_seconds=_settings["REPLICA_READ_AFTER_WRITE_SECONDS"],
+    default_user_id=_settings["DEFAULT_USER_ID"],
+)
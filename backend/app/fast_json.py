@@ -0,0 +1,30 @@
+from typing import Any, Iterable
+
+import orjson
+from starlette.responses import Response
+
+
+def dumps(content: Any) -> bytes:
+    # Compact UTF-8 JSON, the same document Starlette's JSONResponse would render
+    return orjson.dumps(content)
+
+
+def join_array(items: Iterable[bytes]) -> bytes:
+    # A JSON array from already encoded elements
+    return b"[" + b",".join(items) + b"]"
+
+
+class FastJSONResponse(Response):
+    """JSON response for hot read endpoints in `FAST_JSON_RESPONSES` mode.
+
+    Accepts pre-encoded bytes as-is and encodes plain dicts/lists with orjson. Returning it
+    from a route skips FastAPI's `response_model` validation and `jsonable_encoder` pass, so
+    callers are responsible for producing the documented schema.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from google.genai import types as gen_types
+
+from .config import load_settings
+from .db import db
+
+
+logger = logging.getLogger("app.gen_cache")
+
+# Files API uploads are deleted after 48h; stop handing out handles a little before that
+FILE_HANDLE_TTL_SECONDS = 46 * 3600
+EVICTION_INTERVAL_SECONDS = 60.0
+
+
+def source_digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    # Whitespace-only edits (trailing spaces, CRLF vs LF) should not defeat the cache
+    return "\n".join(line.rstrip() for line in (text or "").strip().splitlines())
+
+
+class GenerationCache:
+    """Postgres-backed cache of generation results and uploaded Files API handles.
+
+    Result entries are keyed on the source digests, question count, prompt version and
+    models, and hold the MCQ JSON that was persisted for them. File entries are keyed on a
+    source digest and the API key (uploads belong to the key's project). Entries expire
+    after a TTL, and the least recently used ones are evicted once the table exceeds its
+    byte budget.
+    """
+
+    def __init__(self, enabled: bool, ttl_seconds: float, max_bytes: int) -> None:
+        self._enabled = enabled
+        self._ttl_seconds = ttl_seconds
+        self._max_bytes = max_bytes
+        self._last_eviction = 0.0
+        self._counters: Dict[str, int] = {
+            "result_hits": 0,
+            "result_misses": 0,
+            "file_hits": 0,
+            "file_misses": 0,
+            "evicted": 0,
+        }
+
+    @staticmethod
+    def result_key(source_digests: Iterable[str], count: int, prompt_version: str, models: Iterable[str]) -> str:
+        raw = json.dumps(
+            {"sources": list(source_digests), "count": count, "prompt": prompt_version, "models": list(models)},
+            sort_keys=True,
+        )
+        return "result:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def file_key(source_digest_hex: str, api_key: str) -> str:
+        key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        return f"file:{key_id}:{source_digest_hex}"
+
+    async def get_result(self, key: str) -> Optional[str]:
+        payload = await self._get(key)
+        self._counters["result_hits" if payload is not None else "result_misses"] += 1
+        return payload
+
+    async def put_result(self, key: str, mcq_json: str) -> None:
+        await self._put(key, "result", mcq_json, self._ttl_seconds)
+
+    async def get_file(self, key: str) -> Optional[gen_types.Part]:
+        payload = await self._get(key)
+        self._counters["file_hits" if payload is not None else "file_misses"] += 1
+        if payload is None:
+            return None
+        handle = json.loads(payload)
+        return gen_types.Part(file_data=gen_types.FileData(file_uri=handle["uri"], mime_type=handle["mime_type"]))
+
+    async def put_file(self, key: str, uploaded: gen_types.File) -> None:
+        if not uploaded.uri:
+            return
+        payload = json.dumps({"name": uploaded.name, "uri": uploaded.uri, "mime_type": uploaded.mime_type})
+        await self._put(key, "file", payload, min(self._ttl_seconds, FILE_HANDLE_TTL_SECONDS))
+
+    async def stats(self) -> Dict[str, Any]:
+        row = await db.fetchrow(
+            """
+            SELECT COUNT(*) FILTER (WHERE kind = 'result')::int AS results,
+                   COUNT(*) FILTER (WHERE kind = 'file')::int AS files,
+                   COALESCE(SUM(size_bytes), 0)::bigint AS size_bytes
+            FROM generation_cache
+            WHERE expires_at > NOW()
+            """
+        )
+        lookups = self._counters["result_hits"] + self._counters["result_misses"]
+        return {
+            "enabled": self._enabled,
+            **self._counters,
+            "result_hit_rate": round(self._counters["result_hits"] / lookups, 4) if lookups else 0.0,
+            "entries": {"results": row["results"], "files": row["files"]} if row else {},
+            "size_bytes": int(row["size_bytes"]) if row else 0,
+            "max_bytes": self._max_bytes,
+            "ttl_seconds": self._ttl_seconds,
+        }
+
+    async def evict(self) -> int:
+        expired = await db.execute("DELETE FROM generation_cache WHERE expires_at <= NOW()")
+        # Keep the most recently used entries that fit in the byte budget
+        over_budget = await db.execute(
+            """
+            DELETE FROM generation_cache
+            WHERE cache_key IN (
+                SELECT cache_key FROM (
+                    SELECT cache_key, SUM(size_bytes) OVER (ORDER BY last_hit_at DESC, cache_key) AS running_bytes
+                    FROM generation_cache
+                ) ranked
+                WHERE running_bytes > $1
+            )
+            """,
+            self._max_bytes,
+        )
+        removed = int(expired.split()[-1]) + int(over_budget.split()[-1])
+        self._counters["evicted"] += removed
+        return removed
+
+    async def _get(self, key: str) -> Optional[str]:
+        if not self._enabled:
+            return None
+        return await db.fetchval(
+            """
+            UPDATE generation_cache
+            SET hits = hits + 1, last_hit_at = NOW()
+            WHERE cache_key = $1 AND expires_at > NOW()
+            RETURNING payload
+            """,
+            key,
+        )
+
+    async def _put(self, key: str, kind: str, payload: str, ttl_seconds: float) -> None:
+        if not self._enabled:
+            return
+        await db.execute(
+            """
+            INSERT INTO generation_cache(cache_key, kind, payload, size_bytes, expires_at)
+            VALUES ($1, $2, $3, $4, NOW() + make_interval(secs => $5))
+            ON CONFLICT (cache_key) DO UPDATE
+            SET payload = EXCLUDED.payload, size_bytes = EXCLUDED.size_bytes,
+                last_hit_at = NOW(), expires_at = EXCLUDED.expires_at
+            """,
+            key,
+            kind,
+            payload,
+            len(payload.encode("utf-8")),
+            float(ttl_seconds),
+        )
+        now = time.monotonic()
+        if now - self._last_eviction >= EVICTION_INTERVAL_SECONDS:
+            self._last_eviction = now
+            try:
+                removed = await self.evict()
+                if removed:
+                    logger.info(f"generation_cache_evicted count={removed}")
+            except Exception:
+                logger.exception("generation_cache_eviction_failed")
+
+
+_settings = load_settings()
+generation_cache = GenerationCache(
+    enabled=_settings["GENERATION_CACHE_ENABLED"],
+    ttl_seconds=_settings["GENERATION_CACHE_TTL_HOURS"] * 3600,
+    max_bytes=_settings["GENERATION_CACHE_MAX_BYTES"],
+)
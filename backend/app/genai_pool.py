@@ -0,0 +1,132 @@
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, TypeVar
+
+from fastapi import HTTPException
+from google import genai
+from google.genai.errors import ClientError, ServerError
+
+from .config import load_settings
+
+
+logger = logging.getLogger("app.genai_pool")
+
+T = TypeVar("T")
+
+
+def is_throttled(exc: Exception) -> bool:
+    # 429 RESOURCE_EXHAUSTED is per key/project: rate limit or spent quota
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    return code == 429 or "RESOURCE_EXHAUSTED" in str(exc)
+
+
+def is_overloaded(exc: Exception) -> bool:
+    # 503 UNAVAILABLE is model-wide overload, not a problem with the key
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    return code == 503 or "UNAVAILABLE" in str(exc)
+
+
+class KeyState:
+    """One API key with its long-lived client and health counters."""
+
+    def __init__(self, api_key: str) -> None:
+        self.api_key = api_key
+        self.label = f"...{api_key[-4:]}" if len(api_key) > 8 else "..."
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.unavailable = 0
+        self.cooldown_until = 0.0
+        self.recent_errors: Deque[float] = deque(maxlen=32)
+        self._client: Optional[genai.Client] = None
+
+    @property
+    def client(self) -> genai.Client:
+        if self._client is None:
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    def recent_error_count(self, now: float, window: float) -> int:
+        return sum(1 for t in self.recent_errors if now - t <= window)
+
+
+class GenAIKeyPool:
+    """Routes GenAI work to the least-loaded healthy API key.
+
+    A key that answers 429 is put in cooldown and the work is retried transparently on
+    another key. Among keys not cooling down, the one with the fewest requests in flight
+    wins, then the one with the fewest recent 429/503s, then the least used overall.
+    """
+
+    def __init__(self, api_keys: List[str], cooldown_seconds: float, error_window_seconds: float) -> None:
+        self._states = [KeyState(k) for k in dict.fromkeys(api_keys) if k]
+        self._cooldown_seconds = cooldown_seconds
+        self._error_window = error_window_seconds
+
+    @property
+    def configured(self) -> bool:
+        return bool(self._states)
+
+    def _pick(self, exclude: Set[str]) -> KeyState:
+        now = time.monotonic()
+        candidates = [s for s in self._states if s.api_key not in exclude]
+        healthy = [s for s in candidates if s.cooldown_until <= now]
+        if healthy:
+            return min(healthy, key=lambda s: (s.in_flight, s.recent_error_count(now, self._error_window), s.calls))
+        # Everything is cooling down: use the key that recovers first rather than failing
+        return min(candidates, key=lambda s: s.cooldown_until)
+
+    async def run(self, fn: Callable[[KeyState], Awaitable[T]]) -> T:
+        if not self._states:
+            raise HTTPException(status_code=400, detail="genai_api_key_missing")
+        tried: Set[str] = set()
+        while len(tried) < len(self._states):
+            state = self._pick(tried)
+            tried.add(state.api_key)
+            state.in_flight += 1
+            state.calls += 1
+            try:
+                return await fn(state)
+            except ClientError as exc:
+                if not is_throttled(exc):
+                    raise
+                now = time.monotonic()
+                state.throttled += 1
+                state.recent_errors.append(now)
+                state.cooldown_until = now + self._cooldown_seconds
+                logger.warning(
+                    f"genai_key_throttled key={state.label} cooldown_s={self._cooldown_seconds:.0f} "
+                    f"tried={len(tried)}/{len(self._states)}"
+                )
+            except ServerError as exc:
+                if is_overloaded(exc):
+                    state.unavailable += 1
+                    state.recent_errors.append(time.monotonic())
+                raise
+            finally:
+                state.in_flight -= 1
+        raise HTTPException(status_code=429, detail="genai_keys_throttled")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [
+            {
+                "key": s.label,
+                "in_flight": s.in_flight,
+                "calls": s.calls,
+                "throttled": s.throttled,
+                "unavailable": s.unavailable,
+                "recent_errors": s.recent_error_count(now, self._error_window),
+                "cooldown_remaining_s": round(max(0.0, s.cooldown_until - now), 1),
+            }
+            for s in self._states
+        ]
+
+
+_settings = load_settings()
+genai_keys = GenAIKeyPool(
+    api_keys=_settings["GENAI_API_KEYS"],
+    cooldown_seconds=_settings["GENAI_KEY_COOLDOWN_SECONDS"],
+    error_window_seconds=_settings["GENAI_KEY_ERROR_WINDOW_SECONDS"],
+)
@@ -0,0 +1,242 @@
+import abc
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import math
+import random
+import re
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar, cast
+
+from google.genai import types as gen_types
+from google.genai.errors import ServerError
+
+from .config import load_settings
+from .genai_pool import GenAIKeyPool, KeyState, genai_keys
+
+
+logger = logging.getLogger("app.genai_provider")
+
+T = TypeVar("T")
+
+
+class GenerationProvider(abc.ABC):
+    """Where generation sends uploads and model calls.
+
+    `run` picks the key a unit of work runs under (and retries it elsewhere if the provider
+    supports that); `upload`, `generate` and `stream` are the calls the pipeline makes with
+    that key. Prompting, fallback, caching and persistence stay in the pipeline.
+    """
+
+    name = "base"
+
+    @property
+    @abc.abstractmethod
+    def configured(self) -> bool: ...
+
+    @abc.abstractmethod
+    async def run(self, fn: Callable[[KeyState], Awaitable[T]]) -> T: ...
+
+    @abc.abstractmethod
+    async def upload(self, key: KeyState, content: bytes, mime_type: Optional[str]) -> gen_types.File: ...
+
+    @abc.abstractmethod
+    async def generate(self, key: KeyState, parts: List[Any], model: str, config: gen_types.GenerateContentConfig) -> str: ...
+
+    @abc.abstractmethod
+    def stream(
+        self, key: KeyState, parts: List[Any], model: str, config: gen_types.GenerateContentConfig
+    ) -> AsyncIterator[str]: ...
+
+
+class GeminiProvider(GenerationProvider):
+    """Google GenAI through the API key pool (the default)."""
+
+    name = "gemini"
+
+    def __init__(self, keys: GenAIKeyPool) -> None:
+        self._keys = keys
+
+    @property
+    def configured(self) -> bool:
+        return self._keys.configured
+
+    async def run(self, fn: Callable[[KeyState], Awaitable[T]]) -> T:
+        return await self._keys.run(fn)
+
+    async def upload(self, key: KeyState, content: bytes, mime_type: Optional[str]) -> gen_types.File:
+        return await key.client.aio.files.upload(file=io.BytesIO(content), config=dict(mime_type=mime_type))
+
+    async def generate(self, key: KeyState, parts: List[Any], model: str, config: gen_types.GenerateContentConfig) -> str:
+        response = await key.client.aio.models.generate_content(model=model, contents=cast(Any, parts), config=config)
+        return response.text or ""
+
+    async def stream(
+        self, key: KeyState, parts: List[Any], model: str, config: gen_types.GenerateContentConfig
+    ) -> AsyncIterator[str]:
+        stream = await key.client.aio.models.generate_content_stream(model=model, contents=cast(Any, parts), config=config)
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+
+# build_generation_prompt asks for "generate {count} high-efficacy ..."
+_PROMPT_COUNT_RE = re.compile(r"generate (\d+) ")
+
+_WORDS = (
+    "retrieval interval memory schema entropy gradient kernel latency quorum replica cache "
+    "protein enzyme neuron synapse glacier monsoon tariff inflation treaty dynasty sonnet "
+    "photon orbit nebula catalyst isotope membrane lattice vector tensor socket buffer "
+    "packet ledger auction cartel estuary delta basalt magma fresco cadence harmony prism"
+).split()
+
+
+class ReplayProvider(GenerationProvider):
+    """Local stand-in for the model: schema-valid MCQ arrays, no keys and no network.
+
+    Each call sleeps a log-normal time to first token, then emits its JSON in chunks with a
+    per-chunk delay (all at once for non-streaming calls, after the same total time).
+    Content is seeded per call, so a run is reproducible while successive calls produce
+    distinct questions that pass the near-duplicate check. Items come from GENAI_REPLAY_FILE
+    (a JSON array of recorded MCQs) when set. Injected failures: a 503 ServerError before
+    the first token, or one corrupt object in the array.
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        seed: int,
+        latency_ms: float,
+        latency_sigma: float,
+        token_ms: float,
+        chunk_chars: int,
+        unavailable_rate: float,
+        malformed_rate: float,
+        replay_file: str = "",
+    ) -> None:
+        self._seed = seed
+        self._latency_ms = latency_ms
+        self._latency_sigma = latency_sigma
+        self._token_ms = token_ms
+        self._chunk_chars = max(1, chunk_chars)
+        self._unavailable_rate = unavailable_rate
+        self._malformed_rate = malformed_rate
+        self._recorded: List[Dict[str, Any]] = []
+        if replay_file:
+            self._recorded = json.loads(Path(replay_file).read_text(encoding="utf-8"))
+        self._rng = random.Random(seed)
+        self._calls = 0
+        self._key = KeyState("replay")
+        self.injected_unavailable = 0
+        self.injected_malformed = 0
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    async def run(self, fn: Callable[[KeyState], Awaitable[T]]) -> T:
+        self._key.in_flight += 1
+        self._key.calls += 1
+        try:
+            return await fn(self._key)
+        finally:
+            self._key.in_flight -= 1
+
+    async def upload(self, key: KeyState, content: bytes, mime_type: Optional[str]) -> gen_types.File:
+        digest = hashlib.sha256(content).hexdigest()[:16]
+        return gen_types.File(name=f"files/replay-{digest}", uri=f"replay://files/{digest}", mime_type=mime_type)
+
+    async def generate(self, key: KeyState, parts: List[Any], model: str, config: gen_types.GenerateContentConfig) -> str:
+        chunks = await self._start(parts, model)
+        await asyncio.sleep(self._token_ms * len(chunks) / 1000)
+        return "".join(chunks)
+
+    async def stream(
+        self, key: KeyState, parts: List[Any], model: str, config: gen_types.GenerateContentConfig
+    ) -> AsyncIterator[str]:
+        chunks = await self._start(parts, model)
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(self._token_ms / 1000)
+
+    async def _start(self, parts: List[Any], model: str) -> List[str]:
+        # Decides this call's fate up front, waits out the time to first token and returns
+        # the response text split into stream chunks
+        self._calls += 1
+        call = self._calls
+        latency = self._latency_ms * math.exp(self._latency_sigma * self._rng.gauss(0.0, 1.0))
+        unavailable = self._rng.random() < self._unavailable_rate
+        malformed = self._rng.random() < self._malformed_rate
+        await asyncio.sleep(latency / 1000)
+        if unavailable:
+            self.injected_unavailable += 1
+            raise ServerError(
+                503,
+                {"error": {"code": 503, "message": f"replay: injected overload on {model}", "status": "UNAVAILABLE"}},
+            )
+        text = self._response_text(call, _requested_count(parts), malformed)
+        if malformed:
+            self.injected_malformed += 1
+        return [text[i : i + self._chunk_chars] for i in range(0, len(text), self._chunk_chars)]
+
+    def _response_text(self, call: int, count: int, malformed: bool) -> str:
+        rng = random.Random(f"{self._seed}:{call}")
+        if self._recorded:
+            start = (call - 1) * count
+            items = [self._recorded[(start + i) % len(self._recorded)] for i in range(count)]
+        else:
+            items = [_synthetic_item(rng, call, i) for i in range(count)]
+        encoded = [json.dumps(item) for item in items]
+        if malformed and encoded:
+            # Balanced braces, so a streaming parser skips just this object
+            encoded[rng.randrange(len(encoded))] = '{"question_text": truncated}'
+        return "[" + ", ".join(encoded) + "]"
+
+
+def _requested_count(parts: List[Any]) -> int:
+    for part in reversed(parts):
+        if isinstance(part, str):
+            match = _PROMPT_COUNT_RE.search(part)
+            if match:
+                return int(match.group(1))
+    return 5
+
+
+def _synthetic_item(rng: random.Random, call: int, index: int) -> Dict[str, Any]:
+    def words(n: int) -> str:
+        return " ".join(rng.choice(_WORDS) for _ in range(n))
+
+    return {
+        "question_text": f"Replay {call}.{index}: which {words(6)} best explains {words(6)}?",
+        "explanation": f"Core principle: {words(20)}.",
+        "choices": [words(5) for _ in range(4)],
+        "correct_index": rng.randrange(4),
+        "topic": "Synthetic Load",
+        "sub_topic": f"Replay {words(1)}",
+    }
+
+
+def build_provider(settings: Dict[str, Any]) -> GenerationProvider:
+    name = settings["GENAI_PROVIDER"]
+    if name == "gemini":
+        return GeminiProvider(genai_keys)
+    if name == "replay":
+        logger.warning("genai_provider=replay: generation returns synthetic questions, no model is called")
+        return ReplayProvider(
+            seed=settings["GENAI_REPLAY_SEED"],
+            latency_ms=settings["GENAI_REPLAY_LATENCY_MS"],
+            latency_sigma=settings["GENAI_REPLAY_LATENCY_SIGMA"],
+            token_ms=settings["GENAI_REPLAY_TOKEN_MS"],
+            chunk_chars=settings["GENAI_REPLAY_CHUNK_CHARS"],
+            unavailable_rate=settings["GENAI_REPLAY_UNAVAILABLE_RATE"],
+            malformed_rate=settings["GENAI_REPLAY_MALFORMED_RATE"],
+            replay_file=settings["GENAI_REPLAY_FILE"],
+        )
+    raise RuntimeError(f"GENAI_PROVIDER must be gemini or replay, got {name!r}")
+
+
+_settings = load_settings()
+genai_provider = build_provider(_settings)
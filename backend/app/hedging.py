@@ -0,0 +1,84 @@
+import random
+from collections import deque
+from typing import Deque, Dict
+
+from .config import load_settings
+
+
+class LatencyTracker:
+    """Recent latencies per model; the hedge threshold is a percentile of them.
+
+    Until a model has `min_samples` observations the threshold is `initial_seconds`, and it
+    never drops below `floor_seconds`, so a run of fast calls cannot make every call hedge.
+    """
+
+    def __init__(self, percentile: float, window: int, min_samples: int, initial_seconds: float, floor_seconds: float) -> None:
+        self._percentile = min(100.0, max(0.0, percentile))
+        self._window = max(1, window)
+        self._min_samples = max(1, min_samples)
+        self._initial_seconds = initial_seconds
+        self._floor_seconds = floor_seconds
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def observe(self, model: str, seconds: float) -> None:
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self._window)
+        samples.append(seconds)
+
+    def threshold(self, model: str) -> float:
+        samples = self._samples.get(model)
+        if samples is None or len(samples) < self._min_samples:
+            return self._initial_seconds
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self._percentile / 100.0))
+        return max(self._floor_seconds, ordered[index])
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {
+            model: {"samples": len(samples), "hedge_after_s": round(self.threshold(model), 2)}
+            for model, samples in self._samples.items()
+        }
+
+
+class RetryBudget:
+    """Token bucket that caps retries and hedges at a share of first attempts.
+
+    Every first attempt deposits `ratio` tokens (up to `max_tokens`); a retry or hedge spends
+    a whole one. When the model is down for everyone, extra calls stop after the bucket
+    drains instead of multiplying the load.
+    """
+
+    def __init__(self, ratio: float, max_tokens: float) -> None:
+        self._ratio = max(0.0, ratio)
+        self._max_tokens = max(1.0, max_tokens)
+        self._tokens = self._max_tokens
+
+    def record_attempt(self) -> None:
+        self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    # Full jitter: uniform over [0, base * 2^(attempt - 1)], capped
+    return random.uniform(0.0, min(max_seconds, base_seconds * (2 ** max(0, attempt - 1))))
+
+
+_settings = load_settings()
+genai_latency = LatencyTracker(
+    percentile=_settings["GENAI_HEDGE_PERCENTILE"],
+    window=256,
+    min_samples=_settings["GENAI_HEDGE_MIN_SAMPLES"],
+    initial_seconds=_settings["GENAI_HEDGE_INITIAL_SECONDS"],
+    floor_seconds=_settings["GENAI_HEDGE_MIN_SECONDS"],
+)
+genai_retry_budget = RetryBudget(ratio=_settings["GENAI_RETRY_BUDGET_RATIO"], max_tokens=10.0)
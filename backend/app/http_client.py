@@ -0,0 +1,50 @@
+from typing import Optional
+
+import httpx
+
+from .config import load_settings
+
+
+class SourceHttpClient:
+    """App-lifetime HTTP client used to fetch generation sources.
+
+    One pooled client keeps connections and TLS sessions alive across requests. It is
+    opened in the app lifespan, or lazily on first use where there is no lifespan
+    (serverless).
+    """
+
+    def __init__(self, timeout_seconds: float, max_connections: int, max_keepalive: int, keepalive_expiry: float) -> None:
+        self._timeout = timeout_seconds
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def get(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=self._timeout,
+                limits=self._limits,
+                http2=True,
+            )
+        return self._client
+
+    async def open(self) -> None:
+        self.get()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_settings = load_settings()
+source_http = SourceHttpClient(
+    timeout_seconds=_settings["SOURCE_FETCH_TIMEOUT_SECONDS"],
+    max_connections=_settings["SOURCE_HTTP_MAX_CONNECTIONS"],
+    max_keepalive=_settings["SOURCE_HTTP_MAX_KEEPALIVE"],
+    keepalive_expiry=_settings["SOURCE_HTTP_KEEPALIVE_EXPIRY_SECONDS"],
+)
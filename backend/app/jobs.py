@@ -0,0 +1,258 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import HTTPException
+
+from .config import load_settings
+from .db import db
+
+
+logger = logging.getLogger("app.jobs")
+
+StageCallback = Callable[[str], Awaitable[None]]
+JobRunner = Callable[[str, Dict[str, Any], Optional[bytes], StageCallback], Awaitable[Dict[str, Any]]]
+
+
+class GenerationJobQueue:
+    """Postgres-backed queue of generation requests drained by in-process async workers.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so several API processes can share the
+    table. Workers heartbeat while a job runs; a job whose heartbeat goes stale (crash,
+    redeploy) is put back in the queue until it runs out of attempts.
+    """
+
+    def __init__(self, concurrency: int, max_attempts: int, stale_after_seconds: float, poll_interval_seconds: float) -> None:
+        self._concurrency = max(0, concurrency)
+        self._max_attempts = max(1, max_attempts)
+        self._stale_after = max(5.0, stale_after_seconds)
+        self._poll_interval = max(0.1, poll_interval_seconds)
+        self._runner: Optional[JobRunner] = None
+        self._tasks: List[asyncio.Task] = []
+        self._active: Set[int] = set()
+        self._wakeup = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, runner: JobRunner) -> None:
+        # Zero workers: this process never claims jobs, so background requests get a 503
+        if self._tasks or not self._concurrency:
+            return
+        self._runner = runner
+        recovered = await self._recover_stale_jobs()
+        if recovered:
+            logger.info(f"generation_jobs_recovered count={recovered}")
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self._concurrency)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._active:
+            # Hand interrupted jobs straight back instead of waiting for their heartbeat to go stale
+            await db.execute(
+                "UPDATE generation_jobs SET status = 'queued', stage = 'queued' WHERE id = ANY($1) AND status = 'running'",
+                list(self._active),
+            )
+            self._active.clear()
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], blob: Optional[bytes] = None) -> int:
+        job_id = await db.fetchval(
+            """
+            INSERT INTO generation_jobs(kind, payload, source_blob)
+            VALUES ($1, $2::jsonb, $3)
+            RETURNING id
+            """,
+            kind,
+            json.dumps(payload),
+            blob,
+        )
+        self._wakeup.set()
+        return int(job_id)
+
+    async def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = await db.fetchrow(
+            """
+            SELECT id, kind, status, stage, attempts, result, error, timings,
+                   created_at, started_at, finished_at
+            FROM generation_jobs
+            WHERE id = $1
+            """,
+            job_id,
+        )
+        if row is None:
+            return None
+        result = json.loads(row["result"]) if row["result"] else None
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "attempts": row["attempts"],
+            "created": (result or {}).get("created"),
+            "result": result,
+            "error": row["error"],
+            "timings_ms": json.loads(row["timings"]) if row["timings"] else {},
+            "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+            "started_at": row["started_at"].isoformat() if row["started_at"] else None,
+            "finished_at": row["finished_at"].isoformat() if row["finished_at"] else None,
+        }
+
+    async def _recover_stale_jobs(self) -> int:
+        # Jobs whose worker stopped heartbeating are re-queued, or failed once out of attempts
+        rows = await db.fetch(
+            """
+            UPDATE generation_jobs
+            SET status = CASE WHEN attempts >= $2 THEN 'failed' ELSE 'queued' END,
+                stage = CASE WHEN attempts >= $2 THEN stage ELSE 'queued' END,
+                error = CASE WHEN attempts >= $2 THEN 'abandoned_after_retries' ELSE error END,
+                finished_at = CASE WHEN attempts >= $2 THEN NOW() ELSE NULL END
+            WHERE status = 'running'
+              AND COALESCE(heartbeat_at, started_at, created_at) < NOW() - make_interval(secs => $1)
+            RETURNING id
+            """,
+            self._stale_after,
+            self._max_attempts,
+        )
+        return len(rows)
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        row = await db.fetchrow(
+            """
+            UPDATE generation_jobs
+            SET status = 'running', stage = 'starting', attempts = attempts + 1,
+                started_at = NOW(), heartbeat_at = NOW(), timings = '{}'::jsonb
+            WHERE id = (
+                SELECT id FROM generation_jobs
+                WHERE status = 'queued'
+                ORDER BY id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, kind, payload, source_blob
+            """
+        )
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "payload": json.loads(row["payload"]),
+            "blob": row["source_blob"],
+        }
+
+    async def _worker(self, worker_index: int) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"generation_job_claim_failed worker={worker_index}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"generation_job_bookkeeping_failed id={job['id']}")
+
+    async def _janitor(self) -> None:
+        while True:
+            await asyncio.sleep(self._stale_after)
+            try:
+                recovered = await self._recover_stale_jobs()
+                if recovered:
+                    logger.info(f"generation_jobs_recovered count={recovered}")
+                    self._wakeup.set()
+            except Exception:
+                logger.exception("generation_job_recovery_failed")
+
+    async def _heartbeat(self, job_id: int) -> None:
+        while True:
+            await asyncio.sleep(self._stale_after / 4)
+            try:
+                await db.execute("UPDATE generation_jobs SET heartbeat_at = NOW() WHERE id = $1", job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # One failed write must not stop the heartbeat, or the running job goes stale and runs twice
+                logger.exception(f"generation_job_heartbeat_failed id={job_id}")
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        self._active.add(job_id)
+        timings: Dict[str, int] = {}
+        current = {"stage": "starting", "since": time.perf_counter()}
+        started = current["since"]
+
+        async def on_stage(stage: str) -> None:
+            now = time.perf_counter()
+            timings[current["stage"]] = int((now - current["since"]) * 1000)
+            current["stage"], current["since"] = stage, now
+            await db.execute(
+                "UPDATE generation_jobs SET stage = $2, timings = $3::jsonb, heartbeat_at = NOW() WHERE id = $1",
+                job_id,
+                stage,
+                json.dumps(timings),
+            )
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        status, result, error = "failed", None, None
+        try:
+            assert self._runner is not None
+            result = await self._runner(job["kind"], job["payload"], job["blob"], on_stage)
+            status = "done"
+        except asyncio.CancelledError:
+            raise
+        except HTTPException as exc:
+            error = str(exc.detail)
+        except Exception as exc:
+            logger.exception(f"generation_job_failed id={job_id}")
+            error = f"{type(exc).__name__}: {exc}"
+        finally:
+            heartbeat.cancel()
+
+        now = time.perf_counter()
+        timings[current["stage"]] = int((now - current["since"]) * 1000)
+        timings["total"] = int((now - started) * 1000)
+        await db.execute(
+            """
+            UPDATE generation_jobs
+            SET status = $2, stage = $3, result = $4::jsonb, error = $5, timings = $6::jsonb,
+                finished_at = NOW(), source_blob = NULL
+            WHERE id = $1
+            """,
+            job_id,
+            status,
+            status if status == "done" else current["stage"],
+            json.dumps(result) if result is not None else None,
+            error,
+            json.dumps(timings),
+        )
+        self._active.discard(job_id)
+        logger.info(
+            f"generation_job_finished id={job_id} status={status} created={(result or {}).get('created', 0)} duration_ms={timings['total']}"
+        )
+
+
+_settings = load_settings()
+generation_jobs = GenerationJobQueue(
+    concurrency=_settings["GENERATION_WORKERS"],
+    max_attempts=_settings["GENERATION_JOB_MAX_ATTEMPTS"],
+    stale_after_seconds=_settings["GENERATION_JOB_STALE_SECONDS"],
+    poll_interval_seconds=_settings["GENERATION_JOB_POLL_SECONDS"],
+)
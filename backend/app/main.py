@@ -6,16 +6,22 @@ import os
 import time
 
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.trustedhost import TrustedHostMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
 from .config import load_settings
-from .db import db, Database
+from .db import PoolAcquireTimeout, db, Database
+from .http_client import source_http
+from .jobs import generation_jobs
+from .metrics import HTTP_REQUEST_SECONDS, metrics
+from .request_timing import start_request_timing
 from .routers import topics as topics_router
 from .routers import questions as questions_router
 from .routers import streak as streak_router
 from .routers import generate as generate_router
+from .routers import review as review_router
 
 
 settings = load_settings()
@@ -39,10 +45,15 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
         await db.connect()
         schema_path = Path(__file__).parent / "sql" / "schema.sql"
         await db.init_schema(schema_path)
+        await source_http.open()
+        # Background generation workers need a long-lived process; serverless runs inline only
+        await generation_jobs.start(generate_router.run_generation)
     
     yield
     
     if not is_serverless:
+        await generation_jobs.stop()
+        await source_http.close()
         await db.disconnect()
 
 
@@ -65,36 +76,70 @@ async def record_request_timing(request: Request, call_next):
     start_time = time.perf_counter()
     method = request.method
     path = request.url.path
+    # Database statements, pool waits and GenAI calls made for this request add up here
+    timing = start_request_timing()
 
     try:
         response = await call_next(request)
         status_code = getattr(response, "status_code", 0)
         duration_seconds = time.perf_counter() - start_time
         duration_ms = int(duration_seconds * 1000)
+        if metrics.enabled:
+            # Route template, not the raw path, keeps label cardinality bounded
+            route = getattr(request.scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(duration_seconds, method, route, str(status_code))
         # Expose timing to clients for easy measurement
         response.headers["X-Process-Time"] = f"{duration_seconds:.6f}"
         response.headers["X-Process-Time-Ms"] = str(duration_ms)
+        # Breakdown for browser devtools; streamed bodies (e.g. /generate/stream) only count
+        # work done before the headers went out
+        response.headers["Server-Timing"] = timing.server_timing(duration_seconds)
+        response.headers["Timing-Allow-Origin"] = "*"
         # Log concise structured line for server-side analysis (no special formatter needed)
         timing_logger.info(
-            f"request_completed method={method} path={path} status_code={status_code} duration_ms={duration_ms}"
+            f"request_completed method={method} path={path} status_code={status_code} duration_ms={duration_ms} "
+            f"db_count={timing.db_count} db_ms={timing.db_seconds * 1000:.1f} db_wait_ms={timing.db_wait_seconds * 1000:.1f} "
+            f"genai_count={timing.genai_count} genai_ms={timing.genai_seconds * 1000:.1f}"
         )
         return response
     except Exception:
         duration_seconds = time.perf_counter() - start_time
         duration_ms = int(duration_seconds * 1000)
         timing_logger.exception(
-            f"request_failed method={method} path={path} status_code=500 duration_ms={duration_ms}"
+            f"request_failed method={method} path={path} status_code=500 duration_ms={duration_ms} "
+            f"db_count={timing.db_count} db_ms={timing.db_seconds * 1000:.1f} genai_ms={timing.genai_seconds * 1000:.1f}"
         )
         raise
 
 
+@app.exception_handler(PoolAcquireTimeout)
+async def pool_acquire_timeout(request: Request, exc: PoolAcquireTimeout):
+    # Every pooled connection stayed busy for DB_ACQUIRE_TIMEOUT_SECONDS; shed the request
+    timing_logger.warning(f"db_pool_exhausted method={request.method} path={request.url.path}")
+    return JSONResponse(status_code=503, content={"detail": "database_busy"})
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
+
+@app.get("/health/db")
+async def health_db():
+    # Pool size, in-use and waiting connections, and acquire wait percentiles for sizing
+    return db.pool_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    if not metrics.enabled:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.include_router(topics_router.router)
 app.include_router(questions_router.router)
 app.include_router(streak_router.router)
 app.include_router(generate_router.router)
+app.include_router(review_router.router)
 
 
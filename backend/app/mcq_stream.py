@@ -0,0 +1,67 @@
+import json
+import logging
+from typing import Any, Dict, List
+
+
+logger = logging.getLogger("app.mcq_stream")
+
+
+class McqArrayStreamParser:
+    """Incrementally splits a streamed JSON array of MCQ objects into complete objects.
+
+    Text is fed in whatever chunks the model emits; each call returns the top-level
+    objects that were completed by that chunk. Only the object currently being read is
+    buffered, and an object that fails to parse is dropped without ending the stream.
+    """
+
+    def __init__(self) -> None:
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self.completed = 0
+        self.malformed = 0
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        for ch in text:
+            if self._depth == 0:
+                # Between objects: skip the enclosing '[', separators and whitespace
+                if ch == "{":
+                    self._depth = 1
+                    self._buffer = [ch]
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    item = self._decode("".join(self._buffer))
+                    self._buffer = []
+                    if item is not None:
+                        items.append(item)
+        return items
+
+    def _decode(self, raw: str) -> Any:
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            self.malformed += 1
+            logger.warning(f"mcq_stream_malformed_object length={len(raw)}")
+            return None
+        if not isinstance(item, dict):
+            self.malformed += 1
+            return None
+        self.completed += 1
+        return item
@@ -0,0 +1,150 @@
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+from .config import load_settings
+
+
+# Seconds; request and query latencies
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds; pool acquire waits are usually zero and only grow when the pool saturates
+WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+# Seconds; model calls take seconds to minutes
+GENAI_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        if not self.label_names:
+            self._values[()] = 0.0
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram per label set; an observation is one bisect and two adds."""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(self.label_names, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            series_labels = _labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{series_labels} {_number(total)}")
+            lines.append(f"{self.name}_count{series_labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text format at GET /metrics.
+
+    Values live in plain dicts touched only from the event loop, so recording needs no
+    locks. Each worker process keeps its own registry; Prometheus sums across them.
+    """
+
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self._metrics: List = []
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float]) -> Histogram:
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_settings = load_settings()
+metrics = MetricsRegistry(enabled=_settings["METRICS_ENABLED"])
+
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template and status code.",
+    ("method", "route", "status"),
+    LATENCY_BUCKETS,
+)
+DB_QUERY_SECONDS = metrics.histogram(
+    "db_query_duration_seconds",
+    "Database statement latency by query name, excluding pool wait.",
+    ("query",),
+    LATENCY_BUCKETS,
+)
+DB_POOL_WAIT_SECONDS = metrics.histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a pooled connection.",
+    ("pool",),
+    WAIT_BUCKETS,
+)
+GENAI_CALL_SECONDS = metrics.histogram(
+    "genai_call_duration_seconds",
+    "GenAI call latency by model, role (primary, fallback or hedge) and outcome.",
+    ("model", "role", "outcome"),
+    GENAI_BUCKETS,
+)
+GENAI_HEDGES = metrics.counter(
+    "genai_hedges_total",
+    "Slow primary calls and what happened: hedge_won, primary_won, both_failed, or skipped (no budget or slot).",
+    ("outcome",),
+)
+GENAI_RETRIES = metrics.counter(
+    "genai_retries_total",
+    "Retries after an overloaded model call: retried, budget_exhausted, attempts_exhausted or deadline.",
+    ("outcome",),
+)
+GENERATION_ITEMS_PERSISTED = metrics.counter(
+    "generation_items_persisted_total",
+    "Generated questions stored.",
+)
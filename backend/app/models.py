@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import List, Optional
 
 from pydantic import BaseModel
@@ -14,6 +15,22 @@ class SubTopic(BaseModel):
     topic_id: int
 
 
+class TopicTreeSubTopic(SubTopic):
+    question_count: int
+    unanswered_count: int
+
+
+class TopicTreeNode(Topic):
+    question_count: int
+    unanswered_count: int
+    sub_topics: List[TopicTreeSubTopic]
+
+
+class TopicTreeResponse(BaseModel):
+    version: str
+    topics: List[TopicTreeNode]
+
+
 class Choice(BaseModel):
     id: int
     question_id: int
@@ -40,6 +57,33 @@ class AnswerResponse(BaseModel):
     correct_choice_id: int
 
 
+class BatchAnswerItem(BaseModel):
+    client_answer_id: str
+    question_id: int
+    choice_id: int
+    answered_at: Optional[datetime] = None
+
+
+class BatchAnswerRequest(BaseModel):
+    answers: List[BatchAnswerItem]
+
+
+class BatchAnswerResult(BaseModel):
+    client_answer_id: str
+    status: str  # recorded | duplicate | invalid_choice
+    is_correct: Optional[bool] = None
+    correct_choice_id: Optional[int] = None
+
+
+class BatchAnswerResponse(BaseModel):
+    recorded: int
+    results: List[BatchAnswerResult]
+
+
+class StreakGoalRequest(BaseModel):
+    streak_goal: int
+
+
 class StreakResponse(BaseModel):
     current_streak_days: int
     today_answers_count: int
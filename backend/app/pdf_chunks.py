@@ -0,0 +1,113 @@
+import io
+import math
+from dataclasses import dataclass
+from typing import List
+
+from pypdf import PdfReader
+
+
+# Rough English average; only used to size sections, never sent to the API
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class PdfSection:
+    text: str
+    first_page: int
+    last_page: int
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def extract_pages(content: bytes) -> List[str]:
+    # CPU-bound; callers run it in a worker thread
+    reader = PdfReader(io.BytesIO(content))
+    return [(page.extract_text() or "").strip() for page in reader.pages]
+
+
+def split_sections(pages: List[str], max_tokens: int, max_sections: int) -> List[PdfSection]:
+    """Packs consecutive pages into sections of at most ~max_tokens each.
+
+    The budget is raised to total/max_sections up front, and a single page larger than the
+    budget is cut on paragraph boundaries. Greedy packing can still leave more than
+    max_sections sections (pieces that do not fit together), so the smallest pair of
+    neighbouring sections is then merged until there are at most max_sections.
+    """
+    total_tokens = sum(estimate_tokens(p) for p in pages if p)
+    budget = max(max_tokens, math.ceil(total_tokens / max(1, max_sections)))
+
+    sections: List[PdfSection] = []
+    buffer: List[str] = []
+    buffer_tokens = 0
+    first_page = last_page = 0
+
+    for page_number, text in enumerate(pages, start=1):
+        if not text:
+            continue
+        for piece in _split_oversized(text, budget):
+            piece_tokens = estimate_tokens(piece)
+            if buffer and buffer_tokens + piece_tokens > budget:
+                sections.append(PdfSection(text="\n\n".join(buffer), first_page=first_page, last_page=last_page))
+                buffer, buffer_tokens = [], 0
+            if not buffer:
+                first_page = page_number
+            buffer.append(piece)
+            buffer_tokens += piece_tokens
+            last_page = page_number
+    if buffer:
+        sections.append(PdfSection(text="\n\n".join(buffer), first_page=first_page, last_page=last_page))
+    return _merge_to_limit(sections, max(1, max_sections))
+
+
+def _merge_to_limit(sections: List[PdfSection], max_sections: int) -> List[PdfSection]:
+    # Merging the smallest neighbouring pair keeps sections contiguous and as even as possible
+    tokens = [s.tokens for s in sections]
+    while len(sections) > max_sections:
+        i = min(range(len(sections) - 1), key=lambda j: tokens[j] + tokens[j + 1])
+        left, right = sections[i], sections[i + 1]
+        sections[i : i + 2] = [
+            PdfSection(text=left.text + "\n\n" + right.text, first_page=left.first_page, last_page=right.last_page)
+        ]
+        tokens[i : i + 2] = [tokens[i] + tokens[i + 1]]
+    return sections
+
+
+def _split_oversized(text: str, budget: int) -> List[str]:
+    if estimate_tokens(text) <= budget:
+        return [text]
+    budget_chars = budget * CHARS_PER_TOKEN
+    pieces: List[str] = []
+    current: List[str] = []
+    current_chars = 0
+    for paragraph in text.split("\n"):
+        if current and current_chars + len(paragraph) + 1 > budget_chars:
+            pieces.append("\n".join(current))
+            current, current_chars = [], 0
+        current.append(paragraph)
+        current_chars += len(paragraph) + 1
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def allocate_counts(weights: List[int], total: int) -> List[int]:
+    # Largest-remainder split of `total` questions proportional to section size; when there
+    # are enough questions every section gets at least one, so no part goes uncovered
+    if not weights or total <= 0:
+        return [0] * len(weights)
+    floor = 1 if total >= len(weights) else 0
+    spread = total - floor * len(weights)
+    weight_sum = sum(weights)
+    quotas = [floor + spread * w / weight_sum for w in weights]
+    counts = [int(q) for q in quotas]
+    remaining = total - sum(counts)
+    by_remainder = sorted(range(len(weights)), key=lambda i: quotas[i] - counts[i], reverse=True)
+    for i in by_remainder[:remaining]:
+        counts[i] += 1
+    return counts
@@ -0,0 +1,179 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .answer_keys import answer_keys
+from .config import load_settings
+from .db import db
+from .fast_json import FastJSONResponse, join_array
+from .models import Choice, Question
+
+
+def estimate_bytes(json_size: int) -> int:
+    # Built models take about 4x their JSON size in memory plus fixed object overhead
+    # (measured with tracemalloc on typical 4-choice questions)
+    return 4 * json_size + 512
+
+
+class QuestionBundleCache:
+    """In-process LRU of fully built `Question` models keyed by question id.
+
+    Question and choice rows never change after insert, so the TTL only bounds how long a
+    deleted question can still be served. The cache holds at most `max_bytes` of estimated
+    model memory and evicts the least recently used bundles past that. With `keep_json`,
+    each entry also keeps its encoded JSON so responses can be spliced from it.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, keep_json: bool = False) -> None:
+        self._max_bytes = max(0, max_bytes)
+        self._ttl_seconds = ttl_seconds
+        self._keep_json = keep_json
+        self._entries: "OrderedDict[int, Tuple[Question, int, float, Optional[bytes]]]" = OrderedDict()
+        self._bytes = 0
+        self._counters: Dict[str, int] = {"hits": 0, "misses": 0, "evicted": 0, "expired": 0}
+
+    def get_many(self, question_ids: Iterable[int]) -> Tuple[Dict[int, Question], List[int]]:
+        now = time.monotonic()
+        found: Dict[int, Question] = {}
+        missing: List[int] = []
+        for qid in question_ids:
+            entry = self._entries.get(qid)
+            if entry is not None and entry[2] <= now:
+                self._drop(qid)
+                self._counters["expired"] += 1
+                entry = None
+            if entry is None:
+                missing.append(qid)
+                continue
+            self._entries.move_to_end(qid)
+            found[qid] = entry[0]
+        self._counters["hits"] += len(found)
+        self._counters["misses"] += len(missing)
+        return found, missing
+
+    def put_many(self, questions: Iterable[Question]) -> None:
+        if not self._max_bytes:
+            return
+        expires_at = time.monotonic() + self._ttl_seconds
+        for q in questions:
+            encoded = q.model_dump_json().encode("utf-8")
+            size = estimate_bytes(len(encoded))
+            if self._keep_json:
+                size += len(encoded)
+            if size > self._max_bytes:
+                continue
+            self._drop(q.id)
+            self._entries[q.id] = (q, size, expires_at, encoded if self._keep_json else None)
+            self._bytes += size
+        while self._bytes > self._max_bytes and self._entries:
+            qid = next(iter(self._entries))
+            self._drop(qid)
+            self._counters["evicted"] += 1
+
+    def encode(self, questions: Iterable[Question]) -> bytes:
+        # JSON array of the bundles, reusing each cached entry's encoding; same document as
+        # serializing List[Question]
+        parts: List[bytes] = []
+        for q in questions:
+            entry = self._entries.get(q.id)
+            if entry is not None and entry[0] is q and entry[3] is not None:
+                parts.append(entry[3])
+            else:
+                parts.append(q.model_dump_json().encode("utf-8"))
+        return join_array(parts)
+
+    def _drop(self, question_id: int) -> None:
+        entry = self._entries.pop(question_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            **self._counters,
+            "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "size_bytes": self._bytes,
+            "max_bytes": self._max_bytes,
+            "ttl_seconds": self._ttl_seconds,
+        }
+
+
+_settings = load_settings()
+question_bundles = QuestionBundleCache(
+    max_bytes=_settings["QUESTION_CACHE_MAX_BYTES"],
+    ttl_seconds=_settings["QUESTION_CACHE_TTL_SECONDS"],
+    keep_json=_settings["FAST_JSON_RESPONSES"],
+)
+FAST_JSON_RESPONSES = _settings["FAST_JSON_RESPONSES"]
+
+
+async def fetch_question_bundles(question_ids: List[int]) -> List[Question]:
+    if not question_ids:
+        return []
+    # Both reads on one pooled connection. Rows never change once written; the lag guard
+    # keeps reads on the primary right after generation stores new ones
+    async with db.reader(_settings["DEFAULT_USER_ID"]).connection("question_bundle") as con:
+        rows = await con.fetch(
+            "SELECT id, sub_topic_id, question_text, explanation, image_url FROM questions WHERE id = ANY($1)",
+            question_ids,
+        )
+        choices_rows = await con.fetch(
+            "SELECT id, question_id, choice_text, is_correct FROM choices WHERE question_id = ANY($1) ORDER BY id",
+            question_ids,
+        )
+    by_qid = {}
+    for r in rows:
+        by_qid[r["id"]] = {
+            "q": r,
+            "choices": [],
+        }
+    for c in choices_rows:
+        by_qid[c["question_id"]]["choices"].append(c)
+    result: List[Question] = []
+    for qid in question_ids:
+        data = by_qid.get(qid)
+        if not data:
+            continue
+        q = data["q"]
+        result.append(
+            Question(
+                id=q["id"],
+                sub_topic_id=q["sub_topic_id"],
+                question_text=q["question_text"],
+                explanation=q["explanation"],
+                image_url=q["image_url"],
+                choices=[
+                    Choice(
+                        id=c["id"],
+                        question_id=c["question_id"],
+                        choice_text=c["choice_text"],
+                        is_correct=c["is_correct"],
+                    )
+                    for c in data["choices"]
+                ],
+            )
+        )
+    return result
+
+
+async def load_questions(question_ids: List[int]) -> List[Question]:
+    # Cached bundles first; only the misses are read (two queries) and then cached.
+    # Ids that do not exist are skipped; order follows question_ids.
+    found, missing = question_bundles.get_many(question_ids)
+    if missing:
+        fetched = await fetch_question_bundles(missing)
+        question_bundles.put_many(fetched)
+        found.update((q.id, q) for q in fetched)
+    result = [found[qid] for qid in dict.fromkeys(question_ids) if qid in found]
+    # Whatever is served is about to be answered
+    answer_keys.warm(result)
+    return result
+
+
+def questions_response(questions: List[Question]):
+    # Fast mode splices each bundle's cached JSON instead of letting FastAPI validate and
+    # re-serialize every model through response_model
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse(question_bundles.encode(questions))
+    return questions
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import asyncpg
+
+from .config import load_settings
+from .db import db
+from .similarity import NUM_PERM, estimated_similarity, lsh_band_hashes, minhash_signature, shingles
+
+
+logger = logging.getLogger("app.question_index")
+
+_SIGNATURE_FORMAT = f">{NUM_PERM}Q"
+BACKFILL_BATCH_SIZE = 500
+
+
+def question_signature(question_text: Optional[str]) -> List[int]:
+    return minhash_signature(shingles(question_text or ""))
+
+
+def _pack(signature: List[int]) -> bytes:
+    return struct.pack(_SIGNATURE_FORMAT, *signature)
+
+
+def _unpack(raw: bytes) -> List[int]:
+    return list(struct.unpack(_SIGNATURE_FORMAT, raw))
+
+
+class QuestionSimilarityIndex:
+    """Per-sub-topic near-duplicate index over stored questions.
+
+    Every question keeps a MinHash signature of its question-text shingles plus one LSH
+    band hash per band. A new question is probed only against stored questions in the same
+    sub-topic that share a band, so the check costs one indexed lookup per batch no matter
+    how large the bank grows, and candidates are confirmed by estimated similarity.
+
+    Questions stored before the index existed are indexed lazily: the first dedupe of a
+    sub-topic in each process signs whatever that sub-topic is missing, under its lock.
+    """
+
+    def __init__(self, enabled: bool, threshold: float) -> None:
+        self._enabled = enabled
+        self._threshold = threshold
+        self._checked_sub_topics: Set[int] = set()
+        self.skipped_total = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    async def filter_new(
+        self,
+        con: asyncpg.Connection,
+        sub_topic_ids: Sequence[int],
+        signatures: Sequence[List[int]],
+    ) -> List[bool]:
+        # Returns a keep flag per item: False when it repeats a stored question or an
+        # earlier item of the same batch in its sub-topic
+        if not self._enabled or not signatures:
+            return [True] * len(signatures)
+
+        # Serialize concurrent writers per sub-topic so two batches cannot both insert
+        # the same question; sorted to keep lock order consistent
+        await con.execute(
+            "SELECT pg_advisory_xact_lock(hashtext('question_index'), id) FROM unnest($1::int[]) AS id ORDER BY id",
+            sorted(set(sub_topic_ids)),
+        )
+        await self._index_unsigned(con, sub_topic_ids)
+
+        band_keys = [lsh_band_hashes(sig) for sig in signatures]
+        p_sub_topics: List[int] = []
+        p_bands: List[int] = []
+        p_hashes: List[int] = []
+        for sub_topic_id, hashes in zip(sub_topic_ids, band_keys):
+            for band, band_hash in enumerate(hashes):
+                p_sub_topics.append(sub_topic_id)
+                p_bands.append(band)
+                p_hashes.append(band_hash)
+        rows = await con.fetch(
+            """
+            SELECT DISTINCT b.sub_topic_id, b.band, b.band_hash, s.question_id, s.signature
+            FROM unnest($1::int[], $2::int2[], $3::int8[]) AS probe(sub_topic_id, band, band_hash)
+            JOIN question_lsh_bands b
+              ON b.sub_topic_id = probe.sub_topic_id AND b.band = probe.band AND b.band_hash = probe.band_hash
+            JOIN question_signatures s ON s.question_id = b.question_id
+            """,
+            p_sub_topics,
+            p_bands,
+            p_hashes,
+        )
+
+        buckets: Dict[Tuple[int, int, int], List[List[int]]] = {}
+        for r in rows:
+            buckets.setdefault((r["sub_topic_id"], r["band"], r["band_hash"]), []).append(_unpack(r["signature"]))
+
+        keep: List[bool] = []
+        for sub_topic_id, signature, hashes in zip(sub_topic_ids, signatures, band_keys):
+            keys = [(sub_topic_id, band, band_hash) for band, band_hash in enumerate(hashes)]
+            duplicate = any(
+                estimated_similarity(signature, other) >= self._threshold
+                for key in keys
+                for other in buckets.get(key, ())
+            )
+            keep.append(not duplicate)
+            if not duplicate:
+                for key in keys:
+                    buckets.setdefault(key, []).append(signature)
+        self.skipped_total += keep.count(False)
+        return keep
+
+    async def add(
+        self,
+        con: asyncpg.Connection,
+        question_ids: Sequence[int],
+        sub_topic_ids: Sequence[int],
+        signatures: Sequence[List[int]],
+    ) -> None:
+        if not question_ids:
+            return
+        b_sub_topics: List[int] = []
+        b_bands: List[int] = []
+        b_hashes: List[int] = []
+        b_question_ids: List[int] = []
+        for qid, sub_topic_id, signature in zip(question_ids, sub_topic_ids, signatures):
+            for band, band_hash in enumerate(lsh_band_hashes(signature)):
+                b_sub_topics.append(sub_topic_id)
+                b_bands.append(band)
+                b_hashes.append(band_hash)
+                b_question_ids.append(qid)
+        await con.execute(
+            """
+            WITH sig AS (
+                INSERT INTO question_signatures(question_id, sub_topic_id, signature)
+                SELECT * FROM unnest($1::int[], $2::int[], $3::bytea[])
+                ON CONFLICT (question_id) DO NOTHING
+            )
+            INSERT INTO question_lsh_bands(sub_topic_id, band, band_hash, question_id)
+            SELECT * FROM unnest($4::int[], $5::int2[], $6::int8[], $7::int[])
+            ON CONFLICT DO NOTHING
+            """,
+            list(question_ids),
+            list(sub_topic_ids),
+            [_pack(s) for s in signatures],
+            b_sub_topics,
+            b_bands,
+            b_hashes,
+            b_question_ids,
+        )
+
+    async def _index_unsigned(self, con: asyncpg.Connection, sub_topic_ids: Iterable[int]) -> None:
+        # Sign questions of these sub-topics that predate the index; runs once per sub-topic
+        # per process, since every later insert is signed when it is persisted
+        pending = sorted(set(sub_topic_ids) - self._checked_sub_topics)
+        if not pending:
+            return
+        rows = await con.fetch(
+            """
+            SELECT q.id, q.sub_topic_id, q.question_text
+            FROM questions q
+            WHERE q.sub_topic_id = ANY($1::int[])
+              AND NOT EXISTS (SELECT 1 FROM question_signatures s WHERE s.question_id = q.id)
+            """,
+            pending,
+        )
+        if rows:
+            signatures = await asyncio.to_thread(lambda: [question_signature(r["question_text"]) for r in rows])
+            await self.add(con, [r["id"] for r in rows], [r["sub_topic_id"] for r in rows], signatures)
+            logger.info(f"question_index_backfilled sub_topics={len(pending)} count={len(rows)}")
+        # If the persist rolls back they stay unsigned, and near-duplicates of them go
+        # uncaught until another process checks the sub-topic
+        self._checked_sub_topics.update(pending)
+
+    async def backfill(self) -> int:
+        # Index every unsigned question in one pass (bench datasets); existing duplicates are kept
+        indexed = 0
+        last_id = 0
+        while True:
+            rows = await db.fetch(
+                """
+                SELECT q.id, q.sub_topic_id, q.question_text
+                FROM questions q
+                WHERE q.id > $1
+                  AND NOT EXISTS (SELECT 1 FROM question_signatures s WHERE s.question_id = q.id)
+                ORDER BY q.id
+                LIMIT $2
+                """,
+                last_id,
+                BACKFILL_BATCH_SIZE,
+            )
+            if not rows:
+                return indexed
+            last_id = rows[-1]["id"]
+            # MinHash is pure CPU; keep it off the event loop
+            signatures = await asyncio.to_thread(lambda: [question_signature(r["question_text"]) for r in rows])
+            async with db.transaction() as con:
+                await self.add(con, [r["id"] for r in rows], [r["sub_topic_id"] for r in rows], signatures)
+            indexed += len(rows)
+
+
+_settings = load_settings()
+question_index = QuestionSimilarityIndex(
+    enabled=_settings["QUESTION_DEDUPE_ENABLED"],
+    threshold=_settings["NEAR_DUPLICATE_THRESHOLD"],
+)
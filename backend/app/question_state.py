@@ -0,0 +1,54 @@
+from typing import Optional, Sequence
+
+import asyncpg
+
+from .config import load_settings
+from .db import db
+
+
+class UnansweredQuestionIndex:
+    """Maintains `user_question_state`: one row per (user, question) with an answered flag
+    and a fixed random sort key.
+
+    Partial indexes over the unanswered rows turn "draw N random unanswered questions" into
+    an index range probe from a random pivot, independent of how long the answer history is.
+    Rows are written when questions are persisted and flipped to answered on submit.
+    """
+
+    def __init__(self, user_id: int) -> None:
+        self.user_id = user_id
+
+    async def add_questions(self, con: asyncpg.Connection, question_ids: Sequence[int], sub_topic_ids: Sequence[int]) -> None:
+        if not question_ids:
+            return
+        await con.execute(
+            """
+            INSERT INTO user_question_state(user_id, question_id, sub_topic_id)
+            SELECT $1, * FROM unnest($2::int[], $3::int[])
+            ON CONFLICT (user_id, question_id) DO NOTHING
+            """,
+            self.user_id,
+            list(question_ids),
+            list(sub_topic_ids),
+        )
+
+    async def backfill(self, user_id: Optional[int] = None) -> int:
+        # Adds missing rows and marks answers recorded without them; a no-op write-wise once
+        # everything is in sync. schema.sql seeds the default user once; bench datasets
+        # loaded with COPY call this per user
+        status = await db.execute(
+            """
+            INSERT INTO user_question_state(user_id, question_id, sub_topic_id, answered)
+            SELECT $1, q.id, q.sub_topic_id,
+                   EXISTS (SELECT 1 FROM user_answers a WHERE a.user_id = $1 AND a.question_id = q.id)
+            FROM questions q
+            ON CONFLICT (user_id, question_id) DO UPDATE SET answered = TRUE
+            WHERE EXCLUDED.answered AND NOT user_question_state.answered
+            """,
+            self.user_id if user_id is None else user_id,
+        )
+        return int(status.split()[-1])
+
+
+_settings = load_settings()
+unanswered_questions = UnansweredQuestionIndex(user_id=_settings["DEFAULT_USER_ID"])
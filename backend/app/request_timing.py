@@ -0,0 +1,56 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass
+class RequestTiming:
+    """Database and GenAI work done on behalf of one HTTP request.
+
+    The timing middleware installs one per request in a contextvar; tasks spawned by the
+    request inherit it, so statements and model calls anywhere below add to it.
+    """
+
+    db_count: int = 0
+    db_seconds: float = 0.0
+    db_wait_seconds: float = 0.0
+    genai_count: int = 0
+    genai_seconds: float = 0.0
+
+    def server_timing(self, total_seconds: float) -> str:
+        # Server-Timing header value (durations in ms); "app" is what the process spent
+        # outside the database and model calls
+        app_seconds = max(0.0, total_seconds - self.db_seconds - self.db_wait_seconds - self.genai_seconds)
+        return ", ".join(
+            [
+                f"db;dur={self.db_seconds * 1000:.1f}",
+                f'db_count;desc="{self.db_count}"',
+                f"db_wait;dur={self.db_wait_seconds * 1000:.1f}",
+                f"genai;dur={self.genai_seconds * 1000:.1f}",
+                f"app;dur={app_seconds * 1000:.1f}",
+                f"total;dur={total_seconds * 1000:.1f}",
+            ]
+        )
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def start_request_timing() -> RequestTiming:
+    timing = RequestTiming()
+    _current.set(timing)
+    return timing
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _current.get()
+
+
+def record_query(logged: Any) -> None:
+    # asyncpg query logger: called once per statement sent (scheduled right after it
+    # finishes, in the context of the code that ran it). This also counts asyncpg's own
+    # round trips: the reset on pool release and one-time type introspection. Time is
+    # taken from connection hold time instead, since introspection nests in a statement.
+    timing = _current.get()
+    if timing is not None:
+        timing.db_count += 1
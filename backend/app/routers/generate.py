@@ -1,17 +1,37 @@
-import io
-import random
-from typing import List, Optional, cast, Any
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 from fastapi import APIRouter, File, Form, UploadFile, HTTPException
-import httpx
-from google import genai
+from fastapi.responses import JSONResponse, StreamingResponse
 from google.genai import types as gen_types
 from google.genai.errors import ServerError
 
 from ..config import load_settings
 from ..db import db
+from ..http_client import source_http
+from ..gen_cache import generation_cache, normalize_text, source_digest
+from ..genai_pool import KeyState, genai_keys, is_overloaded, is_throttled
+from ..genai_provider import genai_provider
+from ..hedging import backoff_delay, genai_latency, genai_retry_budget
+from ..jobs import StageCallback, generation_jobs
+from ..mcq_stream import McqArrayStreamParser
+from ..metrics import GENAI_CALL_SECONDS, GENAI_HEDGES, GENAI_RETRIES, GENERATION_ITEMS_PERSISTED, metrics
+from ..pdf_chunks import PdfSection, allocate_counts, extract_pages, split_sections
+from ..question_index import question_index, question_signature
+from ..question_state import unanswered_questions
+from ..request_timing import current_timing
+from ..similarity import dedupe_items
+from ..topic_tree import topic_tree
 
 
+logger = logging.getLogger("app.routers.generate")
+
 router = APIRouter(prefix="/generate", tags=["generate"])
 settings = load_settings()
 
@@ -39,6 +59,10 @@ SIZE_TO_COUNT = {"tiny": 5, "small": 25, "large": 50}
 # Recognized YouTube hosts for special handling via file_uri
 YOUTUBE_HOSTS = {"youtube.com", "www.youtube.com", "youtu.be", "m.youtube.com"}
 
+# Generation goes through the async GenAI client so a slow LLM call never blocks the
+# event loop; the semaphore bounds how many calls one process keeps in flight.
+_genai_slots = asyncio.Semaphore(settings["GENAI_MAX_CONCURRENCY"])
+
 
 def build_generation_prompt(count: int) -> str:
     # Centralized prompt used across all generation flows
@@ -140,114 +164,606 @@ def _infer_mime_type(url: str, content_type_header: str) -> str:
     return mime_type
 
 
-async def create_content_part_for_url(client: genai.Client, url: str):
-    # For YouTube, reference via file_uri part; otherwise fetch bytes and upload
+@dataclass
+class FetchedSource:
+    # One generation input: raw bytes still to upload, or a ready-made content part
+    label: str
+    digest: str
+    content: Optional[bytes] = None
+    mime_type: Optional[str] = None
+    part: Optional[Any] = None
+
+
+async def fetch_url_source(url: str) -> FetchedSource:
+    # For YouTube, reference via file_uri part; otherwise fetch bytes for upload
     if detect_youtube(url):
-        return gen_types.Part(file_data=gen_types.FileData(file_uri=url))
+        return FetchedSource(
+            label=url,
+            digest=source_digest(f"url:{url}".encode("utf-8")),
+            part=gen_types.Part(file_data=gen_types.FileData(file_uri=url)),
+        )
 
+    max_bytes = settings["SOURCE_FETCH_MAX_BYTES"]
     try:
-        async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client_http:
-            resp = await client_http.get(url)
+        async with source_http.get().stream("GET", url) as resp:
+            if resp.status_code != 200:
+                raise HTTPException(status_code=400, detail="bad_url_status")
+
+            # Reject unsupported or oversized sources from the headers, before reading the body
+            mime_type = _infer_mime_type(url, resp.headers.get("content-type", ""))
+            if mime_type not in ("application/pdf", "text/html", "text/plain"):
+                raise HTTPException(status_code=400, detail="unsupported_content_type")
+            declared_length = resp.headers.get("content-length", "")
+            if declared_length.isdigit() and int(declared_length) > max_bytes:
+                raise HTTPException(status_code=400, detail="source_too_large")
+
+            chunks: List[bytes] = []
+            received = 0
+            async for chunk in resp.aiter_bytes():
+                received += len(chunk)
+                if received > max_bytes:
+                    raise HTTPException(status_code=400, detail="source_too_large")
+                chunks.append(chunk)
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=400, detail="failed_to_fetch_url") from exc
 
-    if resp.status_code != 200:
-        raise HTTPException(status_code=400, detail="bad_url_status")
+    content_bytes = b"".join(chunks)
+    return FetchedSource(label=url, digest=source_digest(content_bytes), content=content_bytes, mime_type=mime_type)
 
-    content_bytes = resp.content
-    mime_type = _infer_mime_type(url, resp.headers.get("content-type", ""))
-    if mime_type not in ("application/pdf", "text/html", "text/plain"):
-        raise HTTPException(status_code=400, detail="unsupported_content_type")
 
-    uploaded: gen_types.File = client.files.upload(
-        file=io.BytesIO(content_bytes),
-        config=dict(mime_type=mime_type),
-    )
+async def upload_source(key: KeyState, source: FetchedSource) -> Any:
+    # Reuse a still-live Files API upload of identical bytes before uploading again
+    if source.part is not None:
+        return source.part
+    file_key = generation_cache.file_key(source.digest, key.api_key)
+    cached = await generation_cache.get_file(file_key)
+    if cached is not None:
+        return cached
+    uploaded = await genai_provider.upload(key, source.content or b"", source.mime_type)
+    await generation_cache.put_file(file_key, uploaded)
     return uploaded
 
 
-def _choose_api_key(keys: List[str]) -> str:
-    # Prefer list of keys; fallback to single env if list is empty
-    if keys:
-        return random.choice(keys)
-    return settings.get("GENAI_API_KEY", "")
+async def _gather_isolated(
+    items: List[Any],
+    labels: List[str],
+    fn: Callable[[Any], Awaitable[Any]],
+    deadline: float,
+    phase: str,
+) -> Tuple[List[Any], List[Dict[str, str]]]:
+    # Run fn over all items at once under a per-request cap and a shared deadline; a bad
+    # source is reported back instead of failing the whole batch, with a reason naming the
+    # phase (fetch or upload) it failed in
+    slots = asyncio.Semaphore(settings["LINK_FETCH_CONCURRENCY"])
+
+    async def run_one(item: Any):
+        async with slots:
+            return await fn(item)
+
+    tasks = [asyncio.create_task(run_one(item)) for item in items]
+    timeout = max(0.0, deadline - asyncio.get_running_loop().time())
+    pending: set = set()
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
 
+    results: List[Any] = []
+    skipped: List[Dict[str, str]] = []
+    for label, task in zip(labels, tasks):
+        if task in pending:
+            skipped.append({"url": label, "reason": f"{phase}_deadline_exceeded"})
+            continue
+        exc = task.exception()
+        if exc is None:
+            results.append(task.result())
+        elif is_throttled(exc):
+            # A throttled key fails the whole attempt so the key pool can retry elsewhere
+            raise exc
+        elif isinstance(exc, HTTPException):
+            skipped.append({"url": label, "reason": str(exc.detail)})
+        else:
+            logger.warning(f"source_{phase}_failed url={label} error={type(exc).__name__}: {exc}")
+            skipped.append({"url": label, "reason": f"failed_to_{phase}_source"})
+    if not results:
+        raise HTTPException(status_code=400, detail=skipped[0]["reason"] if skipped else "no_urls_provided")
+    return results, skipped
 
-def _generate_with_fallback(
-    client: genai.Client,
-    uploaded: gen_types.File,
-    prompt: str,
+
+def _generation_config(thinking_budget: int) -> gen_types.GenerateContentConfig:
+    return gen_types.GenerateContentConfig(
+        thinking_config=gen_types.ThinkingConfig(
+            thinking_budget=thinking_budget,
+        ),
+        response_mime_type="application/json",
+        response_schema=MCQ_ARRAY_SCHEMA,
+    )
+
+
+@asynccontextmanager
+async def _timed_genai_call(model: str, role: str, track_latency: bool = False) -> AsyncIterator[None]:
+    # Records one model call (role: primary, fallback or hedge) with its outcome: ok, unavailable
+    # (503), throttled (429), error or cancelled
+    t0 = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    except Exception as exc:
+        outcome = "unavailable" if is_overloaded(exc) else "throttled" if is_throttled(exc) else "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        # Hedge thresholds come from non-streaming calls; a cancelled call (e.g. a hedged-out
+        # primary) is kept as a lower bound so slow calls do not drop out of the window
+        if track_latency and outcome in ("ok", "cancelled"):
+            genai_latency.observe(model, elapsed)
+        if metrics.enabled:
+            GENAI_CALL_SECONDS.observe(elapsed, model, role, outcome)
+        timing = current_timing()
+        if timing is not None:
+            timing.genai_count += 1
+            timing.genai_seconds += elapsed
+
+
+def _is_valid_response(text: str) -> bool:
+    # A hedge race only accepts a response the persist step can parse
+    try:
+        return isinstance(json.loads(text or "[]"), (list, dict))
+    except ValueError:
+        return False
+
+
+async def _call_model(key: KeyState, parts: List[Any], model: str, role: str, thinking_budget: int) -> str:
+    # Returns the response text from whichever GENAI_PROVIDER backend is configured
+    async with _genai_slots:
+        async with _timed_genai_call(model, role, track_latency=True):
+            return await genai_provider.generate(key, parts, model, _generation_config(thinking_budget=thinking_budget))
+
+
+async def _race_hedge(primary: "asyncio.Task[str]", hedge: "asyncio.Task[str]") -> str:
+    # First valid response wins and the other call is cancelled. If neither is valid, an
+    # unparseable response is returned for the persist step to report, else an overload
+    # error (so the caller can retry) or the primary's error.
+    pending = {primary, hedge}
+    invalid_text: Optional[str] = None
+    errors: List[BaseException] = []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda t: t is hedge):
+                exc = task.exception()
+                if exc is not None:
+                    errors.append(exc)
+                    continue
+                text = task.result()
+                if _is_valid_response(text):
+                    if metrics.enabled:
+                        GENAI_HEDGES.inc("hedge_won" if task is hedge else "primary_won")
+                    return text
+                invalid_text = text if invalid_text is None else invalid_text
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    if metrics.enabled:
+        GENAI_HEDGES.inc("both_failed")
+    if invalid_text is not None:
+        return invalid_text
+    overloaded = [e for e in errors if isinstance(e, ServerError) and is_overloaded(e)]
+    raise (overloaded or errors)[0]
+
+
+async def _hedged_call(key: KeyState, parts: List[Any], model_primary: str, model_secondary: str) -> str:
+    # Primary call; a 503 hands over to the secondary model as before. A primary that is
+    # merely slow (past GENAI_HEDGE_PERCENTILE of its recent latencies) gets the secondary
+    # racing it, when a GenAI slot is free and the retry budget allows another call.
+    primary = asyncio.create_task(_call_model(key, parts, model_primary, "primary", 128))
+    try:
+        if settings["GENAI_HEDGE_ENABLED"]:
+            hedge_after = genai_latency.threshold(model_primary)
+            done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+            if not done:
+                if not _genai_slots.locked() and genai_retry_budget.try_spend():
+                    logger.info(f"genai_hedge model={model_primary} hedge_model={model_secondary} after_s={hedge_after:.1f}")
+                    hedge = asyncio.create_task(_call_model(key, parts, model_secondary, "hedge", 0))
+                    return await _race_hedge(primary, hedge)
+                if metrics.enabled:
+                    GENAI_HEDGES.inc("skipped")
+        try:
+            return await primary
+        except ServerError as exc:
+            # Only fallback on overload/unavailable
+            if not is_overloaded(exc):
+                raise
+        return await _call_model(key, parts, model_secondary, "fallback", 0)
+    finally:
+        if not primary.done():
+            # Wait for the cancelled call to release its GenAI slot before returning
+            primary.cancel()
+            await asyncio.gather(primary, return_exceptions=True)
+
+
+async def _generate_with_fallback_parts(
+    key: KeyState,
+    parts: List[Any],
     model_primary: str,
     model_secondary: str,
-):
+    deadline: Optional[float] = None,
+) -> str:
+    # Hedged call, retried after an overload (both models 503) with jittered exponential
+    # backoff while GENAI_RETRY_ATTEMPTS, the shared retry budget and the deadline (loop
+    # time; GENAI_DEADLINE_SECONDS from now by default) allow; past the deadline -> 504
+    loop = asyncio.get_running_loop()
+    if deadline is None:
+        deadline = loop.time() + settings["GENAI_DEADLINE_SECONDS"]
+    genai_retry_budget.record_attempt()
+    attempt = 0
+    timeout = asyncio.timeout_at(deadline)
     try:
-        return client.models.generate_content(
-            model=model_primary,
-            contents=cast(Any, [uploaded, prompt]),
-            config=gen_types.GenerateContentConfig(
-                thinking_config=gen_types.ThinkingConfig(
-                    thinking_budget=128,
-                ),
-                response_mime_type="application/json",
-                response_schema=MCQ_ARRAY_SCHEMA,
-            ),
-        )
-    except ServerError as exc:
-        # Only fallback on overload/unavailable
-        status_text = str(exc)
-        code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
-        is_overloaded = (code == 503) or ("UNAVAILABLE" in status_text)
-        if not is_overloaded:
+        async with timeout:
+            while True:
+                try:
+                    return await _hedged_call(key, parts, model_primary, model_secondary)
+                except ServerError as exc:
+                    if not is_overloaded(exc):
+                        raise
+                    attempt += 1
+                    delay = backoff_delay(
+                        attempt, settings["GENAI_RETRY_BACKOFF_SECONDS"], settings["GENAI_RETRY_BACKOFF_MAX_SECONDS"]
+                    )
+                    if attempt > settings["GENAI_RETRY_ATTEMPTS"]:
+                        outcome = "attempts_exhausted"
+                    elif loop.time() + delay >= deadline:
+                        outcome = "deadline"
+                    elif not genai_retry_budget.try_spend():
+                        outcome = "budget_exhausted"
+                    else:
+                        outcome = "retried"
+                    if metrics.enabled:
+                        GENAI_RETRIES.inc(outcome)
+                    if outcome != "retried":
+                        raise
+                    logger.warning(f"genai_retry model={model_primary} attempt={attempt} delay_s={delay:.2f}")
+                    await asyncio.sleep(delay)
+    except TimeoutError:
+        if not timeout.expired():
             raise
-        # Fallback attempt
-        return client.models.generate_content(
-            model=model_secondary,
-            contents=cast(Any, [uploaded, prompt]),
-            config=gen_types.GenerateContentConfig(
-                thinking_config=gen_types.ThinkingConfig(
-                    thinking_budget=0,
-                ),
-                response_mime_type="application/json",
-                response_schema=MCQ_ARRAY_SCHEMA,
-            ),
-        )
+        logger.warning(f"genai_deadline_exceeded model={model_primary} attempts={attempt + 1}")
+        raise HTTPException(status_code=504, detail="generation_deadline_exceeded")
 
 
-def _generate_with_fallback_parts(
-    client: genai.Client,
+async def _stream_with_fallback_parts(
+    key: KeyState,
     parts: List[Any],
     model_primary: str,
     model_secondary: str,
-):
+) -> AsyncIterator[str]:
+    # Streaming variant: falls back to the secondary model only if the primary is
+    # overloaded before it produced any text, so nothing is ever emitted twice
+    async with _genai_slots:
+        received_any = False
+        try:
+            async with _timed_genai_call(model_primary, "primary"):
+                async for text in genai_provider.stream(key, parts, model_primary, _generation_config(thinking_budget=128)):
+                    received_any = True
+                    yield text
+            return
+        except ServerError as exc:
+            if received_any or not is_overloaded(exc):
+                raise
+        async with _timed_genai_call(model_secondary, "fallback"):
+            async for text in genai_provider.stream(key, parts, model_secondary, _generation_config(thinking_budget=0)):
+                yield text
+
+
+async def _no_stage_tracking(stage: str) -> None:
+    return None
+
+
+def _ensure_api_key_configured() -> None:
+    if not genai_provider.configured:
+        raise HTTPException(status_code=400, detail="genai_api_key_missing")
+
+
+async def _collect_sources(
+    kind: str,
+    payload: Dict[str, Any],
+    blob: Optional[bytes],
+    deadline: float,
+) -> Tuple[List[FetchedSource], List[Dict[str, str]]]:
+    sources: List[FetchedSource] = []
+    skipped: List[Dict[str, str]] = []
+    if kind == "link":
+        sources.append(await fetch_url_source(payload["url"]))
+    elif kind == "links":
+        sources, skipped = await _gather_isolated(payload["urls"], payload["urls"], fetch_url_source, deadline, "fetch")
+    elif kind == "pdf":
+        content = blob or b""
+        sources.append(FetchedSource(label="pdf", digest=source_digest(content), content=content, mime_type="application/pdf"))
+    elif kind == "text":
+        normalized = normalize_text(payload["text"])
+        sources.append(
+            FetchedSource(label="text", digest=source_digest(normalized.encode("utf-8")), part=gen_types.Part(text=payload["text"]))
+        )
+    else:
+        raise ValueError(f"unknown generation kind: {kind}")
+    return sources, skipped
+
+
+def _prompt_version(prompt: str) -> str:
+    # Any edit to the prompt or the response schema invalidates cached results
+    raw = prompt + json.dumps(MCQ_ARRAY_SCHEMA, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+async def run_generation(
+    kind: str,
+    payload: Dict[str, Any],
+    blob: Optional[bytes] = None,
+    on_stage: StageCallback = _no_stage_tracking,
+) -> Dict[str, Any]:
+    # Shared fetch -> upload -> generate -> persist pipeline behind every /generate flow;
+    # the endpoints run it inline and background job workers run it with stage tracking
+    _ensure_api_key_configured()
+    count = SIZE_TO_COUNT.get(str(payload.get("size") or "small").lower(), 25)
+    prompt = build_generation_prompt(count)
+    model_primary = settings.get("GEN_AI_MODEL_1", settings.get("GENAI_MODEL"))
+    model_secondary = settings.get("GEN_AI_MODEL_2", settings.get("GENAI_MODEL"))
+    fetch_deadline = asyncio.get_running_loop().time() + settings["LINK_FETCH_DEADLINE_SECONDS"]
+
+    await on_stage("fetch")
+    sources, skipped = await _collect_sources(kind, payload, blob, fetch_deadline)
+
+    # Identical sources with the same count, prompt and models skip upload and LLM entirely
+    result_key = generation_cache.result_key(
+        [s.digest for s in sources], count, _prompt_version(prompt), [model_primary, model_secondary]
+    )
+    response_text = await generation_cache.get_result(result_key)
+    cache_status = "hit" if response_text is not None else "miss"
+    if response_text is None and kind == "pdf":
+        response_text = await _generate_chunked_pdf(blob or b"", count, model_primary, model_secondary, on_stage)
+    if response_text is None:
+        upload_skipped: List[Dict[str, str]] = []
+
+        async def upload_and_generate(key: KeyState) -> str:
+            # Uploads belong to the key's project, so a retry on another key re-uploads, with
+            # a fresh upload deadline; only the last attempt's skips are reported
+            await on_stage("upload")
+            if kind == "links":
+                upload_deadline = asyncio.get_running_loop().time() + settings["LINK_UPLOAD_DEADLINE_SECONDS"]
+                parts, upload_skipped[:] = await _gather_isolated(
+                    sources, [s.label for s in sources], lambda s: upload_source(key, s), upload_deadline, "upload"
+                )
+            else:
+                parts = [await upload_source(key, s) for s in sources]
+            parts.append(prompt)
+
+            await on_stage("generate")
+            response_text = await _generate_with_fallback_parts(
+                key=key,
+                parts=parts,
+                model_primary=model_primary,
+                model_secondary=model_secondary,
+                deadline=genai_deadline,
+            )
+            return response_text or "[]"
+
+        # One deadline for every model call of this request, across key retries
+        genai_deadline = asyncio.get_running_loop().time() + settings["GENAI_DEADLINE_SECONDS"]
+        response_text = await genai_provider.run(upload_and_generate)
+        skipped.extend(upload_skipped)
+
+    await on_stage("persist")
+    result = await _persist_generated_questions(
+        payload.get("topic") or None,
+        payload.get("sub_topic") or None,
+        response_text,
+        count,
+        unify_topic=True,
+    )
+    # Only cache responses that persisted cleanly and cover every source in the key
+    if cache_status == "miss" and result["created"] > 0 and not skipped:
+        await generation_cache.put_result(result_key, response_text)
+    result["cache"] = cache_status
+    if kind == "links":
+        result["skipped_sources"] = skipped
+    return result
+
+
+async def _generate_chunked_pdf(
+    content: bytes,
+    count: int,
+    model_primary: str,
+    model_secondary: str,
+    on_stage: StageCallback,
+) -> Optional[str]:
+    # Map-reduce for long PDFs: extract text locally, generate per token-bounded section
+    # in parallel, then merge with near-duplicate removal. Returns None when the document
+    # is short or has no extractable text (scans), so the caller uploads it whole.
+    try:
+        pages = await asyncio.to_thread(extract_pages, content)
+    except Exception as exc:
+        logger.warning(f"pdf_text_extraction_failed error={type(exc).__name__}: {exc}")
+        return None
+    if len(pages) < settings["PDF_CHUNK_MIN_PAGES"] or sum(len(p) for p in pages) < 2000:
+        return None
+
+    sections = split_sections(pages, settings["PDF_CHUNK_MAX_TOKENS"], max_sections=count)
+    allocations = allocate_counts([s.tokens for s in sections], count)
+    work = [(section, n) for section, n in zip(sections, allocations) if n > 0]
+    if len(work) < len(sections):
+        # Only when the document has more sections than requested questions
+        logger.warning(f"pdf_sections_without_questions skipped={len(sections) - len(work)} sections={len(sections)} count={count}")
+    if len(work) < 2:
+        return None
+
+    await on_stage("generate")
+    slots = asyncio.Semaphore(settings["PDF_CHUNK_CONCURRENCY"])
+    # Sections share the request's deadline
+    genai_deadline = asyncio.get_running_loop().time() + settings["GENAI_DEADLINE_SECONDS"]
+
+    async def generate_section(section: PdfSection, section_count: int) -> List[Dict[str, Any]]:
+        parts: List[Any] = [gen_types.Part(text=section.text), build_generation_prompt(section_count)]
+
+        async def call(key: KeyState):
+            return await _generate_with_fallback_parts(
+                key=key,
+                parts=parts,
+                model_primary=model_primary,
+                model_secondary=model_secondary,
+                deadline=genai_deadline,
+            )
+
+        async with slots:
+            response_text = await genai_provider.run(call)
+        return _parse_generated_items(response_text or "[]", section_count)
+
+    results = await asyncio.gather(*(generate_section(sec, n) for sec, n in work), return_exceptions=True)
+    merged: List[Dict[str, Any]] = []
+    failures: List[BaseException] = []
+    for (section, _), result in zip(work, results):
+        if isinstance(result, BaseException):
+            logger.warning(
+                f"pdf_section_failed pages={section.first_page}-{section.last_page} error={type(result).__name__}: {result}"
+            )
+            failures.append(result)
+        else:
+            merged.extend(result)
+    if not merged:
+        raise failures[0]
+
+    # Overlapping sections tend to produce the same question twice
+    deduped = dedupe_items(merged, settings["NEAR_DUPLICATE_THRESHOLD"])
+    logger.info(
+        f"pdf_chunked_generation sections={len(work)} failed={len(failures)} items={len(merged)} kept={len(deduped)}"
+    )
+    return json.dumps(deduped[:count])
+
+
+class GenerationInterrupted(Exception):
+    """Raised when a stream fails after questions were already persisted; never retried."""
+
+
+async def run_streaming_generation(
+    kind: str,
+    payload: Dict[str, Any],
+    blob: Optional[bytes],
+    events: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]",
+) -> None:
+    # Streams the model output through an incremental parser and persists each completed
+    # MCQ right away, publishing ("question" | "done" | "error", data) events; None ends it
+    count = SIZE_TO_COUNT.get(str(payload.get("size") or "small").lower(), 25)
+    state: Dict[str, Any] = {"created": 0, "skipped_duplicates": 0, "topic": payload.get("topic") or None}
+
+    async def persist_items(items: List[Dict[str, Any]]) -> None:
+        items = items[: max(0, count - state["created"])]
+        if not items:
+            return
+        if state["topic"] is None:
+            state["topic"] = _resolve_document_topic(None, items, unify_topic=True)
+        questions, skipped_duplicates = await _persist_generated_items(
+            items, payload.get("topic") or None, payload.get("sub_topic") or None, state["topic"], unify_topic=True
+        )
+        state["created"] += len(questions)
+        state["skipped_duplicates"] += skipped_duplicates
+        for question in questions:
+            await events.put(("question", question))
+
     try:
-        return client.models.generate_content(
-            model=model_primary,
-            contents=cast(Any, parts),
-            config=gen_types.GenerateContentConfig(
-                thinking_config=gen_types.ThinkingConfig(
-                    thinking_budget=128,
-                ),
-                response_mime_type="application/json",
-                response_schema=MCQ_ARRAY_SCHEMA,
-            ),
+        _ensure_api_key_configured()
+        prompt = build_generation_prompt(count)
+        model_primary = settings.get("GEN_AI_MODEL_1", settings.get("GENAI_MODEL"))
+        model_secondary = settings.get("GEN_AI_MODEL_2", settings.get("GENAI_MODEL"))
+        deadline = asyncio.get_running_loop().time() + settings["LINK_FETCH_DEADLINE_SECONDS"]
+        sources, _ = await _collect_sources(kind, payload, blob, deadline)
+
+        result_key = generation_cache.result_key(
+            [s.digest for s in sources], count, _prompt_version(prompt), [model_primary, model_secondary]
         )
-    except ServerError as exc:
-        status_text = str(exc)
-        code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
-        is_overloaded = (code == 503) or ("UNAVAILABLE" in status_text)
-        if not is_overloaded:
-            raise
-        return client.models.generate_content(
-            model=model_secondary,
-            contents=cast(Any, parts),
-            config=gen_types.GenerateContentConfig(
-                thinking_config=gen_types.ThinkingConfig(
-                    thinking_budget=0,
-                ),
-                response_mime_type="application/json",
-                response_schema=MCQ_ARRAY_SCHEMA,
-            ),
+        cached = await generation_cache.get_result(result_key)
+        if cached is not None:
+            await persist_items(_parse_generated_items(cached, count))
+        else:
+
+            async def stream_and_persist(key: KeyState) -> Tuple[str, McqArrayStreamParser]:
+                parts = [await upload_source(key, s) for s in sources]
+                parts.append(prompt)
+                parser = McqArrayStreamParser()
+                chunks: List[str] = []
+                # A stream stalled after its first token would otherwise hold the response,
+                # a GenAI slot and the key until the client gave up
+                timeout = asyncio.timeout_at(genai_deadline)
+                try:
+                    async with timeout:
+                        async for text in _stream_with_fallback_parts(key, parts, model_primary, model_secondary):
+                            chunks.append(text)
+                            await persist_items(parser.feed(text))
+                except Exception as exc:
+                    if isinstance(exc, TimeoutError) and timeout.expired():
+                        logger.warning(f"genai_deadline_exceeded model={model_primary} stream=true created={state['created']}")
+                        raise HTTPException(status_code=504, detail="generation_deadline_exceeded") from exc
+                    # Once questions are stored, retrying on another key would duplicate them
+                    if state["created"]:
+                        raise GenerationInterrupted(str(exc)) from exc
+                    raise
+                return "".join(chunks), parser
+
+            # Same per-request limit as the non-streaming calls, across key retries
+            genai_deadline = asyncio.get_running_loop().time() + settings["GENAI_DEADLINE_SECONDS"]
+            full_text, parser = await genai_provider.run(stream_and_persist)
+            if state["created"] and not parser.malformed:
+                await generation_cache.put_result(result_key, full_text)
+
+        await events.put(
+            (
+                "done",
+                {
+                    "status": "ok",
+                    "requested": count,
+                    "created": state["created"],
+                    "skipped_duplicates": state["skipped_duplicates"],
+                    "topic": state["topic"] or "General",
+                    "cache": "hit" if cached is not None else "miss",
+                },
+            )
         )
+    except HTTPException as exc:
+        await events.put(("error", {"detail": str(exc.detail), "created": state["created"]}))
+    except Exception:
+        logger.exception(f"streaming_generation_failed kind={kind} created={state['created']}")
+        await events.put(("error", {"detail": "generation_failed", "created": state["created"]}))
+    finally:
+        await events.put(None)
+
+
+async def _sse_events(events: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]") -> AsyncIterator[str]:
+    while True:
+        item = await events.get()
+        if item is None:
+            return
+        event, data = item
+        yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Streaming runs keep going (and keep persisting) if the client disconnects; hold a
+# reference so the task is not garbage collected mid-run
+_streaming_tasks: Set[asyncio.Task] = set()
+
+
+async def _run_or_enqueue(kind: str, payload: Dict[str, Any], blob: Optional[bytes], background: bool):
+    if not background:
+        return await run_generation(kind, payload, blob)
+    if not generation_jobs.running:
+        # Serverless deployments have no long-lived worker to pick the job up
+        raise HTTPException(status_code=503, detail="job_workers_unavailable")
+    job_id = await generation_jobs.enqueue(kind, payload, blob)
+    return JSONResponse(status_code=202, content={"status": "queued", "job_id": job_id})
 
 
 @router.post("/from-link")
@@ -256,27 +772,12 @@ async def generate_from_link(
     size: str = Form("small"),
     topic: Optional[str] = Form(None),
     sub_topic: Optional[str] = Form(None),
+    background: bool = Form(False),
 ):
     # Ensure we have at least one key
-    if not settings.get("GENAI_API_KEYS") and not settings.get("GENAI_API_KEY"):
-        raise HTTPException(status_code=400, detail="genai_api_key_missing")
-    api_key = _choose_api_key(settings.get("GENAI_API_KEYS", []))
-    if not api_key:
-        raise HTTPException(status_code=400, detail="genai_api_key_missing")
-    client = genai.Client(api_key=api_key)
-
-    count = SIZE_TO_COUNT.get(size.lower(), 25)
-    prompt = build_generation_prompt(count)
-
-    part_or_file = await create_content_part_for_url(client, url)
-    response = _generate_with_fallback_parts(
-        client=client,
-        parts=[part_or_file, prompt],
-        model_primary=settings.get("GEN_AI_MODEL_1", settings.get("GENAI_MODEL")),
-        model_secondary=settings.get("GEN_AI_MODEL_2", settings.get("GENAI_MODEL")),
-    )
-    response_text: str = response.text or "[]"
-    return await _persist_generated_questions(topic or None, sub_topic or None, response_text, count, unify_topic=True)
+    _ensure_api_key_configured()
+    payload = {"url": url, "size": size, "topic": topic, "sub_topic": sub_topic}
+    return await _run_or_enqueue("link", payload, None, background)
 
 
 @router.post("/from-pdf")
@@ -285,31 +786,12 @@ async def generate_from_pdf(
     size: str = Form("small"),
     topic: Optional[str] = Form(None),
     sub_topic: Optional[str] = Form(None),
+    background: bool = Form(False),
 ):
-    if not settings.get("GENAI_API_KEYS") and not settings.get("GENAI_API_KEY"):
-        raise HTTPException(status_code=400, detail="genai_api_key_missing")
+    _ensure_api_key_configured()
     content = await pdf.read()
-    api_key = _choose_api_key(settings.get("GENAI_API_KEYS", []))
-    if not api_key:
-        raise HTTPException(status_code=400, detail="genai_api_key_missing")
-    client = genai.Client(api_key=api_key)
-
-    count = SIZE_TO_COUNT.get(size.lower(), 25)
-    prompt = build_generation_prompt(count)
-    # Upload PDF to Files API and generate with strict JSON schema
-    uploaded: gen_types.File = client.files.upload(
-        file=io.BytesIO(content),
-        config=dict(mime_type="application/pdf"),
-    )
-    response = _generate_with_fallback(
-        client=client,
-        uploaded=uploaded,
-        prompt=prompt,
-        model_primary=settings.get("GEN_AI_MODEL_1", settings.get("GENAI_MODEL")),
-        model_secondary=settings.get("GEN_AI_MODEL_2", settings.get("GENAI_MODEL")),
-    )
-    response_text: str = response.text or "[]"
-    return await _persist_generated_questions(topic or None, sub_topic or None, response_text, count, unify_topic=True)
+    payload = {"size": size, "topic": topic, "sub_topic": sub_topic}
+    return await _run_or_enqueue("pdf", payload, content, background)
 
 
 @router.post("/from-links")
@@ -318,13 +800,9 @@ async def generate_from_links(
     size: str = Form("small"),
     topic: Optional[str] = Form(None),
     sub_topic: Optional[str] = Form(None),
+    background: bool = Form(False),
 ):
-    if not settings.get("GENAI_API_KEYS") and not settings.get("GENAI_API_KEY"):
-        raise HTTPException(status_code=400, detail="genai_api_key_missing")
-    api_key = _choose_api_key(settings.get("GENAI_API_KEYS", []))
-    if not api_key:
-        raise HTTPException(status_code=400, detail="genai_api_key_missing")
-    client = genai.Client(api_key=api_key)
+    _ensure_api_key_configured()
 
     # Clean and validate URLs
     normalized_urls: List[str] = [u.strip() for u in urls if (u or "").strip()]
@@ -333,23 +811,8 @@ async def generate_from_links(
     if len(normalized_urls) > 5:
         raise HTTPException(status_code=400, detail="too_many_links")
 
-    count = SIZE_TO_COUNT.get(size.lower(), 25)
-    prompt = build_generation_prompt(count)
-
-    parts: List[Any] = []
-    for u in normalized_urls:
-        part_or_file = await create_content_part_for_url(client, u)
-        parts.append(part_or_file)
-    parts.append(prompt)
-
-    response = _generate_with_fallback_parts(
-        client=client,
-        parts=parts,
-        model_primary=settings.get("GEN_AI_MODEL_1", settings.get("GENAI_MODEL")),
-        model_secondary=settings.get("GEN_AI_MODEL_2", settings.get("GENAI_MODEL")),
-    )
-    response_text: str = response.text or "[]"
-    return await _persist_generated_questions(topic or None, sub_topic or None, response_text, count, unify_topic=True)
+    payload = {"urls": normalized_urls, "size": size, "topic": topic, "sub_topic": sub_topic}
+    return await _run_or_enqueue("links", payload, None, background)
 
 
 @router.post("/from-text")
@@ -358,35 +821,76 @@ async def generate_from_text(
     size: str = Form("small"),
     topic: Optional[str] = Form(None),
     sub_topic: Optional[str] = Form(None),
+    background: bool = Form(False),
 ):
-    if not settings.get("GENAI_API_KEYS") and not settings.get("GENAI_API_KEY"):
-        raise HTTPException(status_code=400, detail="genai_api_key_missing")
-    api_key = _choose_api_key(settings.get("GENAI_API_KEYS", []))
-    if not api_key:
-        raise HTTPException(status_code=400, detail="genai_api_key_missing")
-    client = genai.Client(api_key=api_key)
+    _ensure_api_key_configured()
 
     source_text = (text or "").strip()
     if not source_text:
         raise HTTPException(status_code=400, detail="empty_text")
 
-    count = SIZE_TO_COUNT.get(size.lower(), 25)
-    prompt = build_generation_prompt(count)
+    payload = {"text": source_text, "size": size, "topic": topic, "sub_topic": sub_topic}
+    return await _run_or_enqueue("text", payload, None, background)
 
-    parts: List[Any] = [gen_types.Part(text=source_text), prompt]
-    response = _generate_with_fallback_parts(
-        client=client,
-        parts=parts,
-        model_primary=settings.get("GEN_AI_MODEL_1", settings.get("GENAI_MODEL")),
-        model_secondary=settings.get("GEN_AI_MODEL_2", settings.get("GENAI_MODEL")),
+
+@router.post("/stream")
+async def generate_stream(
+    url: Optional[str] = Form(None),
+    text: Optional[str] = Form(None),
+    pdf: Optional[UploadFile] = File(None),
+    size: str = Form("small"),
+    topic: Optional[str] = Form(None),
+    sub_topic: Optional[str] = Form(None),
+):
+    _ensure_api_key_configured()
+    payload: Dict[str, Any] = {"size": size, "topic": topic, "sub_topic": sub_topic}
+    blob: Optional[bytes] = None
+    if pdf is not None:
+        kind = "pdf"
+        blob = await pdf.read()
+    elif (url or "").strip():
+        kind = "link"
+        payload["url"] = (url or "").strip()
+    elif (text or "").strip():
+        kind = "text"
+        payload["text"] = (text or "").strip()
+    else:
+        raise HTTPException(status_code=400, detail="no_source_provided")
+
+    events: "asyncio.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = asyncio.Queue()
+    task = asyncio.create_task(run_streaming_generation(kind, payload, blob, events))
+    _streaming_tasks.add(task)
+    task.add_done_callback(_streaming_tasks.discard)
+    return StreamingResponse(
+        _sse_events(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    response_text: str = response.text or "[]"
-    return await _persist_generated_questions(topic or None, sub_topic or None, response_text, count, unify_topic=True)
 
 
-async def _persist_generated_questions(topic_name: Optional[str], sub_topic_name: Optional[str], json_text: str, requested_count: int, unify_topic: bool = True):
-    import json
+@router.get("/keys")
+async def get_genai_key_utilization():
+    # Hedge thresholds per model and retry budget tokens sit alongside key utilization
+    return {
+        "keys": genai_keys.snapshot(),
+        "hedging": {"models": genai_latency.snapshot(), "retry_budget_tokens": round(genai_retry_budget.tokens, 1)},
+    }
+
+
+@router.get("/cache/stats")
+async def get_generation_cache_stats():
+    return await generation_cache.stats()
+
+
+@router.get("/jobs/{job_id}")
+async def get_generation_job(job_id: int):
+    job = await generation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job_not_found")
+    return job
 
+
+def _parse_generated_items(json_text: str, requested_count: int) -> List[Dict[str, Any]]:
     # Parse and normalize data
     parsed = json.loads(json_text)
     if not isinstance(parsed, list):
@@ -399,7 +903,10 @@ async def _persist_generated_questions(topic_name: Optional[str], sub_topic_name
     count = max(0, int(requested_count or 0))
     if count > 0:
         data = data[:count]
+    return data
+
 
+def _resolve_document_topic(topic_name: Optional[str], data: List[Dict[str, Any]], unify_topic: bool) -> Optional[str]:
     # Determine a single topic for the whole document if requested
     document_topic = (topic_name or None)
     if unify_topic:
@@ -412,53 +919,167 @@ async def _persist_generated_questions(topic_name: Optional[str], sub_topic_name
                     break
         if not document_topic:
             document_topic = "General"
+    return document_topic
+
+
+async def _persist_generated_questions(topic_name: Optional[str], sub_topic_name: Optional[str], json_text: str, requested_count: int, unify_topic: bool = True):
+    data = _parse_generated_items(json_text, requested_count)
+    document_topic = _resolve_document_topic(topic_name, data, unify_topic)
+    questions, skipped_duplicates = await _persist_generated_items(data, topic_name, sub_topic_name, document_topic, unify_topic)
+    return {
+        "status": "ok",
+        "requested": requested_count,
+        "created": len(questions),
+        "skipped_duplicates": skipped_duplicates,
+        "topic": document_topic or topic_name or "General",
+    }
 
-    created = 0
+
+async def _persist_generated_items(
+    data: List[Dict[str, Any]],
+    topic_name: Optional[str],
+    sub_topic_name: Optional[str],
+    document_topic: Optional[str],
+    unify_topic: bool = True,
+) -> Tuple[List[Dict[str, Any]], int]:
+    # Writes one batch of MCQs and returns them as stored, shaped like models.Question,
+    # along with how many items were skipped as near-duplicates of existing questions
+
+    # Resolve names per item, then dedupe so each topic/sub-topic is upserted once
+    resolved: List[tuple] = []
     for item in data:
         use_topic = document_topic if unify_topic else (item.get("topic") or topic_name or "General")
         # If the user supplied a sub_topic, always use it for all questions.
         # If only a topic was supplied, let the model's per-item sub_topic be used.
         use_sub_topic = (sub_topic_name or item.get("sub_topic") or "Misc")
+        resolved.append((str(use_topic).strip(), str(use_sub_topic).strip(), item))
 
-        topic_id = await db.fetchval(
-            "INSERT INTO topics(name) VALUES($1) ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING id",
-            str(use_topic).strip(),
-        )
-        sub_topic_id = await db.fetchval(
-            """
-            INSERT INTO sub_topics(topic_id, name)
-            VALUES($1, $2)
-            ON CONFLICT (topic_id, name) DO UPDATE SET name = EXCLUDED.name
-            RETURNING id
-            """,
-            topic_id,
-            str(use_sub_topic).strip(),
-        )
-        qid = await db.fetchval(
-            """
-            INSERT INTO questions(sub_topic_id, question_text, explanation, image_url)
-            VALUES ($1, $2, $3, $4)
-            RETURNING id
-            """,
-            sub_topic_id,
-            item.get("question_text"),
-            item.get("explanation"),
-            item.get("image_url"),
+    questions: List[Dict[str, Any]] = []
+    skipped_duplicates = 0
+    if resolved:
+        # MinHash signatures are pure CPU; compute them before taking a connection
+        signatures: List[List[int]] = (
+            await asyncio.to_thread(lambda: [question_signature(item.get("question_text")) for _, _, item in resolved])
+            if question_index.enabled
+            else [[] for _ in resolved]
         )
-        options: List[str] = item.get("choices", [])
-        correct_index = int(item.get("correct_index", 0))
-        for idx, text in enumerate(options):
-            await db.execute(
+        # Upserts lock rows in input order; a fixed order keeps two concurrent persists
+        # that share topics from deadlocking on each other
+        topic_names = sorted({t for t, _, _ in resolved})
+
+        # Everything below runs on one connection in one transaction: a failure leaves no
+        # partial batch behind, and the whole persist costs a fixed number of round trips.
+        async with db.transaction("persist_generated") as con:
+            topic_rows = await con.fetch(
                 """
-                INSERT INTO choices(question_id, choice_text, is_correct)
-                VALUES ($1, $2, $3)
+                INSERT INTO topics(name)
+                SELECT unnest($1::text[])
+                ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+                RETURNING id, name
+                """,
+                topic_names,
+            )
+            topic_ids = {r["name"]: r["id"] for r in topic_rows}
+            sub_topic_pairs = sorted({(topic_ids[t], st) for t, st, _ in resolved})
+
+            sub_topic_rows = await con.fetch(
+                """
+                INSERT INTO sub_topics(topic_id, name)
+                SELECT * FROM unnest($1::int[], $2::text[])
+                ON CONFLICT (topic_id, name) DO UPDATE SET name = EXCLUDED.name
+                RETURNING id, topic_id, name
                 """,
-                qid,
-                text,
-                idx == correct_index,
+                [topic_id for topic_id, _ in sub_topic_pairs],
+                [st for _, st in sub_topic_pairs],
             )
-        created += 1
+            sub_topic_ids = {(r["topic_id"], r["name"]): r["id"] for r in sub_topic_rows}
+            item_sub_topic_ids = [sub_topic_ids[(topic_ids[t], st)] for t, st, _ in resolved]
+
+            # Drop items that repeat a stored question (or each other) in their sub-topic
+            keep = await question_index.filter_new(con, item_sub_topic_ids, signatures)
+            skipped_duplicates = keep.count(False)
+            kept = [entry for entry, k in zip(zip(item_sub_topic_ids, resolved, signatures), keep) if k]
+
+            # Reserve ids up front so choices can reference their question without relying
+            # on the row order of a multi-row INSERT ... RETURNING
+            id_rows = await con.fetch(
+                "SELECT nextval(pg_get_serial_sequence('questions', 'id'))::int AS id FROM generate_series(1, $1)",
+                len(kept),
+            )
+            question_ids = [r["id"] for r in id_rows]
+
+            q_sub_topic_ids: List[int] = []
+            q_texts: List[Optional[str]] = []
+            q_explanations: List[Optional[str]] = []
+            q_image_urls: List[Optional[str]] = []
+            c_question_ids: List[int] = []
+            c_texts: List[str] = []
+            c_correct: List[bool] = []
+            for qid, (sub_topic_id, (_, _, item), _) in zip(question_ids, kept):
+                q_sub_topic_ids.append(sub_topic_id)
+                q_texts.append(item.get("question_text"))
+                q_explanations.append(item.get("explanation"))
+                q_image_urls.append(item.get("image_url"))
 
-    return {"status": "ok", "requested": requested_count, "created": created, "topic": document_topic or topic_name or "General"}
+                options: List[str] = item.get("choices", [])
+                correct_index = int(item.get("correct_index", 0))
+                # choices are UNIQUE(question_id, choice_text); fold repeated options into one row
+                by_text: Dict[str, bool] = {}
+                for idx, text in enumerate(options):
+                    by_text[text] = by_text.get(text, False) or idx == correct_index
+                for text, is_correct in by_text.items():
+                    c_question_ids.append(qid)
+                    c_texts.append(text)
+                    c_correct.append(is_correct)
 
+            await con.execute(
+                """
+                INSERT INTO questions(id, sub_topic_id, question_text, explanation, image_url)
+                SELECT * FROM unnest($1::int[], $2::int[], $3::text[], $4::text[], $5::text[])
+                """,
+                question_ids,
+                q_sub_topic_ids,
+                q_texts,
+                q_explanations,
+                q_image_urls,
+            )
+            choice_rows = await con.fetch(
+                """
+                INSERT INTO choices(question_id, choice_text, is_correct)
+                SELECT * FROM unnest($1::int[], $2::text[], $3::bool[])
+                RETURNING id, question_id, choice_text, is_correct
+                """,
+                c_question_ids,
+                c_texts,
+                c_correct,
+            )
+            if question_index.enabled:
+                await question_index.add(con, question_ids, q_sub_topic_ids, [sig for _, _, sig in kept])
+            await unanswered_questions.add_questions(con, question_ids, q_sub_topic_ids)
+        # New topics, sub-topics and questions: rebuild the tree on its next read, and keep
+        # reads on the primary until replicas have them
+        topic_tree.invalidate()
+        db.mark_written(unanswered_questions.user_id)
+        if metrics.enabled:
+            GENERATION_ITEMS_PERSISTED.inc(amount=len(question_ids))
+
+        choices_by_qid: Dict[int, List[Dict[str, Any]]] = {qid: [] for qid in question_ids}
+        for c in choice_rows:
+            choices_by_qid[c["question_id"]].append(dict(c))
+        for qid, sub_topic_id, text, explanation, image_url in zip(
+            question_ids, q_sub_topic_ids, q_texts, q_explanations, q_image_urls
+        ):
+            questions.append(
+                {
+                    "id": qid,
+                    "sub_topic_id": sub_topic_id,
+                    "question_text": text,
+                    "explanation": explanation,
+                    "image_url": image_url,
+                    "choices": choices_by_qid[qid],
+                }
+            )
+        if skipped_duplicates:
+            logger.info(f"persist_skipped_duplicates count={skipped_duplicates} kept={len(questions)}")
 
+    return questions, skipped_duplicates
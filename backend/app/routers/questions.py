@@ -1,12 +1,26 @@
-from typing import List
-import time
+from datetime import timezone
+from typing import List, Optional
 import logging
+import random
+import time
 
 from fastapi import APIRouter, HTTPException, Query
 
+from ..answer_keys import AnswerKey, answer_keys
 from ..config import load_settings
 from ..db import db
-from ..models import AnswerRequest, AnswerResponse, Question, Choice
+from ..models import (
+    AnswerRequest,
+    AnswerResponse,
+    BatchAnswerItem,
+    BatchAnswerRequest,
+    BatchAnswerResponse,
+    BatchAnswerResult,
+    Question,
+)
+from ..question_cache import load_questions, question_bundles, questions_response
+from ..scheduler import REVIEW_UPSERT_SQL
+from ..topic_tree import topic_tree
 
 logger = logging.getLogger("app.routers.questions")
 
@@ -16,236 +30,249 @@ settings = load_settings()
 DEFAULT_USER_ID = settings["DEFAULT_USER_ID"]
 
 
-async def _fetch_question_bundle(question_ids: List[int]) -> List[Question]:
-    if not question_ids:
-        return []
-    rows = await db.fetch(
-        "SELECT id, sub_topic_id, question_text, explanation, image_url FROM questions WHERE id = ANY($1)",
-        question_ids,
-    )
-    choices_rows = await db.fetch(
-        "SELECT id, question_id, choice_text, is_correct FROM choices WHERE question_id = ANY($1)",
-        question_ids,
+# Draw from a random pivot in the unanswered range of user_question_state, wrapping around
+# to the start of the range when fewer than $2 rows lie past the pivot. Each branch is a
+# bounded scan of a partial index, so cost does not grow with the answer history. Only ids
+# are returned; the bundles come from the question cache.
+_SAMPLE_SQL = """
+    WITH after_pivot AS (
+        SELECT s.question_id
+        FROM user_question_state s
+        WHERE s.user_id = $1 AND NOT s.answered {sub_topic_filter} AND s.rand_key >= $3
+        ORDER BY s.rand_key
+        LIMIT $2
+    ),
+    wrapped AS (
+        SELECT s.question_id
+        FROM user_question_state s
+        WHERE s.user_id = $1 AND NOT s.answered {sub_topic_filter} AND s.rand_key < $3
+        ORDER BY s.rand_key
+        LIMIT GREATEST(0, $2 - (SELECT COUNT(*) FROM after_pivot))
     )
-    by_qid = {}
-    for r in rows:
-        by_qid[r["id"]] = {
-            "q": r,
-            "choices": [],
-        }
-    for c in choices_rows:
-        by_qid[c["question_id"]]["choices"].append(c)
-    result: List[Question] = []
-    for qid in question_ids:
-        data = by_qid.get(qid)
-        if not data:
-            continue
-        q = data["q"]
-        result.append(
-            Question(
-                id=q["id"],
-                sub_topic_id=q["sub_topic_id"],
-                question_text=q["question_text"],
-                explanation=q["explanation"],
-                image_url=q["image_url"],
-                choices=[
-                    Choice(
-                        id=c["id"],
-                        question_id=c["question_id"],
-                        choice_text=c["choice_text"],
-                        is_correct=c["is_correct"],
-                    )
-                    for c in data["choices"]
-                ],
-            )
+    SELECT question_id FROM after_pivot
+    UNION ALL
+    SELECT question_id FROM wrapped
+"""
+_SAMPLE_ANY_SQL = _SAMPLE_SQL.format(sub_topic_filter="")
+_SAMPLE_SUB_TOPIC_SQL = _SAMPLE_SQL.format(sub_topic_filter="AND s.sub_topic_id = $4")
+
+
+async def _sample_unanswered(user_id: int, limit: int, sub_topic_id: Optional[int] = None) -> List[Question]:
+    if sub_topic_id is None:
+        rows = await db.reader(user_id).fetch(_SAMPLE_ANY_SQL, user_id, limit, random.random(), name="sample_unanswered")
+    else:
+        rows = await db.reader(user_id).fetch(
+            _SAMPLE_SUB_TOPIC_SQL, user_id, limit, random.random(), sub_topic_id, name="sample_unanswered_sub_topic"
         )
-    return result
+    return await load_questions([r["question_id"] for r in rows])
+
+
+MAX_IDS_PER_REQUEST = 100
+
+
+@router.get("/questions", response_model=List[Question])
+async def get_questions_by_ids(ids: str = Query(..., description="Comma-separated question ids")):
+    try:
+        question_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid_ids")
+    if not question_ids or len(question_ids) > MAX_IDS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail="invalid_ids")
+    return questions_response(await load_questions(question_ids))
+
+
+@router.get("/questions/cache/stats")
+async def get_question_cache_stats():
+    return {"bundles": question_bundles.stats(), "answer_keys": answer_keys.stats()}
 
 
 @router.get("/sub_topics/{sub_topic_id}/questions", response_model=List[Question])
 async def sample_questions_for_sub_topic(sub_topic_id: int, limit: int = Query(5, ge=1, le=50)):
-    # Single-query approach to eliminate multiple roundtrips to Neon cloud DB
-    rows = await db.fetch(
-        """
-        WITH answered AS (
-            SELECT question_id FROM user_answers WHERE user_id = $2
-        ),
-        sampled AS (
-            SELECT q.id
-            FROM questions q TABLESAMPLE SYSTEM (50)
-            WHERE q.sub_topic_id = $1
-              AND NOT EXISTS (SELECT 1 FROM answered a WHERE a.question_id = q.id)
-            LIMIT $3
-        ),
-        fallback AS (
-            SELECT q.id
-            FROM questions q
-            WHERE q.sub_topic_id = $1
-              AND NOT EXISTS (SELECT 1 FROM answered a WHERE a.question_id = q.id)
-              AND NOT EXISTS (SELECT 1 FROM sampled s WHERE s.id = q.id)
-            ORDER BY q.id
-            LIMIT GREATEST(0, $3 - (SELECT COUNT(*) FROM sampled))
-        ),
-        final_ids AS (
-            SELECT id FROM sampled
-            UNION ALL
-            SELECT id FROM fallback
-        )
-        SELECT q.id, q.sub_topic_id, q.question_text, q.explanation, q.image_url,
-               c.id as choice_id, c.choice_text, c.is_correct
-        FROM final_ids f
-        JOIN questions q ON q.id = f.id
-        JOIN choices c ON c.question_id = q.id
-        ORDER BY q.id, c.id
-        LIMIT $3 * 10
-        """,
-        sub_topic_id,
-        DEFAULT_USER_ID,
-        limit,
-    )
-    
-    # Group by question_id
-    by_qid: dict = {}
-    for r in rows:
-        qid = int(r["id"])
-        if qid not in by_qid:
-            by_qid[qid] = {
-                "q": {"id": int(r["id"]), "sub_topic_id": int(r["sub_topic_id"]), 
-                      "question_text": str(r["question_text"]), "explanation": r["explanation"],
-                      "image_url": r["image_url"]},
-                "choices": []
-            }
-        choices_list: list = by_qid[qid]["choices"]
-        choices_list.append({
-            "id": int(r["choice_id"]), "question_id": qid,
-            "choice_text": str(r["choice_text"]), "is_correct": bool(r["is_correct"])
-        })
-    
-    result: List[Question] = []
-    for qid in list(by_qid.keys())[:limit]:
-        data = by_qid[qid]
-        q = data["q"]
-        result.append(
-            Question(
-                id=q["id"],
-                sub_topic_id=q["sub_topic_id"],
-                question_text=q["question_text"],
-                explanation=q["explanation"],
-                image_url=q["image_url"],
-                choices=[Choice(**c) for c in data["choices"]],
-            )
-        )
-    
-    return result
+    return questions_response(await _sample_unanswered(DEFAULT_USER_ID, limit, sub_topic_id))
 
 
 @router.get("/questions/random", response_model=List[Question])
 async def sample_questions_random(limit: int = Query(5, ge=1, le=50)):
     t0 = time.perf_counter()
-    
-    # Single-query approach: fetch everything in one roundtrip using CTE
-    # This eliminates multiple network roundtrips to Neon cloud DB
-    rows = await db.fetch(
-        """
-        WITH answered AS (
-            SELECT question_id FROM user_answers WHERE user_id = $1
-        ),
-        sampled AS (
-            SELECT q.id
-            FROM questions q TABLESAMPLE SYSTEM (50)
-            WHERE NOT EXISTS (SELECT 1 FROM answered a WHERE a.question_id = q.id)
-            LIMIT $2
-        ),
-        fallback AS (
-            SELECT q.id
-            FROM questions q
-            WHERE NOT EXISTS (SELECT 1 FROM answered a WHERE a.question_id = q.id)
-              AND NOT EXISTS (SELECT 1 FROM sampled s WHERE s.id = q.id)
-            ORDER BY q.id
-            LIMIT GREATEST(0, $2 - (SELECT COUNT(*) FROM sampled))
-        ),
-        final_ids AS (
-            SELECT id FROM sampled
-            UNION ALL
-            SELECT id FROM fallback
-        )
-        SELECT q.id, q.sub_topic_id, q.question_text, q.explanation, q.image_url,
-               c.id as choice_id, c.choice_text, c.is_correct
-        FROM final_ids f
-        JOIN questions q ON q.id = f.id
-        JOIN choices c ON c.question_id = q.id
-        ORDER BY q.id, c.id
-        LIMIT $2 * 10
-        """,
-        DEFAULT_USER_ID,
-        limit,
-    )
-    
+    result = await _sample_unanswered(DEFAULT_USER_ID, limit)
     t1 = time.perf_counter()
-    logger.info(f"Single-query fetch completed in {(t1-t0)*1000:.1f}ms, returned {len(rows)} rows")
-    
-    # Group by question_id in Python
-    by_qid: dict = {}
-    for r in rows:
-        qid = int(r["id"])
-        if qid not in by_qid:
-            by_qid[qid] = {
-                "q": {"id": int(r["id"]), "sub_topic_id": int(r["sub_topic_id"]), 
-                      "question_text": str(r["question_text"]), "explanation": r["explanation"],
-                      "image_url": r["image_url"]},
-                "choices": []
-            }
-        choices_list: list = by_qid[qid]["choices"]
-        choices_list.append({
-            "id": int(r["choice_id"]), "question_id": qid,
-            "choice_text": str(r["choice_text"]), "is_correct": bool(r["is_correct"])
-        })
-    
-    result: List[Question] = []
-    for qid in list(by_qid.keys())[:limit]:
-        data = by_qid[qid]
-        q = data["q"]
-        result.append(
-            Question(
-                id=q["id"],
-                sub_topic_id=q["sub_topic_id"],
-                question_text=q["question_text"],
-                explanation=q["explanation"],
-                image_url=q["image_url"],
-                choices=[Choice(**c) for c in data["choices"]],
-            )
-        )
-    
-    t2 = time.perf_counter()
-    logger.info(f"Total time: {(t2-t0)*1000:.1f}ms for {len(result)} questions")
-    
-    return result
+    logger.info(f"Total time: {(t1-t0)*1000:.1f}ms for {len(result)} questions")
+    return questions_response(result)
+
+
+# One statement per answer: the choice is validated against its question, then the answer
+# row, today's streak rollup, the review card and the sampling state are all written from
+# the `answer` CTE (an invalid choice inserts nothing and yields is_correct = NULL).
+_RECORD_ANSWER_SQL = """
+    WITH choice AS (
+        SELECT is_correct FROM choices WHERE id = $3 AND question_id = $2
+    ),
+    answer AS (
+        INSERT INTO user_answers (user_id, question_id, choice_id, is_correct)
+        SELECT $1, $2, $3, choice.is_correct FROM choice
+        RETURNING user_id, question_id, is_correct
+    ),
+    daily AS (
+        INSERT INTO user_daily_stats AS d (user_id, day, answers, correct)
+        SELECT a.user_id, CURRENT_DATE, 1, CASE WHEN a.is_correct THEN 1 ELSE 0 END FROM answer a
+        ON CONFLICT (user_id, day) DO UPDATE
+        SET answers = d.answers + 1, correct = d.correct + EXCLUDED.correct
+    ),
+    review AS (
+        {review_upsert}
+    ),
+    state AS (
+        UPDATE user_question_state s
+        SET answered = TRUE
+        FROM answer a
+        WHERE s.user_id = a.user_id AND s.question_id = a.question_id AND NOT s.answered
+        RETURNING s.sub_topic_id
+    )
+    SELECT (SELECT is_correct FROM answer) AS is_correct,
+           (SELECT sub_topic_id FROM state) AS answered_sub_topic_id{key_columns}
+"""
+# On an answer-key cache miss the same roundtrip also reads the question's key
+_RECORD_ANSWER_WITH_KEY_SQL = _RECORD_ANSWER_SQL.format(
+    review_upsert=REVIEW_UPSERT_SQL,
+    key_columns=""",
+           (SELECT array_agg(id) FROM choices WHERE question_id = $2) AS choice_ids,
+           (SELECT MIN(id) FROM choices WHERE question_id = $2 AND is_correct) AS correct_choice_id""",
+)
+_RECORD_ANSWER_SQL = _RECORD_ANSWER_SQL.format(review_upsert=REVIEW_UPSERT_SQL, key_columns="")
 
 
 @router.post("/answers", response_model=AnswerResponse)
 async def submit_answer(payload: AnswerRequest):
-    choice = await db.fetchrow(
-        "SELECT id, question_id, is_correct FROM choices WHERE id = $1",
-        payload.choice_id,
-    )
-    if not choice or choice["question_id"] != payload.question_id:
+    key = answer_keys.get(payload.question_id)
+    if key is not None:
+        if payload.choice_id not in key.choice_ids:
+            raise HTTPException(status_code=400, detail="invalid_choice")
+        row = await db.fetchrow(_RECORD_ANSWER_SQL, DEFAULT_USER_ID, payload.question_id, payload.choice_id, name="record_answer")
+    else:
+        row = await db.fetchrow(
+            _RECORD_ANSWER_WITH_KEY_SQL, DEFAULT_USER_ID, payload.question_id, payload.choice_id, name="record_answer_with_key"
+        )
+        if row["choice_ids"]:
+            key = AnswerKey(correct_choice_id=row["correct_choice_id"], choice_ids=frozenset(row["choice_ids"]))
+            answer_keys.put(payload.question_id, key)
+    db.mark_written(DEFAULT_USER_ID)
+
+    if row["answered_sub_topic_id"] is not None:
+        topic_tree.record_answered([row["answered_sub_topic_id"]])
+    if row["is_correct"] is None or key is None or key.correct_choice_id is None:
         raise HTTPException(status_code=400, detail="invalid_choice")
+    return AnswerResponse(is_correct=bool(row["is_correct"]), correct_choice_id=int(key.correct_choice_id))
 
-    is_correct = bool(choice["is_correct"])
-    correct_choice_id = await db.fetchval(
-        "SELECT id FROM choices WHERE question_id = $1 AND is_correct = TRUE",
-        payload.question_id,
-    )
-    await db.execute(
-        """
-        INSERT INTO user_answers (user_id, question_id, choice_id, is_correct)
-        VALUES ($1, $2, $3, $4)
-        """,
-        DEFAULT_USER_ID,
-        payload.question_id,
-        payload.choice_id,
-        is_correct,
+
+MAX_BATCH_ANSWERS = 500
+
+# A whole batch in one statement: items are validated against `choices` with one join,
+# inserted with one multi-row INSERT (client ids already stored are skipped), and the
+# rollups are updated set-wise. Client timestamps are kept but never in the future; the
+# review card and sampling state follow each question's latest answer in the batch.
+_RECORD_BATCH_SQL = f"""
+    WITH input AS (
+        SELECT *
+        FROM unnest($2::text[], $3::int[], $4::int[], $5::timestamptz[])
+             WITH ORDINALITY AS i(client_answer_id, question_id, choice_id, answered_at, ord)
+    ),
+    valid AS (
+        SELECT i.client_answer_id, i.question_id, i.choice_id, c.is_correct,
+               LEAST(COALESCE(i.answered_at, NOW()), NOW()) AS answered_at
+        FROM input i
+        JOIN choices c ON c.id = i.choice_id AND c.question_id = i.question_id
+    ),
+    inserted AS (
+        INSERT INTO user_answers (user_id, question_id, choice_id, is_correct, answered_at, client_answer_id)
+        SELECT $1, question_id, choice_id, is_correct, answered_at, client_answer_id
+        FROM valid
+        ORDER BY answered_at
+        ON CONFLICT (user_id, client_answer_id) WHERE client_answer_id IS NOT NULL DO NOTHING
+        RETURNING client_answer_id, question_id, is_correct, answered_at
+    ),
+    daily AS (
+        INSERT INTO user_daily_stats AS d (user_id, day, answers, correct)
+        SELECT $1, answered_at::date, COUNT(*), COUNT(*) FILTER (WHERE is_correct)
+        FROM inserted
+        GROUP BY answered_at::date
+        ON CONFLICT (user_id, day) DO UPDATE
+        SET answers = d.answers + EXCLUDED.answers, correct = d.correct + EXCLUDED.correct
+    ),
+    answer AS (
+        SELECT DISTINCT ON (question_id) $1::int AS user_id, question_id, is_correct
+        FROM inserted
+        ORDER BY question_id, answered_at DESC
+    ),
+    review AS (
+        {REVIEW_UPSERT_SQL}
+    ),
+    state AS (
+        UPDATE user_question_state s
+        SET answered = TRUE
+        FROM answer a
+        WHERE s.user_id = a.user_id AND s.question_id = a.question_id AND NOT s.answered
+        RETURNING s.sub_topic_id
     )
-    return AnswerResponse(is_correct=is_correct, correct_choice_id=int(correct_choice_id))
+    SELECT i.ord, v.is_correct, (ins.client_answer_id IS NOT NULL) AS recorded,
+           (SELECT MIN(c.id) FROM choices c WHERE c.question_id = v.question_id AND c.is_correct) AS correct_choice_id,
+           (SELECT array_agg(sub_topic_id) FROM state) AS answered_sub_topic_ids
+    FROM input i
+    LEFT JOIN valid v ON v.client_answer_id = i.client_answer_id
+    LEFT JOIN inserted ins ON ins.client_answer_id = i.client_answer_id
+    ORDER BY i.ord
+"""
+
 
+@router.post("/answers/batch", response_model=BatchAnswerResponse)
+async def submit_answers_batch(payload: BatchAnswerRequest):
+    if len(payload.answers) > MAX_BATCH_ANSWERS:
+        raise HTTPException(status_code=400, detail="too_many_answers")
+
+    # A client id repeated within the batch is only recorded once (first occurrence)
+    unique: List[BatchAnswerItem] = []
+    seen = set()
+    for item in payload.answers:
+        if item.client_answer_id not in seen:
+            seen.add(item.client_answer_id)
+            unique.append(item)
+
+    by_client_id = {}
+    if unique:
+        rows = await db.fetch(
+            _RECORD_BATCH_SQL,
+            DEFAULT_USER_ID,
+            [item.client_answer_id for item in unique],
+            [item.question_id for item in unique],
+            [item.choice_id for item in unique],
+            [
+                item.answered_at.replace(tzinfo=timezone.utc)
+                if item.answered_at is not None and item.answered_at.tzinfo is None
+                else item.answered_at
+                for item in unique
+            ],
+            name="record_answer_batch",
+        )
+        db.mark_written(DEFAULT_USER_ID)
+        if rows and rows[0]["answered_sub_topic_ids"]:
+            topic_tree.record_answered(rows[0]["answered_sub_topic_ids"])
+        for item, r in zip(unique, rows):
+            if r["is_correct"] is None:
+                status = "invalid_choice"
+            else:
+                status = "recorded" if r["recorded"] else "duplicate"
+            by_client_id[item.client_answer_id] = BatchAnswerResult(
+                client_answer_id=item.client_answer_id,
+                status=status,
+                is_correct=r["is_correct"],
+                correct_choice_id=r["correct_choice_id"],
+            )
 
+    results: List[BatchAnswerResult] = []
+    emitted = set()
+    for item in payload.answers:
+        result = by_client_id[item.client_answer_id]
+        if item.client_answer_id in emitted and result.status != "invalid_choice":
+            result = result.model_copy(update={"status": "duplicate"})
+        emitted.add(item.client_answer_id)
+        results.append(result)
+    return BatchAnswerResponse(recorded=sum(1 for r in by_client_id.values() if r.status == "recorded"), results=results)
@@ -0,0 +1,33 @@
+from typing import List
+
+from fastapi import APIRouter, Query
+
+from ..config import load_settings
+from ..db import db
+from ..models import Question
+from ..question_cache import load_questions, questions_response
+
+
+router = APIRouter(prefix="/review", tags=["review"])
+settings = load_settings()
+DEFAULT_USER_ID = settings["DEFAULT_USER_ID"]
+
+# Most overdue cards first: a range scan of (user_id, due_at) bounded by the limit; the
+# bundles come from the question cache
+_DUE_SQL = """
+    SELECT question_id
+    FROM review_state
+    WHERE user_id = $1 AND due_at <= NOW()
+    ORDER BY due_at
+    LIMIT $2
+"""
+
+
+async def _due_questions(user_id: int, limit: int) -> List[Question]:
+    rows = await db.reader(user_id).fetch(_DUE_SQL, user_id, limit, name="review_due")
+    return await load_questions([r["question_id"] for r in rows])
+
+
+@router.get("/due", response_model=List[Question])
+async def get_due_reviews(limit: int = Query(20, ge=1, le=100)):
+    return questions_response(await _due_questions(DEFAULT_USER_ID, limit))
@@ -1,66 +1,69 @@
 from datetime import date, timedelta
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 
 from ..config import load_settings
 from ..db import db
-from ..models import StreakResponse
+from ..models import StreakGoalRequest, StreakResponse
 
 
 router = APIRouter(prefix="/streak", tags=["streak"])
 settings = load_settings()
 DEFAULT_USER_ID = settings["DEFAULT_USER_ID"]
+DEFAULT_STREAK_GOAL = 5
+MAX_STREAK_GOAL = 500
 
 
 @router.get("/", response_model=StreakResponse)
 async def get_streak():
     today = date.today()
 
-    # Today's answer count (uses composite index on (user_id, answered_at))
-    today_count = await db.fetchval(
+    # Goal plus at most a year of daily rollup rows (newest first), read from the
+    # (user_id, day) primary key in one roundtrip; a replica serves it unless the user just
+    # answered or changed the goal
+    row = await db.reader(DEFAULT_USER_ID).fetchrow(
         """
-        SELECT COUNT(*)::int
-        FROM user_answers
+        SELECT COALESCE((SELECT streak_goal FROM user_settings WHERE user_id = $1), $3)::int AS goal,
+               array_agg(day ORDER BY day DESC) AS days,
+               array_agg(answers ORDER BY day DESC) AS answers
+        FROM user_daily_stats
         WHERE user_id = $1
-          AND answered_at >= $2::date
-          AND answered_at < ($2::date + INTERVAL '1 day')
+          AND day <= $2::date
+          AND day > $2::date - 366
         """,
         DEFAULT_USER_ID,
         today,
+        DEFAULT_STREAK_GOAL,
+        name="streak",
     )
+    goal = int(row["goal"])
+    counts = dict(zip(row["days"] or [], row["answers"] or []))
+    today_count = int(counts.get(today, 0))
 
-    # Compute consecutive days streak where each day has at least 5 answers.
-    # Strategy: build daily counts, starting at today and walking backward only
-    # until a day fails the threshold, but do it in SQL to avoid per-day roundtrips.
-    row = await db.fetchval(
+    # Consecutive days meeting the goal, walking backward until a day falls short (a day
+    # without answers falls short too). Today only counts once it meets the goal; until
+    # then the streak through yesterday is still live and the walk starts there.
+    streak_days = 0
+    day = today if today_count >= goal else today - timedelta(days=1)
+    while counts.get(day, 0) >= goal:
+        streak_days += 1
+        day -= timedelta(days=1)
+
+    return StreakResponse(current_streak_days=streak_days, today_answers_count=today_count, streak_goal=goal)
+
+
+@router.put("/goal", response_model=StreakResponse)
+async def set_streak_goal(payload: StreakGoalRequest):
+    if not 1 <= payload.streak_goal <= MAX_STREAK_GOAL:
+        raise HTTPException(status_code=400, detail="invalid_streak_goal")
+    await db.execute(
         """
-        WITH daily AS (
-            SELECT date_trunc('day', answered_at)::date AS day, COUNT(*)::int AS cnt
-            FROM user_answers
-            WHERE user_id = $1
-            GROUP BY 1
-        ),
-        flagged AS (
-            SELECT day,
-                   CASE WHEN cnt >= 5 THEN 0 ELSE 1 END AS broken
-            FROM daily
-        ),
-        gaps AS (
-            SELECT day,
-                   SUM(broken) OVER (ORDER BY day DESC ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS grp
-            FROM flagged
-            WHERE day <= $2::date
-        )
-        SELECT COALESCE(COUNT(*), 0)::int
-        FROM gaps
-        WHERE grp = 0
-          AND day >= $2::date - INTERVAL '365 days'
+        INSERT INTO user_settings(user_id, streak_goal)
+        VALUES ($1, $2)
+        ON CONFLICT (user_id) DO UPDATE SET streak_goal = EXCLUDED.streak_goal
         """,
         DEFAULT_USER_ID,
-        today,
+        payload.streak_goal,
     )
-    streak_days = int(row or 0)
-
-    return StreakResponse(current_streak_days=streak_days, today_answers_count=today_count)
-
-
+    db.mark_written(DEFAULT_USER_ID)
+    return await get_streak()
@@ -1,26 +1,38 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter
-
-from ..db import db
-from ..models import SubTopic, Topic
+from fastapi import APIRouter, Header, Response
 
+from ..config import load_settings
+from ..fast_json import FastJSONResponse
+from ..models import SubTopic, Topic, TopicTreeResponse
+from ..topic_tree import topic_tree
 
 router = APIRouter(prefix="/topics", tags=["topics"])
+FAST_JSON_RESPONSES = load_settings()["FAST_JSON_RESPONSES"]
 
 
 @router.get("/", response_model=List[Topic])
 async def list_topics():
-    rows = await db.fetch("SELECT id, name FROM topics ORDER BY name ASC")
-    return [Topic(id=r["id"], name=r["name"]) for r in rows]
+    topics = await topic_tree.topics()
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse([{"id": t["id"], "name": t["name"]} for t in topics])
+    return [Topic(id=t["id"], name=t["name"]) for t in topics]
 
 
-@router.get("/{topic_id}/sub_topics", response_model=List[SubTopic])
-async def list_sub_topics(topic_id: int):
-    rows = await db.fetch(
-        "SELECT id, name, topic_id FROM sub_topics WHERE topic_id = $1 ORDER BY name ASC",
-        topic_id,
-    )
-    return [SubTopic(id=r["id"], name=r["name"], topic_id=r["topic_id"]) for r in rows]
+@router.get("/tree", response_model=TopicTreeResponse)
+async def get_topic_tree(if_none_match: Optional[str] = Header(default=None)):
+    body, etag = await topic_tree.body()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
+@router.get("/{topic_id}/sub_topics", response_model=List[SubTopic])
+async def list_sub_topics(topic_id: int):
+    for t in await topic_tree.topics():
+        if t["id"] == topic_id:
+            if FAST_JSON_RESPONSES:
+                return FastJSONResponse([{"id": s["id"], "name": s["name"], "topic_id": s["topic_id"]} for s in t["sub_topics"]])
+            return [SubTopic(id=s["id"], name=s["name"], topic_id=s["topic_id"]) for s in t["sub_topics"]]
+    return []
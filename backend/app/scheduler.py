@@ -0,0 +1,43 @@
+# SM-2 spaced-repetition scheduling, evaluated in SQL so POST /answers updates a card in the
+# same statement that records the answer.
+#
+# Answers are binary, so a correct answer is graded as SM-2 quality 4 (ease unchanged) and
+# an incorrect one as quality 1 (ease -0.54, repetitions reset, due again tomorrow).
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+LAPSE_EASE_PENALTY = 0.54
+FIRST_INTERVAL_DAYS = 1.0
+SECOND_INTERVAL_DAYS = 6.0
+
+_NEXT_INTERVAL = f"""
+    CASE
+        WHEN NOT EXCLUDED.last_correct OR r.repetitions = 0 THEN {FIRST_INTERVAL_DAYS}
+        WHEN r.repetitions = 1 THEN {SECOND_INTERVAL_DAYS}
+        ELSE r.interval_days * r.ease
+    END
+"""
+
+# Upsert of the card for each row of an `answer` CTE with (user_id, question_id, is_correct)
+# columns, meant to sit next to that CTE in the answer-recording statement. The outcome
+# reaches the conflict branch through EXCLUDED.last_correct.
+REVIEW_UPSERT_SQL = f"""
+    INSERT INTO review_state AS r (user_id, question_id, repetitions, interval_days, ease, lapses, last_correct, due_at, last_reviewed_at)
+    SELECT
+        a.user_id, a.question_id,
+        CASE WHEN a.is_correct THEN 1 ELSE 0 END,
+        {FIRST_INTERVAL_DAYS},
+        CASE WHEN a.is_correct THEN {INITIAL_EASE} ELSE {INITIAL_EASE - LAPSE_EASE_PENALTY} END,
+        CASE WHEN a.is_correct THEN 0 ELSE 1 END,
+        a.is_correct,
+        NOW() + {FIRST_INTERVAL_DAYS} * INTERVAL '1 day',
+        NOW()
+    FROM answer a
+    ON CONFLICT (user_id, question_id) DO UPDATE SET
+        repetitions = CASE WHEN EXCLUDED.last_correct THEN r.repetitions + 1 ELSE 0 END,
+        interval_days = {_NEXT_INTERVAL},
+        ease = CASE WHEN EXCLUDED.last_correct THEN r.ease ELSE GREATEST({MIN_EASE}, r.ease - {LAPSE_EASE_PENALTY}) END,
+        lapses = r.lapses + CASE WHEN EXCLUDED.last_correct THEN 0 ELSE 1 END,
+        last_correct = EXCLUDED.last_correct,
+        due_at = NOW() + {_NEXT_INTERVAL} * INTERVAL '1 day',
+        last_reviewed_at = NOW()
+"""
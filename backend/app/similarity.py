@@ -0,0 +1,72 @@
+import hashlib
+import random
+import re
+from typing import Any, Dict, List, Set
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    # Word n-grams over a lowercased, punctuation-free form of the text
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def dedupe_items(items: List[Dict[str, Any]], threshold: float) -> List[Dict[str, Any]]:
+    # Keeps the first of any group of MCQs whose question texts are near-identical
+    kept: List[Dict[str, Any]] = []
+    kept_shingles: List[Set[str]] = []
+    for item in items:
+        candidate = shingles(str(item.get("question_text") or ""))
+        if any(jaccard(candidate, existing) >= threshold for existing in kept_shingles):
+            continue
+        kept.append(item)
+        kept_shingles.append(candidate)
+    return kept
+
+
+# MinHash over shingles, banded for locality-sensitive lookup: two questions whose
+# shingle sets have Jaccard similarity s share at least one band hash with probability
+# 1 - (1 - s**ROWS_PER_BAND) ** BANDS (~0.89 at s=0.6, ~1.0 at s=0.8)
+BANDS = 16
+ROWS_PER_BAND = 4
+NUM_PERM = BANDS * ROWS_PER_BAND
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash_signature(shingle_set: Set[str]) -> List[int]:
+    # Values stay below 2**61 so they fit Postgres BIGINT
+    if not shingle_set:
+        return [_MERSENNE_PRIME] * NUM_PERM
+    hashed = [_hash64(s) for s in shingle_set]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashed) for a, b in _PERMUTATIONS]
+
+
+def lsh_band_hashes(signature: List[int]) -> List[int]:
+    bands: List[int] = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(",".join(map(str, rows)).encode("ascii"), digest_size=8).digest()
+        bands.append(int.from_bytes(digest, "big", signed=True))
+    return bands
+
+
+def estimated_similarity(a: List[int], b: List[int]) -> float:
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
@@ -35,6 +35,24 @@ CREATE TABLE IF NOT EXISTS choices (
 
 CREATE INDEX IF NOT EXISTS idx_choices_question_id ON choices(question_id);
 
+-- Near-duplicate index: MinHash signature of each question's text, plus one LSH band hash
+-- per band so candidates are looked up per sub-topic instead of scanning the bank
+CREATE TABLE IF NOT EXISTS question_signatures (
+    question_id INTEGER PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+    sub_topic_id INTEGER NOT NULL REFERENCES sub_topics(id) ON DELETE CASCADE,
+    signature BYTEA NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS question_lsh_bands (
+    sub_topic_id INTEGER NOT NULL,
+    band SMALLINT NOT NULL,
+    band_hash BIGINT NOT NULL,
+    question_id INTEGER NOT NULL REFERENCES question_signatures(question_id) ON DELETE CASCADE,
+    PRIMARY KEY (sub_topic_id, band, band_hash, question_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_question_lsh_bands_question_id ON question_lsh_bands(question_id);
+
 CREATE TABLE IF NOT EXISTS user_answers (
     id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL,
@@ -52,3 +70,125 @@ CREATE INDEX IF NOT EXISTS idx_user_answers_answered_at ON user_answers(answered
 CREATE INDEX IF NOT EXISTS idx_user_answers_user_id_answered_at ON user_answers(user_id, answered_at DESC);
 CREATE INDEX IF NOT EXISTS idx_user_answers_user_id_question_id ON user_answers(user_id, question_id);
 
+-- Client-generated answer ids make POST /answers/batch safe to retry
+ALTER TABLE user_answers ADD COLUMN IF NOT EXISTS client_answer_id TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_answers_user_id_client_answer_id
+    ON user_answers(user_id, client_answer_id) WHERE client_answer_id IS NOT NULL;
+
+-- Per-user daily answer rollup maintained by POST /answers; the streak reads at most a
+-- year of these rows instead of aggregating the whole answer history
+CREATE TABLE IF NOT EXISTS user_daily_stats (
+    user_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    answers INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day)
+);
+
+-- One-time backfill from answer history, only while the rollup is still empty
+INSERT INTO user_daily_stats(user_id, day, answers, correct)
+SELECT user_id, answered_at::date, COUNT(*), COUNT(*) FILTER (WHERE is_correct)
+FROM user_answers
+WHERE NOT EXISTS (SELECT 1 FROM user_daily_stats)
+GROUP BY user_id, answered_at::date
+ON CONFLICT (user_id, day) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id INTEGER PRIMARY KEY,
+    streak_goal INTEGER NOT NULL DEFAULT 5 CHECK (streak_goal > 0)
+);
+
+-- Per-user question state for sampling: an answered flag plus a fixed random sort key.
+-- Drawing N unanswered questions is a range probe on the partial indexes from a random pivot.
+CREATE TABLE IF NOT EXISTS user_question_state (
+    user_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    sub_topic_id INTEGER NOT NULL,
+    answered BOOLEAN NOT NULL DEFAULT FALSE,
+    rand_key DOUBLE PRECISION NOT NULL DEFAULT random(),
+    PRIMARY KEY (user_id, question_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_question_state_unanswered
+    ON user_question_state(user_id, rand_key) INCLUDE (question_id) WHERE NOT answered;
+CREATE INDEX IF NOT EXISTS idx_user_question_state_sub_topic_unanswered
+    ON user_question_state(user_id, sub_topic_id, rand_key) INCLUDE (question_id) WHERE NOT answered;
+-- Lets deletes of questions cascade without scanning the table
+CREATE INDEX IF NOT EXISTS idx_user_question_state_question_id ON user_question_state(question_id);
+
+-- One-time seed for the default user (app.default_user_id, set by init_schema), only while
+-- the table is still empty: a row per stored question, answered if user_answers has one
+INSERT INTO user_question_state(user_id, question_id, sub_topic_id, answered)
+SELECT u.user_id, q.id, q.sub_topic_id,
+       EXISTS (SELECT 1 FROM user_answers a WHERE a.user_id = u.user_id AND a.question_id = q.id)
+FROM (SELECT current_setting('app.default_user_id')::int AS user_id) u
+CROSS JOIN questions q
+WHERE NOT EXISTS (SELECT 1 FROM user_question_state)
+ON CONFLICT (user_id, question_id) DO NOTHING;
+
+-- Spaced-repetition cards (SM-2), one per answered (user, question); updated by POST /answers
+CREATE TABLE IF NOT EXISTS review_state (
+    user_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL REFERENCES questions(id) ON DELETE CASCADE,
+    repetitions INTEGER NOT NULL DEFAULT 0,
+    interval_days DOUBLE PRECISION NOT NULL DEFAULT 1,
+    ease DOUBLE PRECISION NOT NULL DEFAULT 2.5,
+    lapses INTEGER NOT NULL DEFAULT 0,
+    -- Outcome of the latest answer; also how the scheduler's upsert sees the new outcome
+    last_correct BOOLEAN NOT NULL DEFAULT FALSE,
+    due_at TIMESTAMPTZ NOT NULL,
+    last_reviewed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, question_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_review_state_user_id_due_at ON review_state(user_id, due_at) INCLUDE (question_id);
+CREATE INDEX IF NOT EXISTS idx_review_state_question_id ON review_state(question_id);
+
+-- One-time seed from answer history: each answered question becomes a card due a day after
+-- its latest answer, with a first repetition credited if that answer was correct
+INSERT INTO review_state(user_id, question_id, repetitions, interval_days, ease, lapses, last_correct, due_at, last_reviewed_at)
+SELECT DISTINCT ON (user_id, question_id)
+       user_id, question_id, CASE WHEN is_correct THEN 1 ELSE 0 END, 1, 2.5, 0, is_correct,
+       answered_at + INTERVAL '1 day', answered_at
+FROM user_answers
+WHERE NOT EXISTS (SELECT 1 FROM review_state)
+ORDER BY user_id, question_id, answered_at DESC
+ON CONFLICT (user_id, question_id) DO NOTHING;
+
+
+-- Background generation jobs: queued by POST /generate/* (background=true), drained by in-process workers
+CREATE TABLE IF NOT EXISTS generation_jobs (
+    id SERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    stage TEXT NOT NULL DEFAULT 'queued',
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    source_blob BYTEA,
+    result JSONB,
+    error TEXT,
+    timings JSONB NOT NULL DEFAULT '{}'::jsonb,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ
+);
+
+-- Claiming and crash recovery only ever look at unfinished jobs
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_pending ON generation_jobs(status, id) WHERE status IN ('queued', 'running');
+
+-- Content-addressed generation cache: MCQ JSON per (sources, count, prompt, models) and
+-- Files API handles per (api key, source); TTL-expired and LRU-evicted by the app
+CREATE TABLE IF NOT EXISTS generation_cache (
+    cache_key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_hit_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_generation_cache_expires_at ON generation_cache(expires_at);
+CREATE INDEX IF NOT EXISTS idx_generation_cache_last_hit_at ON generation_cache(last_hit_at DESC);
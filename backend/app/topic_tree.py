@@ -0,0 +1,129 @@
+import asyncio
+import secrets
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import load_settings
+from .db import db
+from .fast_json import dumps
+
+
+class TopicTreeSnapshot:
+    """In-memory topic -> sub-topic tree with question and unanswered counts.
+
+    Built with one query and then served without touching the database. Generation marks
+    it stale (new topics, sub-topics and questions) and it is rebuilt on the next read;
+    answers patch the unanswered counts in place. Every change bumps the version behind the
+    ETag. The TTL bounds how long a snapshot can miss changes made by other processes.
+    """
+
+    def __init__(self, user_id: int, ttl_seconds: float) -> None:
+        self._user_id = user_id
+        self._ttl_seconds = ttl_seconds
+        self._lock = asyncio.Lock()
+        self._topics: List[Dict[str, Any]] = []
+        self._sub_topics: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        self._built_at = 0.0
+        self._stale = True
+        self._token = ""
+        self._version = 0
+        self._body: Optional[bytes] = None
+
+    @property
+    def etag(self) -> str:
+        return f'"{self._token}-{self._version}"'
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+    def record_answered(self, sub_topic_ids: Iterable[int]) -> None:
+        # Questions answered for the first time leave their sub-topic's unanswered count
+        changed = False
+        for sub_topic_id in sub_topic_ids:
+            nodes = self._sub_topics.get(sub_topic_id)
+            if nodes is None:
+                continue
+            topic, sub_topic = nodes
+            if sub_topic["unanswered_count"] > 0:
+                sub_topic["unanswered_count"] -= 1
+                topic["unanswered_count"] -= 1
+                changed = True
+        if changed:
+            self._version += 1
+            self._body = None
+
+    async def topics(self) -> List[Dict[str, Any]]:
+        await self._ensure_fresh()
+        return self._topics
+
+    async def body(self) -> Tuple[bytes, str]:
+        # Serialized once per version; returns (JSON body, ETag)
+        await self._ensure_fresh()
+        if self._body is None:
+            self._body = dumps({"version": self.etag.strip('"'), "topics": self._topics})
+        return self._body, self.etag
+
+    async def _ensure_fresh(self) -> None:
+        if not self._stale and time.monotonic() - self._built_at < self._ttl_seconds:
+            return
+        async with self._lock:
+            if not self._stale and time.monotonic() - self._built_at < self._ttl_seconds:
+                return
+            # Clear the flag first so an invalidation during the query triggers another build
+            self._stale = False
+            await self._rebuild()
+
+    async def _rebuild(self) -> None:
+        rows = await db.reader(self._user_id).fetch(
+            """
+            SELECT t.id AS topic_id, t.name AS topic_name, s.id AS sub_topic_id, s.name AS sub_topic_name,
+                   COALESCE(qc.questions, 0)::int AS questions, COALESCE(uc.unanswered, 0)::int AS unanswered
+            FROM topics t
+            LEFT JOIN sub_topics s ON s.topic_id = t.id
+            LEFT JOIN (
+                SELECT sub_topic_id, COUNT(*) AS questions FROM questions GROUP BY sub_topic_id
+            ) qc ON qc.sub_topic_id = s.id
+            LEFT JOIN (
+                SELECT sub_topic_id, COUNT(*) AS unanswered
+                FROM user_question_state
+                WHERE user_id = $1 AND NOT answered
+                GROUP BY sub_topic_id
+            ) uc ON uc.sub_topic_id = s.id
+            ORDER BY t.name ASC, s.name ASC
+            """,
+            self._user_id,
+            name="topic_tree",
+        )
+        topics: List[Dict[str, Any]] = []
+        by_topic: Dict[int, Dict[str, Any]] = {}
+        sub_topics: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        for r in rows:
+            topic = by_topic.get(r["topic_id"])
+            if topic is None:
+                topic = {"id": r["topic_id"], "name": r["topic_name"], "question_count": 0, "unanswered_count": 0, "sub_topics": []}
+                by_topic[r["topic_id"]] = topic
+                topics.append(topic)
+            if r["sub_topic_id"] is None:
+                continue
+            sub_topic = {
+                "id": r["sub_topic_id"],
+                "name": r["sub_topic_name"],
+                "topic_id": r["topic_id"],
+                "question_count": r["questions"],
+                "unanswered_count": r["unanswered"],
+            }
+            topic["sub_topics"].append(sub_topic)
+            topic["question_count"] += r["questions"]
+            topic["unanswered_count"] += r["unanswered"]
+            sub_topics[r["sub_topic_id"]] = (topic, sub_topic)
+
+        self._topics = topics
+        self._sub_topics = sub_topics
+        self._built_at = time.monotonic()
+        self._token = secrets.token_hex(4)
+        self._version = 0
+        self._body = None
+
+
+_settings = load_settings()
+topic_tree = TopicTreeSnapshot(user_id=_settings["DEFAULT_USER_ID"], ttl_seconds=_settings["TOPIC_TREE_TTL_SECONDS"])
@@ -0,0 +1,108 @@
+"""POST /answers latency: legacy three-round-trip flow vs. the single-statement submit.
+
+The legacy flow (choice lookup, correct-choice lookup, insert; kept here verbatim) writes
+only the answer row. The current `submit_answer` also maintains the streak rollup, review
+card and sampling state, and is measured with a cold answer-key cache (key read in the same
+statement) and a warm one. Runs against DATABASE_URL (use a scratch database); seeds the
+"Bench Sampling" topic if needed.
+
+    DATABASE_URL=postgresql://... python -m bench.answer_latency --answers 2000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from app.answer_keys import answer_keys
+from app.db import db
+from app.models import AnswerRequest
+from app.routers.questions import DEFAULT_USER_ID, submit_answer
+from bench.sampling import seed_questions
+
+
+async def legacy_submit(user_id: int, question_id: int, choice_id: int) -> None:
+    choice = await db.fetchrow("SELECT id, question_id, is_correct FROM choices WHERE id = $1", choice_id)
+    if not choice or choice["question_id"] != question_id:
+        raise RuntimeError("invalid_choice")
+    await db.fetchval("SELECT id FROM choices WHERE question_id = $1 AND is_correct = TRUE", question_id)
+    await db.execute(
+        """
+        INSERT INTO user_answers (user_id, question_id, choice_id, is_correct)
+        VALUES ($1, $2, $3, $4)
+        """,
+        user_id,
+        question_id,
+        choice_id,
+        bool(choice["is_correct"]),
+    )
+
+
+def describe(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "mean_ms": round(statistics.mean(samples), 3),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--answers", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=5000)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    await db.connect()
+    await db.init_schema(Path(__file__).resolve().parent.parent / "app" / "sql" / "schema.sql")
+    sub_topic_ids = await seed_questions(args.questions)
+    rows = await db.fetch(
+        """
+        SELECT c.question_id, c.id AS choice_id
+        FROM questions q JOIN choices c ON c.question_id = q.id
+        WHERE q.sub_topic_id = ANY($1)
+        """,
+        sub_topic_ids,
+    )
+    picks = [random.choice(rows) for _ in range(args.answers)]
+
+    legacy: List[float] = []
+    for r in picks:
+        t0 = time.perf_counter()
+        await legacy_submit(DEFAULT_USER_ID, r["question_id"], r["choice_id"])
+        legacy.append((time.perf_counter() - t0) * 1000)
+
+    cold: List[float] = []
+    warm: List[float] = []
+    for r in picks:
+        answer_keys.discard(r["question_id"])
+        request = AnswerRequest(question_id=r["question_id"], choice_id=r["choice_id"])
+        t0 = time.perf_counter()
+        await submit_answer(request)
+        cold.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        await submit_answer(request)
+        warm.append((time.perf_counter() - t0) * 1000)
+
+    await db.disconnect()
+    report = {
+        "answers": args.answers,
+        # Round trips matter more than local latency: each one costs a network RTT to Neon
+        "legacy": {"roundtrips": 3, "writes": 1, **describe(legacy)},
+        "single_statement_key_miss": {"roundtrips": 1, "writes": 4, **describe(cold)},
+        "single_statement_key_hit": {"roundtrips": 1, "writes": 4, **describe(warm)},
+        "answer_key_cache": answer_keys.stats(),
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,234 @@
+"""Seeded synthetic dataset for load tests: topics, sub-topics, questions, choices, answers.
+
+Creates the schema from app/sql/schema.sql, then bulk-loads "Bench Dataset N" topics with
+COPY. The same --seed and scale always produce the same rows (ids depend on what the
+database already holds, timestamps on the current time). Answers are spread over --days
+for --users users starting at DEFAULT_USER_ID, so a backend pointed at the same database
+serves the dataset. Derived state (sampling state, daily rollups, review cards) is rebuilt to match the answers.
+Use a scratch database: --reset removes a previous dataset first.
+
+    DATABASE_URL=postgresql://... python -m bench.dataset --questions 50000 --answers 2000000 --seed 42
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from app.config import load_settings
+from app.db import db
+from app.question_index import question_index
+from app.question_state import unanswered_questions
+
+TOPIC_PREFIX = "Bench Dataset"
+COPY_BATCH = 200_000
+
+WORDS = (
+    "cache index latency replica quorum shard vector kernel thread socket buffer packet "
+    "schema tensor gradient entropy protein enzyme neuron synapse glacier monsoon tariff "
+    "inflation treaty dynasty sonnet meter cadence harmony prism photon orbit nebula"
+).split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+async def reserve_ids(table: str, count: int) -> List[int]:
+    rows = await db.fetch(
+        f"SELECT nextval(pg_get_serial_sequence('{table}', 'id'))::int AS id FROM generate_series(1, $1)",
+        count,
+    )
+    return [r["id"] for r in rows]
+
+
+async def copy_batches(table: str, columns: List[str], records: Iterator[Tuple]) -> int:
+    total = 0
+    batch: List[Tuple] = []
+    async with db.connection() as con:
+        for record in records:
+            batch.append(record)
+            if len(batch) >= COPY_BATCH:
+                await con.copy_records_to_table(table, records=batch, columns=columns)
+                total += len(batch)
+                batch = []
+        if batch:
+            await con.copy_records_to_table(table, records=batch, columns=columns)
+            total += len(batch)
+    return total
+
+
+async def reset_dataset(user_ids: List[int]) -> None:
+    await db.execute("DELETE FROM user_answers WHERE user_id = ANY($1)", user_ids)
+    await db.execute("DELETE FROM user_daily_stats WHERE user_id = ANY($1)", user_ids)
+    # Deleting topics cascades to choices, and each deleted choice is checked against
+    # user_answers.choice_id, which has no index; a temporary one keeps that from scanning
+    # the (dead) answer rows once per choice
+    async with db.transaction() as con:
+        await con.execute("CREATE INDEX bench_user_answers_choice_id ON user_answers(choice_id)")
+        await con.execute("DELETE FROM topics WHERE name LIKE $1", f"{TOPIC_PREFIX} %")
+        await con.execute("DROP INDEX bench_user_answers_choice_id")
+
+
+async def generate(args: argparse.Namespace, user_ids: List[int]) -> Dict[str, int]:
+    rng = random.Random(args.seed)
+
+    topic_rows = await db.fetch(
+        """
+        INSERT INTO topics(name) SELECT unnest($1::text[])
+        ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id, name
+        """,
+        [f"{TOPIC_PREFIX} {t + 1:03d}" for t in range(args.topics)],
+    )
+    topic_ids = [r["id"] for r in sorted(topic_rows, key=lambda r: r["name"])]
+    pairs = [(tid, f"Sub-topic {s + 1:03d}") for tid in topic_ids for s in range(args.sub_topics)]
+    sub_topic_rows = await db.fetch(
+        """
+        INSERT INTO sub_topics(topic_id, name) SELECT * FROM unnest($1::int[], $2::text[])
+        ON CONFLICT (topic_id, name) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id, topic_id, name
+        """,
+        [p[0] for p in pairs],
+        [p[1] for p in pairs],
+    )
+    sub_topic_ids = [r["id"] for r in sorted(sub_topic_rows, key=lambda r: (r["topic_id"], r["name"]))]
+
+    question_ids = await reserve_ids("questions", args.questions)
+    question_sub_topics = [rng.choice(sub_topic_ids) for _ in question_ids]
+    await copy_batches(
+        "questions",
+        ["id", "sub_topic_id", "question_text", "explanation", "image_url"],
+        (
+            (qid, stid, f"Q{n}: which statement about {sentence(rng, 10)}?", sentence(rng, 18), None)
+            for n, (qid, stid) in enumerate(zip(question_ids, question_sub_topics))
+        ),
+    )
+
+    choice_ids = await reserve_ids("choices", args.questions * args.choices)
+    correct_index = [rng.randrange(args.choices) for _ in question_ids]
+    await copy_batches(
+        "choices",
+        ["id", "question_id", "choice_text", "is_correct"],
+        (
+            (choice_ids[q * args.choices + k], qid, f"{chr(65 + k)}. {sentence(rng, 5)}", k == correct_index[q])
+            for q, qid in enumerate(question_ids)
+            for k in range(args.choices)
+        ),
+    )
+
+    now = datetime.now(timezone.utc)
+    span_seconds = args.days * 86400
+
+    # Each user's history covers its own subset of the questions (repeats are re-answers), so
+    # sampling still finds unanswered questions during a load run
+    answered = [
+        rng.sample(range(len(question_ids)), max(1, int(len(question_ids) * args.answered_fraction)))
+        for _ in user_ids
+    ]
+
+    def answers() -> Iterator[Tuple]:
+        for _ in range(args.answers):
+            u = rng.randrange(len(user_ids))
+            user_id = user_ids[u]
+            q = rng.choice(answered[u])
+            if rng.random() < args.accuracy:
+                k = correct_index[q]
+            else:
+                k = rng.randrange(args.choices)
+            answered_at = now - timedelta(seconds=rng.random() * span_seconds)
+            yield (user_id, question_ids[q], choice_ids[q * args.choices + k], k == correct_index[q], answered_at)
+
+    answer_count = await copy_batches(
+        "user_answers", ["user_id", "question_id", "choice_id", "is_correct", "answered_at"], answers()
+    )
+    return {
+        "topics": len(topic_ids),
+        "sub_topics": len(sub_topic_ids),
+        "questions": len(question_ids),
+        "choices": len(choice_ids),
+        "user_answers": answer_count,
+    }
+
+
+async def rebuild_derived_state(user_ids: List[int], signatures: bool) -> None:
+    # The same state the answer endpoints maintain incrementally, recomputed in bulk
+    for user_id in user_ids:
+        await unanswered_questions.backfill(user_id)
+    await db.execute(
+        """
+        INSERT INTO user_daily_stats AS d (user_id, day, answers, correct)
+        SELECT user_id, answered_at::date, COUNT(*), COUNT(*) FILTER (WHERE is_correct)
+        FROM user_answers
+        WHERE user_id = ANY($1)
+        GROUP BY user_id, answered_at::date
+        ON CONFLICT (user_id, day) DO UPDATE SET answers = EXCLUDED.answers, correct = EXCLUDED.correct
+        """,
+        user_ids,
+    )
+    # Review cards as schema.sql seeds them on upgrade: due a day after the latest answer
+    await db.execute(
+        """
+        INSERT INTO review_state(user_id, question_id, repetitions, interval_days, ease, lapses, last_correct, due_at, last_reviewed_at)
+        SELECT DISTINCT ON (user_id, question_id)
+               user_id, question_id, CASE WHEN is_correct THEN 1 ELSE 0 END, 1, 2.5, 0, is_correct,
+               answered_at + INTERVAL '1 day', answered_at
+        FROM user_answers
+        WHERE user_id = ANY($1)
+        ORDER BY user_id, question_id, answered_at DESC
+        ON CONFLICT (user_id, question_id) DO NOTHING
+        """,
+        user_ids,
+    )
+    if signatures and question_index.enabled:
+        await question_index.backfill()
+    await db.execute("ANALYZE")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--topics", type=int, default=10)
+    parser.add_argument("--sub-topics", type=int, default=10, help="per topic")
+    parser.add_argument("--questions", type=int, default=50_000)
+    parser.add_argument("--choices", type=int, default=4, help="per question")
+    parser.add_argument("--answers", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--days", type=int, default=120, help="answer history spread")
+    parser.add_argument("--accuracy", type=float, default=0.7)
+    parser.add_argument("--answered-fraction", type=float, default=0.5, help="share of questions each user has answered")
+    parser.add_argument("--skip-signatures", action="store_true", help="leave the near-duplicate index to lazy per-sub-topic indexing")
+    parser.add_argument("--reset", action="store_true", help="delete a previous dataset (and all answers of its users) first")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    first_user = load_settings()["DEFAULT_USER_ID"]
+    user_ids = list(range(first_user, first_user + args.users))
+
+    await db.connect()
+    await db.init_schema(Path(__file__).resolve().parent.parent / "app" / "sql" / "schema.sql")
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    if args.reset:
+        await reset_dataset(user_ids)
+        timings["reset_s"] = round(time.perf_counter() - t0, 1)
+    t1 = time.perf_counter()
+    counts = await generate(args, user_ids)
+    timings["load_s"] = round(time.perf_counter() - t1, 1)
+    t2 = time.perf_counter()
+    await rebuild_derived_state(user_ids, signatures=not args.skip_signatures)
+    timings["derived_state_s"] = round(time.perf_counter() - t2, 1)
+    await db.disconnect()
+
+    report = {"seed": args.seed, "user_ids": user_ids, "rows": counts, "timings": timings}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""Persist latency with the near-duplicate index as one sub-topic's question bank grows.
+
+Seeds synthetic questions (with signatures and LSH bands) into a dedicated "Bench Dedupe"
+sub-topic up to each target size, then times `_persist_generated_questions` for a batch
+of fresh MCQs plus a batch of repeats. Use a scratch database.
+
+    DATABASE_URL=postgresql://... python -m bench.dedupe_lookup --sizes 1000 10000 100000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import List
+
+from app.db import db
+from app.question_index import question_index, question_signature
+from app.routers.generate import _persist_generated_questions
+
+
+TOPIC = "Bench"
+SUB_TOPIC = "Bench Dedupe"
+SEED_BATCH = 2000
+
+_rng = random.Random(7)
+_VOCAB = [f"w{i}" for i in range(5000)]
+
+
+def random_question() -> str:
+    return "Which statement about " + " ".join(_rng.choice(_VOCAB) for _ in range(14)) + " is correct?"
+
+
+async def seed(sub_topic_id: int, count: int) -> None:
+    for start in range(0, count, SEED_BATCH):
+        texts = [random_question() for _ in range(min(SEED_BATCH, count - start))]
+        signatures = await asyncio.to_thread(lambda: [question_signature(t) for t in texts])
+        async with db.transaction() as con:
+            ids = await con.fetch(
+                """
+                INSERT INTO questions(sub_topic_id, question_text)
+                SELECT $1, unnest($2::text[])
+                RETURNING id, question_text
+                """,
+                sub_topic_id,
+                texts,
+            )
+            by_text = {r["question_text"]: r["id"] for r in ids}
+            await question_index.add(con, [by_text[t] for t in texts], [sub_topic_id] * len(texts), signatures)
+
+
+def batch(texts: List[str]) -> str:
+    return json.dumps(
+        [{"question_text": t, "choices": ["A", "B", "C", "D"], "correct_index": 0, "sub_topic": SUB_TOPIC} for t in texts]
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    await db.connect()
+    await db.init_schema(Path(__file__).resolve().parent.parent / "app" / "sql" / "schema.sql")
+    await _persist_generated_questions(TOPIC, SUB_TOPIC, batch([random_question()]), 1)
+    sub_topic_id = await db.fetchval(
+        "SELECT s.id FROM sub_topics s JOIN topics t ON t.id = s.topic_id WHERE t.name = $1 AND s.name = $2",
+        TOPIC,
+        SUB_TOPIC,
+    )
+
+    results = []
+    for size in sorted(args.sizes):
+        existing = await db.fetchval("SELECT COUNT(*) FROM questions WHERE sub_topic_id = $1", sub_topic_id)
+        if existing < size:
+            await seed(sub_topic_id, size - existing)
+        await db.execute("ANALYZE question_lsh_bands")
+
+        fresh: List[float] = []
+        repeats: List[float] = []
+        skipped = 0
+        for _ in range(args.repeat):
+            payload = batch([random_question() for _ in range(args.questions)])
+            t0 = time.perf_counter()
+            await _persist_generated_questions(TOPIC, SUB_TOPIC, payload, args.questions)
+            fresh.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            result = await _persist_generated_questions(TOPIC, SUB_TOPIC, payload, args.questions)
+            repeats.append((time.perf_counter() - t0) * 1000)
+            skipped += result["skipped_duplicates"]
+
+        results.append(
+            {
+                "bank_size": size,
+                "fresh_mean_ms": round(statistics.mean(fresh), 1),
+                "repeat_mean_ms": round(statistics.mean(repeats), 1),
+                "repeat_skipped": f"{skipped}/{args.questions * args.repeat}",
+            }
+        )
+
+    await db.disconnect()
+    print(json.dumps({"questions": args.questions, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
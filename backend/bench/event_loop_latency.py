@@ -0,0 +1,111 @@
+"""Quiz endpoint latency while generations are in flight.
+
+Measures `/questions/random`, `/answers` and `/streak/` latency twice against a running
+backend: once idle, then while N `/generate/from-text` calls run concurrently. If the
+generation path blocked the event loop, the second p99 would jump to the LLM latency.
+
+    python -m bench.event_loop_latency --base-url http://localhost:8000 --generations 4
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+
+
+SAMPLE_TEXT = (
+    "Spaced repetition schedules reviews at increasing intervals. Each successful recall "
+    "lengthens the interval, while a failure resets it. The testing effect shows that "
+    "retrieving information strengthens memory more than re-reading it."
+)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        name: {
+            "count": len(values),
+            "p50_ms": round(statistics.median(values), 2) if values else 0.0,
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(max(values), 2) if values else 0.0,
+        }
+        for name, values in samples.items()
+    }
+
+
+async def probe_quiz_endpoints(client: httpx.AsyncClient, duration_s: float, interval_s: float) -> Dict[str, List[float]]:
+    samples: Dict[str, List[float]] = {"questions_random": [], "answers": [], "streak": []}
+    deadline = time.perf_counter() + duration_s
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        resp = await client.get("/questions/random", params={"limit": 5})
+        samples["questions_random"].append((time.perf_counter() - t0) * 1000)
+        questions = resp.json() if resp.status_code == 200 else []
+
+        if questions and questions[0].get("choices"):
+            q = questions[0]
+            t0 = time.perf_counter()
+            await client.post("/answers", json={"question_id": q["id"], "choice_id": q["choices"][0]["id"]})
+            samples["answers"].append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        await client.get("/streak/")
+        samples["streak"].append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(interval_s)
+    return samples
+
+
+async def run_generation(client: httpx.AsyncClient, size: str) -> float:
+    t0 = time.perf_counter()
+    await client.post(
+        "/generate/from-text",
+        data={"text": SAMPLE_TEXT, "size": size, "topic": "Bench", "sub_topic": "Event loop"},
+        timeout=300.0,
+    )
+    return (time.perf_counter() - t0) * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--generations", type=int, default=4, help="concurrent generation requests")
+    parser.add_argument("--size", default="tiny", choices=["tiny", "small", "large"])
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per probe phase")
+    parser.add_argument("--interval", type=float, default=0.1, help="pause between probe rounds")
+    parser.add_argument("--output", default="", help="optional path for the JSON report")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60.0) as client:
+        idle = await probe_quiz_endpoints(client, args.duration, args.interval)
+
+        generations = [asyncio.create_task(run_generation(client, args.size)) for _ in range(args.generations)]
+        loaded = await probe_quiz_endpoints(client, args.duration, args.interval)
+        generation_ms = await asyncio.gather(*generations, return_exceptions=True)
+
+    report = {
+        "generations": args.generations,
+        "idle": summarize(idle),
+        "under_generation": summarize(loaded),
+        "generation_ms": [round(g, 1) for g in generation_ms if isinstance(g, float)],
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
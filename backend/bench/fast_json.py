@@ -0,0 +1,156 @@
+"""Per-request CPU of question responses: response_model serialization vs. FAST_JSON_RESPONSES.
+
+Fills the question bundle cache with synthetic questions (no database needed) and calls
+GET /questions?ids= in-process through the real app, once per mode. Before timing, checks
+the contract, and exits with an AssertionError if the fast mode has drifted: both modes
+return byte-identical bodies with the same status and content type, and the body validates
+as List[Question] and round-trips to the cached models. The topic endpoints get the same
+byte comparison against a synthetic topic snapshot.
+
+    python -m bench.fast_json --questions 50 --requests 2000
+"""
+
+import os
+
+os.environ["FAST_JSON_RESPONSES"] = "true"
+# Required by app settings; this benchmark never connects
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/unused")
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+from pydantic import TypeAdapter
+
+from app.main import app
+from app.models import Choice, Question
+from app import question_cache
+from app.question_cache import question_bundles
+from app.routers import topics as topics_router
+from app.topic_tree import topic_tree
+
+QUESTIONS = TypeAdapter(List[Question])
+
+
+def synthetic_questions(count: int) -> List[Question]:
+    questions = []
+    for qid in range(1, count + 1):
+        choices = [
+            Choice(id=qid * 10 + i, question_id=qid, choice_text=f"Option {i} for question {qid} — naïve “quote”", is_correct=i == 0)
+            for i in range(4)
+        ]
+        questions.append(
+            Question(
+                id=qid,
+                sub_topic_id=1 + qid % 20,
+                question_text=f"Question {qid}: which statement about topic {qid % 7} is correct? é中",
+                explanation=None if qid % 3 == 0 else f"Because option 0 is right ({qid}).",
+                image_url=None if qid % 5 else f"https://example.com/{qid}.png",
+                choices=choices,
+            )
+        )
+    return questions
+
+
+def seed_topic_tree(count: int) -> None:
+    # Serve a synthetic snapshot without the database: fresh, and never due for a rebuild
+    topic_tree._topics = [
+        {
+            "id": tid,
+            "name": f"Topic {tid} — “é中”",
+            "sub_topics": [{"id": tid * 10 + i, "name": f"Sub-topic {i}", "topic_id": tid} for i in range(3)],
+        }
+        for tid in range(1, count + 1)
+    ]
+    topic_tree._stale = False
+    topic_tree._ttl_seconds = float("inf")
+
+
+def set_fast(enabled: bool) -> None:
+    question_cache.FAST_JSON_RESPONSES = enabled
+    topics_router.FAST_JSON_RESPONSES = enabled
+
+
+async def fetch(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    response = await client.get(url)
+    response.raise_for_status()
+    return response
+
+
+async def check_contract(client: httpx.AsyncClient, questions: List[Question], url: str) -> None:
+    set_fast(False)
+    reference = await fetch(client, url)
+    set_fast(True)
+    fast = await fetch(client, url)
+    assert reference.status_code == fast.status_code
+    assert reference.headers["content-type"] == fast.headers["content-type"], (reference.headers, fast.headers)
+    assert reference.content == fast.content, f"{url}: FAST_JSON_RESPONSES body differs from response_model"
+    if questions:
+        assert QUESTIONS.validate_json(fast.content) == questions, "fast document does not round-trip"
+
+
+async def time_calls(client: httpx.AsyncClient, url: str, requests: int) -> Dict[str, float]:
+    for _ in range(50):
+        await fetch(client, url)
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        await fetch(client, url)
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - wall0
+    return {
+        "cpu_us_per_request": round(cpu / requests * 1e6, 1),
+        "wall_us_per_request": round(wall / requests * 1e6, 1),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    questions = synthetic_questions(args.questions)
+    question_bundles.put_many(questions)
+    url = "/questions?ids=" + ",".join(str(q.id) for q in questions)
+
+    # No lifespan: every bundle is cached, so the endpoint never reaches the database
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await check_contract(client, questions[:1], "/questions?ids=1")
+        await check_contract(client, questions, url)
+        seed_topic_tree(5)
+        await check_contract(client, [], "/topics/")
+        await check_contract(client, [], "/topics/2/sub_topics")
+        # In-process client, middleware and routing cost the same in both modes; /health
+        # measures that floor so the difference can be attributed to the response path
+        floor = await time_calls(client, "/health", args.requests)
+        set_fast(False)
+        model = await time_calls(client, url, args.requests)
+        set_fast(True)
+        fast = await time_calls(client, url, args.requests)
+
+    report = {
+        "questions": args.questions,
+        "requests": args.requests,
+        "contract": "ok",
+        "floor_health": floor,
+        "response_model": model,
+        "fast_json": fast,
+        "cpu_speedup": round(model["cpu_us_per_request"] / fast["cpu_us_per_request"], 2),
+        "cpu_speedup_over_floor": round(
+            (model["cpu_us_per_request"] - floor["cpu_us_per_request"])
+            / max(1.0, fast["cpu_us_per_request"] - floor["cpu_us_per_request"]),
+            2,
+        ),
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
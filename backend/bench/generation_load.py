@@ -0,0 +1,169 @@
+"""Generation pipeline under load, offline: replay provider, real persistence and dedupe.
+
+Runs the app in-process with GENAI_PROVIDER=replay and fires --requests generations at
+--concurrency: `POST /generate/from-text` and, for --stream-share of them, `POST
+/generate/stream` (time to first persisted question and to `done`). Every request sends
+distinct text, so the generation cache never short-circuits. Model latency and injected
+503s / corrupt items come from the flags below. Writes questions under the "Bench
+Generation" topic (scratch `DATABASE_URL`).
+
+    python -m bench.generation_load --requests 200 --concurrency 32 --latency-ms 800 --unavailable-rate 0.1
+"""
+
+import argparse
+import os
+import sys
+
+
+def _configure_provider(argv) -> argparse.Namespace:
+    # Provider settings are read at import time, so parse before importing the app
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--size", choices=["tiny", "small", "large"], default="small")
+    parser.add_argument("--stream-share", type=float, default=0.5, help="fraction sent to /generate/stream")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--unavailable-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--genai-concurrency", type=int, default=0, help="GENAI_MAX_CONCURRENCY (default: --concurrency)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args(argv)
+    os.environ.update(
+        {
+            "GENAI_PROVIDER": "replay",
+            "GENAI_REPLAY_SEED": str(args.seed),
+            "GENAI_REPLAY_LATENCY_MS": str(args.latency_ms),
+            "GENAI_REPLAY_LATENCY_SIGMA": str(args.latency_sigma),
+            "GENAI_REPLAY_TOKEN_MS": str(args.token_ms),
+            "GENAI_REPLAY_UNAVAILABLE_RATE": str(args.unavailable_rate),
+            "GENAI_REPLAY_MALFORMED_RATE": str(args.malformed_rate),
+            "GENAI_MAX_CONCURRENCY": str(args.genai_concurrency or args.concurrency),
+            # Background workers would compete for the database with the measured requests
+            "GENERATION_WORKERS": "0",
+        }
+    )
+    return args
+
+
+ARGS = _configure_provider(sys.argv[1:]) if __name__ == "__main__" else None
+
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+
+from app.genai_provider import ReplayProvider, genai_provider
+from app.main import app
+from bench.load import EndpointStats, git_revision
+
+
+class StreamResult:
+    def __init__(self) -> None:
+        self.first_question_ms: Optional[float] = None
+        self.questions = 0
+        self.final: Optional[str] = None
+
+
+async def consume_stream(client: httpx.AsyncClient, data: Dict[str, str], t0: float) -> StreamResult:
+    result = StreamResult()
+    async with client.stream("POST", "/generate/stream", data=data) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: ") :]
+            elif line.startswith("data: ") and event:
+                if event == "question":
+                    result.questions += 1
+                    if result.first_question_ms is None:
+                        result.first_question_ms = (time.perf_counter() - t0) * 1000
+                elif event in ("done", "error"):
+                    result.final = event
+    return result
+
+
+def source_text(rng: random.Random, index: int) -> str:
+    words = "cell membrane transport diffusion osmosis gradient protein channel energy pump".split()
+    return f"Source {index}. " + " ".join(rng.choice(words) for _ in range(200))
+
+
+async def main() -> None:
+    args = ARGS
+    assert isinstance(genai_provider, ReplayProvider)
+    rng = random.Random(args.seed)
+    endpoints = {"from_text": EndpointStats(), "stream": EndpointStats()}
+    stream_first_ms = []
+    created = {"from_text": 0, "stream": 0}
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one(client: httpx.AsyncClient, index: int) -> None:
+        data = {"text": source_text(rng, index), "size": args.size, "topic": "Bench Generation", "sub_topic": "Load"}
+        streaming = rng.random() < args.stream_share
+        async with slots:
+            t0 = time.perf_counter()
+            if streaming:
+                try:
+                    result = await consume_stream(client, data, t0)
+                except httpx.HTTPError:
+                    endpoints["stream"].record(None, (time.perf_counter() - t0) * 1000)
+                    return
+                elapsed = (time.perf_counter() - t0) * 1000
+                # Streams always answer 200; the last SSE event is the outcome
+                stats = endpoints["stream"]
+                outcome = result.final or "truncated"
+                stats.latencies_ms.append(elapsed)
+                stats.statuses[outcome] = stats.statuses.get(outcome, 0) + 1
+                if outcome != "done":
+                    stats.errors += 1
+                created["stream"] += result.questions
+                if result.first_question_ms is not None:
+                    stream_first_ms.append(result.first_question_ms)
+            else:
+                try:
+                    response = await client.post("/generate/from-text", data=data)
+                except httpx.HTTPError:
+                    response = None
+                endpoints["from_text"].record(response, (time.perf_counter() - t0) * 1000)
+                if response is not None and response.status_code == 200:
+                    created["from_text"] += int(response.json().get("created", 0))
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600.0) as client:
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(client, i) for i in range(args.requests)))
+            elapsed = time.perf_counter() - t0
+
+    summary = {name: stats.summary(elapsed) for name, stats in endpoints.items()}
+    if stream_first_ms:
+        first = EndpointStats()
+        first.latencies_ms = stream_first_ms
+        summary["stream_first_question"] = {k: v for k, v in first.summary(elapsed).items() if k.endswith("_ms")}
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "args": vars(args),
+        "elapsed_s": round(elapsed, 2),
+        "generations_per_s": round(args.requests / elapsed, 2) if elapsed else 0.0,
+        "questions_created": created,
+        "injected": {
+            "unavailable": genai_provider.injected_unavailable,
+            "malformed": genai_provider.injected_malformed,
+        },
+        "endpoints": summary,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,209 @@
+"""Quiz-session load test: throughput and latency percentiles per endpoint, saved as JSON.
+
+Each virtual user loops over sessions shaped like the frontend's: `GET /questions/random`,
+one `POST /answers` per question, then `GET /streak/`. --concurrency users run for
+--duration seconds (or until --sessions complete). Without --base-url the app runs
+in-process with its lifespan (real database, no network; the driver shares the event
+loop, so compare in-process runs only with each other). Seed the database first with
+bench.dataset. The report records the git commit; pass --baseline with an earlier report
+to get per-endpoint ratios.
+
+    python -m bench.load --concurrency 32 --duration 60 --output load-$(git rev-parse --short HEAD).json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import subprocess
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from bench.event_loop_latency import percentile
+
+_DB_DUR = re.compile(r"(?:^|,\s*)db;dur=([0-9.]+)")
+_DB_COUNT = re.compile(r'db_count;desc="(\d+)"')
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.latencies_ms: List[float] = []
+        self.errors = 0
+        self.statuses: Dict[str, int] = {}
+        self.db_ms = 0.0
+        self.db_count = 0
+
+    def record(self, response: Optional[httpx.Response], elapsed_ms: float) -> None:
+        self.latencies_ms.append(elapsed_ms)
+        status = str(response.status_code) if response is not None else "transport_error"
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if response is None or response.status_code >= 400:
+            self.errors += 1
+            return
+        # Server-Timing breaks the server side down; db time is what regressions usually move
+        header = response.headers.get("server-timing", "")
+        match = _DB_DUR.search(header)
+        if match:
+            self.db_ms += float(match.group(1))
+        match = _DB_COUNT.search(header)
+        if match:
+            self.db_count += int(match.group(1))
+
+    def summary(self, elapsed_s: float) -> Dict[str, object]:
+        values = self.latencies_ms
+        ok = len(values) - self.errors
+        return {
+            "count": len(values),
+            "errors": self.errors,
+            "statuses": dict(sorted(self.statuses.items())),
+            "throughput_rps": round(len(values) / elapsed_s, 1) if elapsed_s else 0.0,
+            "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(max(values), 2) if values else 0.0,
+            "server_db_ms_mean": round(self.db_ms / ok, 2) if ok else 0.0,
+            "server_db_count_mean": round(self.db_count / ok, 2) if ok else 0.0,
+        }
+
+
+class LoadRun:
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace) -> None:
+        self.client = client
+        self.args = args
+        self.endpoints: Dict[str, EndpointStats] = {
+            "questions_random": EndpointStats(),
+            "answers": EndpointStats(),
+            "streak": EndpointStats(),
+        }
+        self.sessions = 0
+        self.empty_samples = 0
+        self.recording = False
+
+    async def timed(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        t0 = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        if self.recording:
+            self.endpoints[endpoint].record(response, (time.perf_counter() - t0) * 1000)
+        return response
+
+    async def session(self, rng: random.Random) -> None:
+        args = self.args
+        response = await self.timed("questions_random", "GET", "/questions/random", params={"limit": args.questions_per_session})
+        questions = response.json() if response is not None and response.status_code == 200 else []
+        if not questions and self.recording:
+            # The user has answered everything; reseed with bench.dataset --reset
+            self.empty_samples += 1
+        for question in questions:
+            if args.think_ms:
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+            choice = rng.choice(question["choices"])
+            await self.timed("answers", "POST", "/answers", json={"question_id": question["id"], "choice_id": choice["id"]})
+        await self.timed("streak", "GET", "/streak/")
+        if self.recording:
+            self.sessions += 1
+
+    async def user(self, index: int, deadline: float) -> None:
+        rng = random.Random(self.args.seed * 1000 + index)
+        while time.perf_counter() < deadline:
+            if self.args.sessions and self.sessions >= self.args.sessions:
+                return
+            await self.session(rng)
+
+    async def run(self) -> float:
+        args = self.args
+        if args.warmup > 0:
+            warm_deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(self.user(i, warm_deadline) for i in range(args.concurrency)))
+        self.recording = True
+        t0 = time.perf_counter()
+        deadline = t0 + (args.duration if args.duration > 0 else float("inf"))
+        await asyncio.gather(*(self.user(i, deadline) for i in range(args.concurrency)))
+        return time.perf_counter() - t0
+
+
+def git_revision() -> Dict[str, object]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def compare(report: Dict, baseline: Dict) -> Dict[str, Dict[str, Optional[float]]]:
+    # Ratios current / baseline: throughput above 1 is better, latencies below 1 are better
+    def ratio(current: float, previous: float) -> Optional[float]:
+        return round(current / previous, 3) if previous else None
+
+    result = {}
+    for name, current in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        result[name] = {
+            key: ratio(current[key], previous[key])
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "server_db_ms_mean")
+        }
+    return {"baseline_commit": baseline.get("git", {}).get("commit"), "ratios": result}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", type=str, default=None, help="running backend; default runs the app in-process")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds; 0 runs until --sessions")
+    parser.add_argument("--sessions", type=int, default=0, help="stop starting sessions after this many (0 = no limit)")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of unrecorded sessions first")
+    parser.add_argument("--questions-per-session", type=int, default=5)
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause before each answer")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--label", type=str, default=None)
+    parser.add_argument("--baseline", type=str, default=None, help="earlier report to compare against")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+    if args.duration <= 0 and not args.sessions:
+        parser.error("set --duration or --sessions")
+
+    async with AsyncExitStack() as stack:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        if args.base_url:
+            client = httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60.0)
+        else:
+            from app.main import app
+
+            await stack.enter_async_context(app.router.lifespan_context(app))
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60.0)
+        await stack.enter_async_context(client)
+        run = LoadRun(client, args)
+        elapsed = await run.run()
+
+    report = {
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "args": vars(args),
+        "elapsed_s": round(elapsed, 2),
+        "sessions": run.sessions,
+        "sessions_per_s": round(run.sessions / elapsed, 2) if elapsed else 0.0,
+        "empty_samples": run.empty_samples,
+        "endpoints": {name: stats.summary(elapsed) for name, stats in run.endpoints.items()},
+    }
+    if args.baseline:
+        report["vs_baseline"] = compare(report, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
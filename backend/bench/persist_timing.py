@@ -0,0 +1,116 @@
+"""Before/after timing for `_persist_generated_questions`.
+
+Runs the legacy row-at-a-time persist (kept here verbatim for comparison) and the current
+bulk, single-transaction persist against the database in DATABASE_URL. Use a scratch
+database: both variants insert real rows under a dedicated "Bench" topic.
+
+    DATABASE_URL=postgresql://... python -m bench.persist_timing --questions 50 --repeat 5
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from app.db import db
+from app.routers.generate import _persist_generated_questions
+
+
+def synthetic_mcqs(count: int, seed: int) -> str:
+    items = []
+    for i in range(count):
+        items.append(
+            {
+                "question_text": f"Synthetic question {seed}-{i}: which option is correct?",
+                "explanation": "Option A is correct because the generator says so.",
+                "choices": [f"Option {letter} for {seed}-{i}" for letter in "ABCD"],
+                "correct_index": 0,
+                "topic": "Bench",
+                "sub_topic": f"Persist {i % 3}",
+            }
+        )
+    return json.dumps(items)
+
+
+async def legacy_persist(topic_name: Optional[str], json_text: str) -> int:
+    # Pre-bulk implementation: one pool acquire and one round trip per statement
+    data = json.loads(json_text)
+    created = 0
+    for item in data:
+        topic_id = await db.fetchval(
+            "INSERT INTO topics(name) VALUES($1) ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING id",
+            str(topic_name or item.get("topic") or "General").strip(),
+        )
+        sub_topic_id = await db.fetchval(
+            """
+            INSERT INTO sub_topics(topic_id, name)
+            VALUES($1, $2)
+            ON CONFLICT (topic_id, name) DO UPDATE SET name = EXCLUDED.name
+            RETURNING id
+            """,
+            topic_id,
+            str(item.get("sub_topic") or "Misc").strip(),
+        )
+        qid = await db.fetchval(
+            """
+            INSERT INTO questions(sub_topic_id, question_text, explanation, image_url)
+            VALUES ($1, $2, $3, $4)
+            RETURNING id
+            """,
+            sub_topic_id,
+            item.get("question_text"),
+            item.get("explanation"),
+            item.get("image_url"),
+        )
+        correct_index = int(item.get("correct_index", 0))
+        for idx, text in enumerate(item.get("choices", [])):
+            await db.execute(
+                "INSERT INTO choices(question_id, choice_text, is_correct) VALUES ($1, $2, $3)",
+                qid,
+                text,
+                idx == correct_index,
+            )
+        created += 1
+    return created
+
+
+def describe(samples: List[float]) -> dict:
+    return {
+        "runs": len(samples),
+        "mean_ms": round(statistics.mean(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    await db.connect()
+    await db.init_schema(Path(__file__).resolve().parent.parent / "app" / "sql" / "schema.sql")
+
+    legacy: List[float] = []
+    bulk: List[float] = []
+    for run in range(args.repeat):
+        payload = synthetic_mcqs(args.questions, seed=run * 2)
+        t0 = time.perf_counter()
+        await legacy_persist("Bench", payload)
+        legacy.append((time.perf_counter() - t0) * 1000)
+
+        payload = synthetic_mcqs(args.questions, seed=run * 2 + 1)
+        t0 = time.perf_counter()
+        await _persist_generated_questions("Bench", None, payload, args.questions)
+        bulk.append((time.perf_counter() - t0) * 1000)
+
+    await db.disconnect()
+    print(json.dumps({"questions": args.questions, "legacy": describe(legacy), "bulk": describe(bulk)}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""Load benchmark for GET /review/due and the SM-2 card update in POST /answers.
+
+Seeds one card per question of the "Bench Sampling" topic for a dedicated bench user (due
+dates spread over +-90 days, so about half are due), then measures `/review/due` queries
+and answer+reschedule statements sequentially and with N concurrent callers. Use a scratch
+database. Concurrent callers share the app's connection pool, as requests would.
+
+    DATABASE_URL=postgresql://... python -m bench.review_due --cards 300000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+from app.db import db
+from app.routers.questions import _RECORD_ANSWER_SQL
+from app.routers.review import _due_questions
+from bench.sampling import seed_questions
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))]
+    return {
+        "count": len(samples),
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(pick(0.95), 2),
+        "p99_ms": round(pick(0.99), 2),
+    }
+
+
+async def drive(fn: Callable[[], Awaitable[object]], total: int, concurrency: int) -> Dict[str, float]:
+    samples: List[float] = []
+    remaining = [total]
+
+    async def worker() -> None:
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            t0 = time.perf_counter()
+            await fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return {**percentiles(samples), "throughput_per_s": round(total / elapsed, 1)}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=300000)
+    parser.add_argument("--user-id", type=int, default=900002)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    await db.connect()
+    await db.init_schema(Path(__file__).resolve().parent.parent / "app" / "sql" / "schema.sql")
+    sub_topic_ids = await seed_questions(args.cards)
+    user_id = args.user_id
+    await db.execute("DELETE FROM review_state WHERE user_id = $1", user_id)
+    await db.execute(
+        """
+        INSERT INTO review_state(user_id, question_id, repetitions, interval_days, ease, due_at, last_reviewed_at)
+        SELECT $1, q.id, 2, 6, 2.5, NOW() + (random() * 180 - 90) * INTERVAL '1 day', NOW() - INTERVAL '6 days'
+        FROM questions q
+        WHERE q.sub_topic_id = ANY($2)
+        """,
+        user_id,
+        sub_topic_ids,
+    )
+    await db.execute("ANALYZE review_state")
+    cards = await db.fetchval("SELECT COUNT(*) FROM review_state WHERE user_id = $1", user_id)
+    due = await db.fetchval("SELECT COUNT(*) FROM review_state WHERE user_id = $1 AND due_at <= NOW()", user_id)
+
+    answer_rows = await db.fetch(
+        """
+        SELECT c.question_id, c.id AS choice_id
+        FROM review_state r JOIN choices c ON c.question_id = r.question_id
+        WHERE r.user_id = $1
+        LIMIT 20000
+        """,
+        user_id,
+    )
+
+    async def answer() -> None:
+        row = random.choice(answer_rows)
+        await db.execute(_RECORD_ANSWER_SQL, user_id, row["question_id"], row["choice_id"])
+
+    report = {
+        "cards": cards,
+        "due": due,
+        "limit": args.limit,
+        "due_sequential": await drive(lambda: _due_questions(user_id, args.limit), args.requests, 1),
+        "due_concurrent": await drive(lambda: _due_questions(user_id, args.limit), args.requests, args.concurrency),
+        "answer_concurrent": await drive(answer, args.requests, args.concurrency),
+        "concurrency": args.concurrency,
+    }
+
+    await db.execute("DELETE FROM user_answers WHERE user_id = $1", user_id)
+    await db.execute("DELETE FROM review_state WHERE user_id = $1", user_id)
+    await db.disconnect()
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,218 @@
+"""Unanswered-question sampling: legacy TABLESAMPLE + anti-join vs. user_question_state.
+
+Seeds a "Bench Sampling" topic (20 sub-topics, 4 choices per question) and a dedicated
+bench user, then grows that user's answer history to each target size and times both
+queries for /questions/random and /sub_topics/{id}/questions. Use a scratch database.
+
+    DATABASE_URL=postgresql://... python -m bench.sampling --questions 200000 --answers 10000 100000 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.db import db
+from app.question_state import unanswered_questions
+from app.routers.questions import _sample_unanswered
+
+
+SUB_TOPICS = 20
+
+# Pre-change query for /questions/random, kept verbatim (user id parameterized)
+LEGACY_RANDOM_SQL = """
+    WITH answered AS (
+        SELECT question_id FROM user_answers WHERE user_id = $1
+    ),
+    sampled AS (
+        SELECT q.id
+        FROM questions q TABLESAMPLE SYSTEM (50)
+        WHERE NOT EXISTS (SELECT 1 FROM answered a WHERE a.question_id = q.id)
+        LIMIT $2
+    ),
+    fallback AS (
+        SELECT q.id
+        FROM questions q
+        WHERE NOT EXISTS (SELECT 1 FROM answered a WHERE a.question_id = q.id)
+          AND NOT EXISTS (SELECT 1 FROM sampled s WHERE s.id = q.id)
+        ORDER BY q.id
+        LIMIT GREATEST(0, $2 - (SELECT COUNT(*) FROM sampled))
+    ),
+    final_ids AS (
+        SELECT id FROM sampled
+        UNION ALL
+        SELECT id FROM fallback
+    )
+    SELECT q.id, q.sub_topic_id, q.question_text, q.explanation, q.image_url,
+           c.id as choice_id, c.choice_text, c.is_correct
+    FROM final_ids f
+    JOIN questions q ON q.id = f.id
+    JOIN choices c ON c.question_id = q.id
+    ORDER BY q.id, c.id
+    LIMIT $2 * 10
+"""
+
+# Pre-change query for /sub_topics/{id}/questions
+LEGACY_SUB_TOPIC_SQL = """
+    WITH answered AS (
+        SELECT question_id FROM user_answers WHERE user_id = $2
+    ),
+    sampled AS (
+        SELECT q.id
+        FROM questions q TABLESAMPLE SYSTEM (50)
+        WHERE q.sub_topic_id = $1
+          AND NOT EXISTS (SELECT 1 FROM answered a WHERE a.question_id = q.id)
+        LIMIT $3
+    ),
+    fallback AS (
+        SELECT q.id
+        FROM questions q
+        WHERE q.sub_topic_id = $1
+          AND NOT EXISTS (SELECT 1 FROM answered a WHERE a.question_id = q.id)
+          AND NOT EXISTS (SELECT 1 FROM sampled s WHERE s.id = q.id)
+        ORDER BY q.id
+        LIMIT GREATEST(0, $3 - (SELECT COUNT(*) FROM sampled))
+    ),
+    final_ids AS (
+        SELECT id FROM sampled
+        UNION ALL
+        SELECT id FROM fallback
+    )
+    SELECT q.id, q.sub_topic_id, q.question_text, q.explanation, q.image_url,
+           c.id as choice_id, c.choice_text, c.is_correct
+    FROM final_ids f
+    JOIN questions q ON q.id = f.id
+    JOIN choices c ON c.question_id = q.id
+    ORDER BY q.id, c.id
+    LIMIT $3 * 10
+"""
+
+
+async def seed_questions(count: int) -> List[int]:
+    topic_id = await db.fetchval(
+        "INSERT INTO topics(name) VALUES ('Bench Sampling') ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING id"
+    )
+    rows = await db.fetch(
+        """
+        INSERT INTO sub_topics(topic_id, name)
+        SELECT $1, 'Sampling ' || g FROM generate_series(1, $2) g
+        ON CONFLICT (topic_id, name) DO UPDATE SET name = EXCLUDED.name
+        RETURNING id
+        """,
+        topic_id,
+        SUB_TOPICS,
+    )
+    sub_topic_ids = sorted(r["id"] for r in rows)
+    existing = await db.fetchval("SELECT COUNT(*) FROM questions WHERE sub_topic_id = ANY($1)", sub_topic_ids)
+    if existing < count:
+        async with db.transaction() as con:
+            await con.execute(
+                """
+                WITH q AS (
+                    INSERT INTO questions(sub_topic_id, question_text)
+                    SELECT ($1::int[])[1 + g % array_length($1::int[], 1)], 'Bench sampling question ' || g
+                    FROM generate_series($2 + 1, $3) g
+                    RETURNING id
+                )
+                INSERT INTO choices(question_id, choice_text, is_correct)
+                SELECT q.id, 'Choice ' || c, c = 0 FROM q CROSS JOIN generate_series(0, 3) c
+                """,
+                sub_topic_ids,
+                existing,
+                count,
+            )
+        await db.execute("ANALYZE")
+    return sub_topic_ids
+
+
+async def time_calls(fn: Callable[[], Awaitable[object]], repeat: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=200000)
+    parser.add_argument("--answers", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--user-id", type=int, default=900001)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    await db.connect()
+    await db.init_schema(Path(__file__).resolve().parent.parent / "app" / "sql" / "schema.sql")
+    sub_topic_ids = await seed_questions(args.questions)
+    question_ids = [
+        r["id"] for r in await db.fetch("SELECT id FROM questions WHERE sub_topic_id = ANY($1) ORDER BY id", sub_topic_ids)
+    ]
+    user_id = args.user_id
+    await db.execute("DELETE FROM user_answers WHERE user_id = $1", user_id)
+    await db.execute("DELETE FROM user_question_state WHERE user_id = $1", user_id)
+    await unanswered_questions.backfill(user_id)
+
+    results = []
+    answered_so_far = 0
+    for target in sorted(args.answers):
+        await db.execute(
+            """
+            INSERT INTO user_answers(user_id, question_id, is_correct)
+            SELECT $1, ($2::int[])[1 + floor(random() * array_length($2::int[], 1))::int], random() < 0.7
+            FROM generate_series(1, $3)
+            """,
+            user_id,
+            question_ids,
+            target - answered_so_far,
+        )
+        answered_so_far = target
+        t0 = time.perf_counter()
+        await unanswered_questions.backfill(user_id)
+        sync_ms = (time.perf_counter() - t0) * 1000
+        await db.execute("ANALYZE user_answers")
+        await db.execute("ANALYZE user_question_state")
+
+        unanswered = await db.fetchval(
+            "SELECT COUNT(*) FROM user_question_state WHERE user_id = $1 AND NOT answered", user_id
+        )
+        sub_topic_id: Optional[int] = sub_topic_ids[0]
+        results.append(
+            {
+                "answers": target,
+                "unanswered_questions": unanswered,
+                "state_sync_ms": round(sync_ms, 1),
+                "random": {
+                    "legacy": await time_calls(lambda: db.fetch(LEGACY_RANDOM_SQL, user_id, args.limit), args.repeat),
+                    "indexed": await time_calls(lambda: _sample_unanswered(user_id, args.limit), args.repeat),
+                },
+                "sub_topic": {
+                    "legacy": await time_calls(
+                        lambda: db.fetch(LEGACY_SUB_TOPIC_SQL, sub_topic_id, user_id, args.limit), args.repeat
+                    ),
+                    "indexed": await time_calls(
+                        lambda: _sample_unanswered(user_id, args.limit, sub_topic_id), args.repeat
+                    ),
+                },
+            }
+        )
+        print(json.dumps(results[-1]))
+
+    await db.disconnect()
+    report = {"questions": args.questions, "limit": args.limit, "results": results}
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())